@@ -0,0 +1,252 @@
+"""Накладные расходы HTTP middleware на тривиальном роуте.
+
+Сравнивает приложение без middleware, прежний стек из трех @app.middleware("http")
+слоев (legacy, замороженная копия до перехода на ASGI) и единый ASGI middleware.
+Запросы подаются прямо в ASGI приложение, поэтому меряется только стек middleware без сети.
+
+    python benchmark/http_middleware.py --requests 20000
+"""
+import argparse
+import asyncio
+import os
+import random
+import sys
+import time
+from typing import Callable
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from fastapi import FastAPI, Request
+from fastapi.responses import JSONResponse
+from opentelemetry import propagate
+from opentelemetry.sdk._logs import LoggerProvider
+from opentelemetry.sdk.metrics import MeterProvider
+from opentelemetry.sdk.trace import TracerProvider
+from opentelemetry.semconv.trace import SpanAttributes
+from opentelemetry.trace import SpanKind, Status, StatusCode
+
+from infrastructure.telemetry.logger import OtelLogger
+from internal import common
+from internal.controller.http.middlerware.middleware import HttpMiddleware, route_template
+
+PREFIX = "/api"
+
+
+class BenchTelemetry:
+    """SDK провайдеры без экспортеров: стоимость спанов и метрик есть, сети нет"""
+
+    def __init__(self):
+        self._tracer = TracerProvider().get_tracer("bench")
+        self._meter = MeterProvider().get_meter("bench")
+        self._logger = OtelLogger(None, LoggerProvider(), "bench")
+
+    def tracer(self):
+        return self._tracer
+
+    def meter(self):
+        return self._meter
+
+    def logger(self):
+        return self._logger
+
+
+def legacy_middleware(app: FastAPI, http_middleware: HttpMiddleware):
+    """Копия трех BaseHTTPMiddleware слоев, которые были до AsgiHttpMiddleware.
+
+    Не менять: это точка отсчета для сравнения, в приложении эти слои больше не используются.
+    Порядок регистрации как был в main: последний добавленный слой выполняется первым.
+    """
+    tracer = http_middleware.tracer
+    logger = http_middleware.logger
+    label_guard = http_middleware.label_guard
+    instruments = http_middleware.http_instruments()
+
+    @app.middleware("http")
+    async def _logger_middleware03(request: Request, call_next: Callable):
+        start_time = time.time()
+
+        extra_log = {
+            common.HTTP_METHOD_KEY: request.method,
+            common.HTTP_ROUTE_KEY: request.url.path,
+            common.TRACE_ID_KEY: request.state.trace_id,
+            common.SPAN_ID_KEY: request.state.span_id,
+        }
+        log_sampled = random.random() < http_middleware.access_log_sample_ratio
+        try:
+            if log_sampled:
+                logger.info("Началась обработка HTTP запроса", extra_log)
+            response = await call_next(request)
+
+            extra_log = {
+                **extra_log,
+                common.HTTP_REQUEST_DURATION_KEY: time.time() - start_time,
+                common.HTTP_STATUS_KEY: response.status_code,
+            }
+            if 400 <= response.status_code < 500:
+                logger.warning("Обработка HTTP запроса завершена с ошибкой клиента", extra_log)
+            elif log_sampled:
+                logger.info("Обработка HTTP запроса завершена успешно", extra_log)
+            return response
+        except Exception as err:
+            extra_log = {
+                **extra_log,
+                common.HTTP_REQUEST_DURATION_KEY: time.time() - start_time,
+                common.HTTP_STATUS_KEY: 500,
+                common.ERROR_KEY: str(err),
+            }
+            logger.error("Обработка HTTP запроса завершена с ошибкой", extra_log)
+            raise
+
+    @app.middleware("http")
+    async def _metrics_middleware02(request: Request, call_next: Callable):
+        start_time = time.time()
+        instruments.active_requests.add(1)
+
+        content_length = request.headers.get("content-length")
+        try:
+            response = await call_next(request)
+
+            duration_seconds = time.time() - start_time
+            status_code = response.status_code
+            request_attrs = label_guard.attributes(request.method, route_template(request.scope), status_code)
+
+            if content_length and int(content_length) > 0:
+                instruments.request_size.record(int(content_length), attributes=request_attrs)
+            if status_code >= 500:
+                instruments.error_request_counter.add(1, attributes=request_attrs)
+            else:
+                instruments.ok_request_counter.add(1, attributes=request_attrs)
+            instruments.request_duration.record(duration_seconds, attributes=request_attrs)
+
+            response_content_length = response.headers.get("content-length")
+            if response_content_length:
+                try:
+                    instruments.response_size.record(int(response_content_length), attributes=request_attrs)
+                except ValueError:
+                    pass
+            return response
+        except Exception as err:
+            request_attrs = label_guard.attributes(
+                request.method, route_template(request.scope), 500, type(err).__name__
+            )
+            instruments.error_request_counter.add(1, attributes=request_attrs)
+            instruments.request_duration.record(time.time() - start_time, attributes=request_attrs)
+            raise
+        finally:
+            instruments.active_requests.add(-1)
+
+    @app.middleware("http")
+    async def _trace_middleware01(request: Request, call_next: Callable):
+        if http_middleware.prefix not in request.url.path:
+            return JSONResponse(status_code=404, content={"error": "not found"})
+        with tracer.start_as_current_span(
+                f"{request.method} {request.url.path}",
+                context=propagate.extract(dict(request.headers)),
+                kind=SpanKind.SERVER,
+                attributes={
+                    SpanAttributes.HTTP_ROUTE: str(request.url.path),
+                    SpanAttributes.HTTP_METHOD: request.method,
+                }
+        ) as root_span:
+            span_ctx = root_span.get_span_context()
+            trace_id = format(span_ctx.trace_id, '032x')
+            span_id = format(span_ctx.span_id, '016x')
+
+            request.state.trace_id = trace_id
+            request.state.span_id = span_id
+            try:
+                response = await call_next(request)
+
+                status_code = response.status_code
+                root_span.set_attributes({SpanAttributes.HTTP_STATUS_CODE: status_code})
+                response_size = response.headers.get("content-length")
+                if response_size:
+                    try:
+                        root_span.set_attribute(SpanAttributes.HTTP_RESPONSE_BODY_SIZE, int(response_size))
+                    except ValueError:
+                        pass
+
+                response.headers[common.TRACE_ID_HEADER] = trace_id
+                response.headers[common.SPAN_ID_HEADER] = span_id
+
+                if status_code >= 400:
+                    err = Exception("Internal server error" if status_code >= 500 else "Client error")
+                    root_span.record_exception(err)
+                    root_span.set_status(Status(StatusCode.ERROR, str(err)))
+                    root_span.set_attribute(common.ERROR_KEY, True)
+                    raise err
+                root_span.set_status(Status(StatusCode.OK))
+                return response
+            except Exception as err:
+                root_span.record_exception(err)
+                root_span.set_status(Status(StatusCode.ERROR, str(err)))
+                root_span.set_attribute(common.ERROR_KEY, True)
+                return JSONResponse(status_code=500, content={"message": "Internal Server Error"})
+
+
+def new_app(mode: str) -> FastAPI:
+    app = FastAPI()
+
+    @app.get(PREFIX + "/ping")
+    async def ping():
+        return {"ok": True}
+
+    http_middleware = HttpMiddleware(BenchTelemetry(), PREFIX)
+    if mode == "legacy":
+        legacy_middleware(app, http_middleware)
+    elif mode == "asgi":
+        http_middleware.asgi_middleware(app)
+    return app
+
+
+async def run(app: FastAPI, requests: int) -> float:
+    scope = {
+        "type": "http",
+        "asgi": {"version": "3.0"},
+        "http_version": "1.1",
+        "method": "GET",
+        "scheme": "http",
+        "path": PREFIX + "/ping",
+        "raw_path": (PREFIX + "/ping").encode(),
+        "query_string": b"",
+        "root_path": "",
+        "headers": [(b"host", b"bench"), (b"user-agent", b"bench")],
+        "client": ("127.0.0.1", 1),
+        "server": ("127.0.0.1", 80),
+    }
+
+    async def receive():
+        return {"type": "http.request", "body": b"", "more_body": False}
+
+    async def send(message):
+        pass
+
+    # Прогрев: сборка middleware стека и роутера происходит на первом запросе
+    for _ in range(200):
+        await app(dict(scope), receive, send)
+
+    start = time.perf_counter()
+    for _ in range(requests):
+        await app(dict(scope), receive, send)
+    return time.perf_counter() - start
+
+
+def main():
+    parser = argparse.ArgumentParser(description="HTTP middleware overhead")
+    parser.add_argument("--requests", type=int, default=20000)
+    args = parser.parse_args()
+
+    baseline = None
+    for mode in ("none", "legacy", "asgi"):
+        elapsed = asyncio.run(run(new_app(mode), args.requests))
+        per_request_us = elapsed / args.requests * 1e6
+        if baseline is None:
+            baseline = per_request_us
+        print(
+            f"{mode:>6}: {args.requests / elapsed:9.0f} req/s  "
+            f"{per_request_us:7.1f} us/req  overhead {per_request_us - baseline:7.1f} us/req"
+        )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,79 @@
+"""Сводка `python -X importtime` для точки входа main.py.
+
+Запуск из корня репозитория:
+    python benchmark/importtime.py               # холодный импорт main
+    python benchmark/importtime.py --profile http # импорт всего, что нужно HTTP воркеру
+
+Замер до и после ленивых импортов в main.py: benchmark/importtime.txt
+"""
+import argparse
+import os
+import subprocess
+import sys
+from collections import defaultdict
+
+PROFILES = {
+    "main": "import main",
+    "http": "import main, internal.app.http.app, internal.controller.http.middlerware.middleware, "
+            "internal.service.chat.service, infrastructure.telemetry.telemetry, "
+            "infrastructure.telemetry.alertmanger, infrastructure.pg.pg, infrastructure.weedfs.weedfs, "
+            "pkg.client.external.openai.client",
+}
+
+# Config читает переменные окружения при импорте, для замера достаточно заглушек
+DUMMY_ENV = {
+    "BACKEND_PORT": "8000",
+    "ALERT_TG_CHAT_ID": "0",
+    "ALERT_TG_CHAT_THREAD_ID": "0",
+    "MONITORING_REDIS_PORT": "6379",
+    "MONITORING_DEDUPLICATE_ERROR_ALERT_REDIS_DB": "0",
+    "WEED_MASTER_PORT": "9333",
+}
+
+
+def run(code: str) -> list[tuple[int, int, str]]:
+    env = {**DUMMY_ENV, **os.environ}
+    proc = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", code],
+        capture_output=True,
+        text=True,
+        env=env,
+    )
+    if proc.returncode != 0:
+        sys.exit(proc.stderr.splitlines()[-1] if proc.stderr else "import failed")
+
+    rows = []
+    for line in proc.stderr.splitlines():
+        if not line.startswith("import time:") or "self [us]" in line:
+            continue
+        self_us, cumulative_us, name = line[len("import time:"):].split("|")
+        rows.append((int(self_us), int(cumulative_us), name.rstrip()))
+    return rows
+
+
+def main():
+    parser = argparse.ArgumentParser(description="import time profile")
+    parser.add_argument("--profile", choices=PROFILES.keys(), default="main")
+    parser.add_argument("--top", type=int, default=20)
+    args = parser.parse_args()
+
+    rows = run(PROFILES[args.profile])
+
+    by_package = defaultdict(int)
+    for self_us, _, name in rows:
+        by_package[name.strip().split(".")[0]] += self_us
+
+    total_us = sum(self_us for self_us, _, _ in rows)
+    print(f"profile={args.profile} modules={len(rows)} total={total_us / 1000:.1f} ms\n")
+
+    print(f"top {args.top} top-level packages by self time:")
+    for package, self_us in sorted(by_package.items(), key=lambda x: -x[1])[:args.top]:
+        print(f"  {self_us / 1000:9.1f} ms  {package}")
+
+    print(f"\ntop {args.top} imports by cumulative time:")
+    for _, cumulative_us, name in sorted(rows, key=lambda x: -x[1])[:args.top]:
+        print(f"  {cumulative_us / 1000:9.1f} ms  {name.strip()}")
+
+
+if __name__ == "__main__":
+    main()
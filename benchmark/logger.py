@@ -0,0 +1,48 @@
+"""Стоимость вызовов OtelLogger.
+
+Меряет вызовы логгера в типичных сценариях: debug при уровне INFO (должен быть
+почти бесплатным), info без спана и info с полями внутри активного спана.
+Записи уходят в LoggerProvider без экспортеров, поэтому сеть не участвует.
+
+    python benchmark/logger.py --calls 200000 --level INFO
+"""
+import argparse
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from opentelemetry.sdk._logs import LoggerProvider
+from opentelemetry.sdk.trace import TracerProvider
+
+from infrastructure.telemetry.logger import OtelLogger
+
+
+def bench(name: str, fn, calls: int) -> None:
+    start = time.perf_counter()
+    for _ in range(calls):
+        fn()
+    elapsed = time.perf_counter() - start
+    print(f"{name:>22}: {calls / elapsed:>12.0f} calls/s {elapsed / calls * 1e6:>8.2f} us/call")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="OtelLogger micro-benchmark")
+    parser.add_argument("--calls", type=int, default=200000)
+    parser.add_argument("--level", type=str, default="INFO")
+    args = parser.parse_args()
+
+    logger = OtelLogger(None, LoggerProvider(), "bench", args.level)
+    tracer = TracerProvider().get_tracer("bench")
+    fields = {"http.request.method": "GET", "http.route": "/api/ping", "http.response.status_code": 200}
+
+    bench("debug (disabled)", lambda: logger.debug("debug message", fields), args.calls)
+    bench("info no span", lambda: logger.info("info message"), args.calls)
+
+    with tracer.start_as_current_span("bench"):
+        bench("info fields in span", lambda: logger.info("info message", fields), args.calls)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,85 @@
+"""Маршрутизация чтений PG на двух локальных Postgres: primary и потоковая реплика.
+
+Показывает, куда уходят чтения с replica=True, что после записи по sticky_key чтения
+идут на primary в течение окна, и что недоступная реплика выпадает из ротации.
+
+    pg_basebackup -h localhost -p 5432 -U postgres -D /tmp/replica -R -X stream
+    pg_ctl -D /tmp/replica -o "-p 5433" start
+    python benchmark/pg_replica.py --primary localhost:5432 --replica localhost:5433 --user postgres --db postgres
+"""
+import argparse
+import asyncio
+import os
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from opentelemetry.sdk._logs import LoggerProvider
+from opentelemetry.sdk.metrics import MeterProvider
+from opentelemetry.sdk.trace import TracerProvider
+
+from infrastructure.pg.pg import PG
+from infrastructure.telemetry.logger import OtelLogger
+
+where = "SELECT CASE WHEN pg_is_in_recovery() THEN 'replica' ELSE 'primary' END, current_setting('port');"
+
+
+class BenchTelemetry:
+    def __init__(self):
+        self._tracer = TracerProvider().get_tracer("bench")
+        self._logger = OtelLogger(None, LoggerProvider(), "bench", "WARNING")
+        self._meter = MeterProvider().get_meter("bench")
+
+    def tracer(self):
+        return self._tracer
+
+    def logger(self):
+        return self._logger
+
+    def meter(self):
+        return self._meter
+
+
+async def main():
+    parser = argparse.ArgumentParser(description="PG replica routing check")
+    parser.add_argument("--primary", type=str, default="localhost:5432")
+    parser.add_argument("--replica", type=str, action="append", default=None)
+    parser.add_argument("--user", type=str, default="postgres")
+    parser.add_argument("--password", type=str, default="")
+    parser.add_argument("--db", type=str, default="postgres")
+    parser.add_argument("--sticky-window", type=float, default=1.0)
+    args = parser.parse_args()
+
+    host, _, port = args.primary.partition(":")
+    # Заведомо недоступная реплика проверяет переключение
+    replicas = (args.replica or ["localhost:5433"]) + ["127.0.0.1:1"]
+    db = PG(
+        BenchTelemetry(),
+        args.user,
+        args.password,
+        host,
+        port or "5432",
+        args.db,
+        replicas,
+        sticky_window=args.sticky_window
+    )
+
+    try:
+        for _ in range(len(replicas) + 1):
+            print("replica=True           ->", (await db.select(where, {}, replica=True))[0])
+        print("replica=False          ->", (await db.select(where, {}))[0])
+
+        await db.multi_query(["CREATE TABLE IF NOT EXISTS bench_replica (value INTEGER);"])
+        await db.update("INSERT INTO bench_replica VALUES (1);", {}, sticky_key="student:1")
+        print("after write, same key  ->", (await db.select(where, {}, replica=True, sticky_key="student:1"))[0])
+        print("after write, other key ->", (await db.select(where, {}, replica=True, sticky_key="student:2"))[0])
+
+        await asyncio.sleep(args.sticky_window)
+        print("after sticky window    ->", (await db.select(where, {}, replica=True, sticky_key="student:1"))[0])
+        await db.multi_query(["DROP TABLE bench_replica;"])
+    finally:
+        await db.close()
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,89 @@
+"""Последовательные команды RedisClient против пайплайна и MGET/MSET.
+
+Нужен локальный redis-server, бенчмарк пишет ключи с префиксом bench: в выбранную БД
+и удаляет их в конце.
+
+    redis-server --port 6379 &
+    python benchmark/redis_pipeline.py --keys 1000 --serializer msgpack
+
+Цифры до и после перехода на пайплайны не сняты: там, где писалось изменение, не было
+redis-server. Выигрыш ожидается на сетевых задержках, поэтому мерить стоит против Redis
+на другом хосте, а не на localhost.
+"""
+import argparse
+import asyncio
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from infrastructure.redis_client.redis_client import RedisClient
+from infrastructure.redis_client.serializer import new_serializer
+
+
+async def bench(name: str, fn, keys: int) -> None:
+    start = time.perf_counter()
+    await fn()
+    elapsed = time.perf_counter() - start
+    print(f"{name:>22}: {keys / elapsed:>10.0f} keys/s {elapsed * 1000:>9.1f} ms")
+
+
+async def main():
+    parser = argparse.ArgumentParser(description="RedisClient pipeline benchmark")
+    parser.add_argument("--host", type=str, default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=6379)
+    parser.add_argument("--db", type=int, default=15)
+    parser.add_argument("--password", type=str, default=None)
+    parser.add_argument("--keys", type=int, default=1000)
+    parser.add_argument("--serializer", type=str, default="json", help='Option: "json, msgpack"')
+    args = parser.parse_args()
+
+    keys = [f"bench:{i}" for i in range(args.keys)]
+    value = {"student_id": 1, "topic": "Базы данных", "approved": [1, 2, 3]}
+
+    async with RedisClient(
+            args.host,
+            args.port,
+            args.db,
+            args.password,
+            serializer=new_serializer(args.serializer)
+    ) as redis_client:
+        async def sequential_set():
+            for key in keys:
+                await redis_client.set(key, value, ttl=60)
+
+        async def sequential_get():
+            for key in keys:
+                await redis_client.get(key)
+
+        async def pipeline_set():
+            async with redis_client.pipeline() as pipe:
+                for key in keys:
+                    pipe.set(key, value, ttl=60)
+                await pipe.execute()
+
+        async def pipeline_get():
+            async with redis_client.pipeline() as pipe:
+                for key in keys:
+                    pipe.get(key)
+                await pipe.execute()
+
+        async def mset():
+            await redis_client.mset({key: value for key in keys}, ttl=60)
+
+        async def mget():
+            await redis_client.mget(keys)
+
+        await bench("sequential set", sequential_set, args.keys)
+        await bench("pipeline set", pipeline_set, args.keys)
+        await bench("mset ttl", mset, args.keys)
+        await bench("sequential get", sequential_get, args.keys)
+        await bench("pipeline get", pipeline_get, args.keys)
+        await bench("mget", mget, args.keys)
+
+        await redis_client.delete(*keys)
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
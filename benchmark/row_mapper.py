@@ -0,0 +1,86 @@
+"""Маппинг строк БД в модели: обычный dataclass с построчным serialize против
+slots dataclass и сгенерированного маппера из internal/model/row_mapper.py.
+
+Строки имитируются namedtuple с _fields, как у sqlalchemy Row.
+
+    python benchmark/row_mapper.py --messages 100000
+"""
+import argparse
+import gc
+import os
+import sys
+import time
+import tracemalloc
+from collections import namedtuple
+from dataclasses import dataclass, field
+from datetime import datetime
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from internal import model
+
+Row = namedtuple("Row", ["id", "chat_id", "text", "role", "created_at", "updated_at"])
+
+
+@dataclass
+class LegacyMessage:
+    id: int
+    chat_id: int
+
+    text: str
+    role: str
+
+    created_at: datetime = field(default_factory=datetime.now)
+    updated_at: datetime = field(default_factory=datetime.now)
+
+    @classmethod
+    def serialize(cls, rows) -> list:
+        return [
+            cls(
+                id=row.id,
+                chat_id=row.chat_id,
+                text=row.text,
+                role=row.role,
+                created_at=row.created_at,
+                updated_at=row.updated_at,
+            )
+            for row in rows
+        ]
+
+
+def measure(name: str, serialize, rows: list) -> None:
+    serialize(rows[:10])
+    gc.collect()
+
+    start = time.perf_counter()
+    serialize(rows)
+    elapsed = time.perf_counter() - start
+
+    gc.collect()
+    tracemalloc.start()
+    messages = serialize(rows)
+    current, _ = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    del messages
+
+    print(f"{name:>24}: {elapsed * 1000:>8.1f} ms {len(rows) / elapsed:>10.0f} rows/s "
+          f"{current / 1024 / 1024:>7.1f} MiB {current / len(rows):>6.0f} B/message")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Row mapping benchmark")
+    parser.add_argument("--messages", type=int, default=100000)
+    args = parser.parse_args()
+
+    now = datetime.now()
+    rows = [
+        Row(i, 1, f"Сообщение {i}", "user" if i % 2 else "assistant", now, now)
+        for i in range(args.messages)
+    ]
+
+    measure("dataclass serialize", LegacyMessage.serialize, rows)
+    measure("slots + row_mapper", model.Message.serialize, rows)
+
+
+if __name__ == "__main__":
+    main()
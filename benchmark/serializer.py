@@ -0,0 +1,103 @@
+"""Пропускная способность JSON сериализации: stdlib json против pkg.serializer.
+
+Полезные нагрузки повторяют реальные: ответ StudentResponse и каталог курса
+для промпта (19 тем, 116 блоков, 471 глава, как в pkg/backend_knowledge).
+
+    python benchmark/serializer.py --iterations 2000
+"""
+import argparse
+import json
+import os
+import sys
+import time
+from datetime import datetime
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from internal import model
+from internal.controller.http.handler.edu.student.model import StudentResponse
+from internal.service.chat.topic_formatter import EducationDataFormatter
+from pkg.serializer import serializer
+
+
+def stdlib_default(value):
+    if isinstance(value, datetime):
+        return value.isoformat()
+    return str(value)
+
+
+def student_payload() -> dict:
+    now = datetime.now()
+    return StudentResponse(
+        id=1,
+        account_id=1,
+        current_expert="teacher",
+        current_topic={1: "Базы данных"},
+        current_block={3: "Индексы"},
+        current_chapter={12: "Глава 2. B-tree"},
+        programming_experience="2 года Python",
+        education_background="Техническое высшее",
+        learning_goals="Стать backend разработчиком",
+        career_goals="Middle Python developer",
+        timeline="6 месяцев",
+        learning_style="Практика",
+        lesson_duration="1 час",
+        preferred_difficulty="Средняя",
+        recommended_topics={i: f"Тема {i}" for i in range(10)},
+        recommended_blocks={i: f"Блок {i}" for i in range(30)},
+        approved_topics={i: f"Тема {i}" for i in range(5)},
+        approved_blocks={i: f"Блок {i}" for i in range(15)},
+        approved_chapters={i: f"Глава {i}" for i in range(60)},
+        assessment_score=72,
+        strong_areas=["Python", "SQL"],
+        weak_areas=["Асинхронность", "Сети"],
+        created_at=now,
+        updated_at=now,
+    ).model_dump()
+
+
+def catalog() -> EducationDataFormatter:
+    topics = [model.Topic(id=i, name=f"Тема {i}", intro_file_id=f"1,{i}a", edu_plan_file_id=f"1,{i}b")
+              for i in range(19)]
+    blocks = [model.Block(id=i, topic_id=i % 19, name=f"Блок {i}", content_file_id=f"2,{i}")
+              for i in range(116)]
+    chapters = [model.Chapter(id=i, topic_id=(i % 116) % 19, block_id=i % 116, name=f"Глава {i}",
+                              content_file_id=f"3,{i}")
+                for i in range(471)]
+    return EducationDataFormatter(topics, blocks, chapters)
+
+
+def bench(name: str, fn, iterations: int) -> None:
+    start = time.perf_counter()
+    for _ in range(iterations):
+        fn()
+    elapsed = time.perf_counter() - start
+    print(f"{name:>32}: {iterations / elapsed:>10.0f} ops/s {elapsed / iterations * 1e6:>10.1f} us/op")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="JSON serialization benchmark")
+    parser.add_argument("--iterations", type=int, default=2000)
+    args = parser.parse_args()
+
+    print(f"pkg.serializer backend: {serializer.BACKEND}")
+
+    student = student_payload()
+    bench("student stdlib json", lambda: json.dumps(student, default=stdlib_default).encode(), args.iterations)
+    bench("student pkg.serializer", lambda: serializer.dumps(student), args.iterations)
+
+    formatter = catalog()
+    flat = {
+        "topics": [topic.to_dict() for topic in formatter.topics],
+        "blocks": [block.to_dict() for block in formatter.blocks],
+        "chapters": [chapter.to_dict() for chapter in formatter.chapters],
+    }
+    iterations = max(args.iterations // 10, 1)
+    bench("catalog stdlib json indent", lambda: json.dumps(flat, default=stdlib_default, ensure_ascii=False, indent=2),
+          iterations)
+    bench("catalog pkg.serializer indent", lambda: serializer.dumps_str(flat, indent=True), iterations)
+    bench("formatter to_hierarchical_json", formatter.to_hierarchical_json, iterations)
+
+
+if __name__ == "__main__":
+    main()
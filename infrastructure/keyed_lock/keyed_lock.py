@@ -0,0 +1,90 @@
+import asyncio
+from contextlib import asynccontextmanager
+from typing import AsyncIterator
+
+from redis.exceptions import LockError, RedisError
+
+from infrastructure.redis_client.redis_client import RedisClient
+from internal import interface
+
+
+class _LocalEntry:
+    __slots__ = ("lock", "holders")
+
+    def __init__(self):
+        self.lock = asyncio.Lock()
+        self.holders = 0
+
+
+class KeyedLock(interface.IKeyedLock):
+    """Блокировка по ключу: asyncio.Lock внутри процесса и Redis lock между воркерами"""
+
+    def __init__(
+            self,
+            redis_client: RedisClient | None = None,
+            namespace: str = "lock",
+            ttl: int = 120,
+            blocking_timeout: int = 120,
+    ):
+        self.redis_client = redis_client
+        self.namespace = namespace
+        self.ttl = ttl
+        self.blocking_timeout = blocking_timeout
+        self._local: dict[str, _LocalEntry] = {}
+
+    @asynccontextmanager
+    async def lock(self, key: str) -> AsyncIterator[None]:
+        entry = self._local.get(key)
+        if entry is None:
+            entry = self._local[key] = _LocalEntry()
+        entry.holders += 1
+
+        try:
+            # Сначала очередь внутри процесса, чтобы не занимать Redis ожидающими корутинами
+            async with entry.lock:
+                if self.redis_client is None:
+                    yield
+                    return
+
+                client = await self.redis_client.get_async_client()
+                redis_lock = client.lock(
+                    f"{self.namespace}:{key}",
+                    timeout=self.ttl,
+                    blocking_timeout=self.blocking_timeout,
+                )
+                if not await redis_lock.acquire():
+                    raise TimeoutError(f"Не удалось захватить блокировку {key}")
+
+                # Ход с медленным LLM может идти дольше ttl: пока держим блокировку, продлеваем ее
+                renewal = asyncio.create_task(self._renew(redis_lock))
+                try:
+                    yield
+                finally:
+                    renewal.cancel()
+                    try:
+                        await renewal
+                    except asyncio.CancelledError:
+                        pass
+                    try:
+                        await redis_lock.release()
+                    except LockError:
+                        # TTL истек раньше, блокировку уже мог забрать другой воркер
+                        pass
+        finally:
+            entry.holders -= 1
+            if entry.holders == 0:
+                self._local.pop(key, None)
+
+    async def _renew(self, redis_lock):
+        """Раз в треть ttl возвращает блокировке полный ttl, пока задачу не отменят"""
+        while True:
+            await asyncio.sleep(self.ttl / 3)
+            try:
+                if not await redis_lock.extend(self.ttl, replace_ttl=True):
+                    return
+            except LockError:
+                # Блокировка уже истекла или перешла другому воркеру, продлевать нечего
+                return
+            except RedisError:
+                # Сбой связи с Redis: пробуем на следующем шаге, запас ttl на это есть
+                continue
@@ -0,0 +1,121 @@
+import time
+
+from opentelemetry.trace import Status, StatusCode, SpanKind
+
+from internal import interface
+from internal import model
+
+get_applied_migrations = """
+SELECT version, name, duration_ms, applied_at
+FROM schema_migrations
+ORDER BY version;
+"""
+
+# Для транзакционных шагов длительность считается в той же транзакции, что и сама миграция
+record_migration = """
+INSERT INTO schema_migrations (version, name, duration_ms)
+VALUES (
+    :version,
+    :name,
+    COALESCE(CAST(:duration_ms AS double precision), EXTRACT(EPOCH FROM clock_timestamp() - NOW()) * 1000)
+);
+"""
+
+
+class Migrator(interface.IMigrator):
+    def __init__(
+            self,
+            tel: interface.ITelemetry,
+            db: interface.IDB,
+            migrations: list[model.Migration],
+            lock_name: str = "schema_migrations",
+    ):
+        self.tracer = tel.tracer()
+        self.logger = tel.logger()
+        self.db = db
+        self.migrations = sorted(migrations, key=lambda migration: migration.version)
+        self.lock_name = lock_name
+
+    async def migrate(self) -> list[int]:
+        """Применяет недостающие миграции и возвращает их версии.
+
+        Все воркеры ждут одну advisory блокировку, поэтому миграции выполняет первый,
+        а остальные после нее видят уже записанные версии и ничего не делают.
+        """
+        with self.tracer.start_as_current_span(
+                "Migrator.migrate",
+                kind=SpanKind.INTERNAL,
+                attributes={"lock_name": self.lock_name}
+        ) as span:
+            try:
+                async with self.db.advisory_lock(self.lock_name):
+                    # Внутри блокировки: параллельные CREATE TABLE IF NOT EXISTS конфликтуют в pg_type
+                    await self.db.multi_query([model.create_schema_migrations_table])
+                    applied_versions = {migration.version for migration in await self.applied()}
+                    pending = [
+                        migration for migration in self.migrations
+                        if migration.version not in applied_versions
+                    ]
+
+                    for migration in pending:
+                        await self._apply(migration)
+
+                versions = [migration.version for migration in pending]
+                span.set_attribute("migrations.applied", len(versions))
+                span.set_status(Status(StatusCode.OK))
+                return versions
+            except Exception as err:
+                span.record_exception(err)
+                span.set_status(Status(StatusCode.ERROR, str(err)))
+                raise err
+
+    async def applied(self) -> list[model.AppliedMigration]:
+        rows = await self.db.select(get_applied_migrations, {})
+        return model.AppliedMigration.serialize(rows) if rows else []
+
+    async def _apply(self, migration: model.Migration):
+        with self.tracer.start_as_current_span(
+                "Migrator._apply",
+                kind=SpanKind.INTERNAL,
+                attributes={
+                    "migration.version": migration.version,
+                    "migration.name": migration.name,
+                    "migration.concurrently": migration.concurrently,
+                }
+        ) as span:
+            try:
+                self.logger.info("Применяем миграцию", {
+                    "migration.version": migration.version,
+                    "migration.name": migration.name,
+                })
+                args = {"version": migration.version, "name": migration.name, "duration_ms": None}
+
+                start = time.perf_counter()
+                if migration.concurrently:
+                    for query in migration.queries:
+                        step_start = time.perf_counter()
+                        await self.db.autocommit([query])
+                        self.logger.info("Шаг миграции выполнен", {
+                            "migration.version": migration.version,
+                            "migration.step": query.strip().splitlines()[0],
+                            "duration_ms": round((time.perf_counter() - step_start) * 1000, 2),
+                        })
+                    args["duration_ms"] = (time.perf_counter() - start) * 1000
+                    await self.db.update(record_migration, args)
+                else:
+                    await self.db.transaction(
+                        [(query, {}) for query in migration.queries] + [(record_migration, args)]
+                    )
+
+                duration_ms = round((time.perf_counter() - start) * 1000, 2)
+                span.set_attribute("migration.duration_ms", duration_ms)
+                self.logger.info("Миграция применена", {
+                    "migration.version": migration.version,
+                    "migration.name": migration.name,
+                    "duration_ms": duration_ms,
+                })
+                span.set_status(Status(StatusCode.OK))
+            except Exception as err:
+                span.record_exception(err)
+                span.set_status(Status(StatusCode.ERROR, str(err)))
+                raise err
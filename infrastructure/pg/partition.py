@@ -0,0 +1,239 @@
+import re
+from datetime import date, datetime, timezone
+
+from opentelemetry.trace import Status, StatusCode, SpanKind
+
+from internal import interface
+from internal import model
+
+list_messages_partitions = """
+SELECT child.relname AS name
+FROM pg_inherits
+JOIN pg_class child ON child.oid = pg_inherits.inhrelid
+JOIN pg_class parent ON parent.oid = pg_inherits.inhparent
+WHERE parent.relname = 'messages' AND parent.relkind = 'p'
+ORDER BY child.relname;
+"""
+
+ensure_messages_partitions = """
+SELECT messages_ensure_partitions(NOW(), NOW() + make_interval(months => CAST(:premake_months AS integer)));
+"""
+
+create_messages_archive_table = f"""
+CREATE TABLE IF NOT EXISTS {model.messages_archive_schema}.messages (
+    LIKE public.messages INCLUDING DEFAULTS
+);
+"""
+
+_columns = "id, chat_id, role, text, token_count, created_at, updated_at"
+
+# Для hash, несекционированной таблицы и default секции range схемы: удаление окнами по первичному
+# ключу, чтобы не держать длинную транзакцию. Индекса по created_at нет, а окно id читается по
+# первичному ключу без прохода по всей таблице. {table} — messages или messages_default
+next_message_id = """
+SELECT MIN(id) FROM {table} WHERE id > :after_id;
+"""
+
+delete_expired_messages = """
+DELETE FROM {table}
+WHERE id BETWEEN :start_id AND :end_id AND created_at < :cutoff;
+"""
+
+archive_expired_messages = """
+WITH moved AS (
+    DELETE FROM {table}
+    WHERE id BETWEEN :start_id AND :end_id AND created_at < :cutoff
+    RETURNING {table}.*
+)
+INSERT INTO {archive_schema}.messages ({columns})
+SELECT {columns} FROM moved;
+"""
+
+get_maintenance_progress = """
+SELECT last_id FROM maintenance_progress WHERE name = :name;
+"""
+
+get_messages_max_id = """
+SELECT COALESCE(MAX(id), 0) FROM messages;
+"""
+
+# Пачка пересчета и ее граница в maintenance_progress фиксируются одним оператором,
+# прерванный запуск продолжится со следующей пачки. Оценка та же, что у pkg.tokenizer
+# без tiktoken: три символа на токен
+backfill_messages_token_count = """
+WITH progress AS (
+    INSERT INTO maintenance_progress (name, last_id)
+    VALUES (:name, :end_id)
+    ON CONFLICT (name) DO UPDATE SET last_id = EXCLUDED.last_id, updated_at = NOW()
+)
+UPDATE messages SET token_count = CEIL(LENGTH(text) / 3.0)::integer
+WHERE id BETWEEN :start_id AND :end_id AND token_count = 0 AND text <> '';
+"""
+
+TOKEN_COUNT_BACKFILL = "messages_token_count_backfill"
+
+
+class MessagesMaintenance(interface.IMessagesMaintenance):
+    """Создание будущих секций messages и удаление или архивирование старых сообщений.
+
+    Запускается по расписанию командой maintain_messages. Для range схемы старые месяцы
+    отсоединяются целиком и переносятся в схему архива или удаляются, для hash и
+    несекционированной таблицы старые строки удаляются пачками. Заодно пачками по id
+    пересчитывается token_count сообщений, записанных до его появления.
+    """
+
+    def __init__(
+            self,
+            tel: interface.ITelemetry,
+            db: interface.IDB,
+            strategy: str,
+            premake_months: int = 3,
+            retention_months: int = 0,
+            archive: bool = True,
+            batch_size: int = 5000,
+            lock_name: str = "messages_maintenance",
+    ):
+        self.tracer = tel.tracer()
+        self.logger = tel.logger()
+        self.db = db
+        self.strategy = strategy
+        self.premake_months = premake_months
+        self.retention_months = retention_months
+        self.archive = archive
+        self.batch_size = batch_size
+        self.lock_name = lock_name
+
+    async def maintain(self) -> dict:
+        with self.tracer.start_as_current_span(
+                "MessagesMaintenance.maintain",
+                kind=SpanKind.INTERNAL,
+                attributes={
+                    "strategy": self.strategy,
+                    "retention_months": self.retention_months,
+                }
+        ) as span:
+            try:
+                result = {
+                    "partitions_created": 0,
+                    "partitions_expired": 0,
+                    "messages_expired": 0,
+                    "messages_backfilled": 0,
+                }
+
+                async with self.db.advisory_lock(self.lock_name):
+                    if self.strategy == "range":
+                        rows = await self.db.select(ensure_messages_partitions, {
+                            "premake_months": self.premake_months
+                        })
+                        result["partitions_created"] = rows[0][0]
+
+                    if self.retention_months > 0:
+                        cutoff = _add_months(datetime.now(timezone.utc).date(), -self.retention_months)
+                        if self.archive:
+                            await self.db.multi_query([
+                                f"CREATE SCHEMA IF NOT EXISTS {model.messages_archive_schema};",
+                                create_messages_archive_table,
+                            ])
+
+                        if self.strategy == "range":
+                            result["partitions_expired"] = await self._expire_partitions(cutoff)
+                            # В default секцию попадают строки вне месячных секций, порядок их id не связан
+                            # с created_at, поэтому она небольшая и проверяется целиком
+                            result["messages_expired"] = await self._expire_messages(
+                                cutoff, "messages_default", whole_table=True
+                            )
+                        else:
+                            result["messages_expired"] = await self._expire_messages(cutoff, "messages")
+
+                    # После срока хранения: удаленные строки пересчитывать незачем
+                    result["messages_backfilled"] = await self._backfill_token_count()
+
+                for key, value in result.items():
+                    span.set_attribute(key, value)
+                self.logger.info("Обслуживание messages завершено", result)
+                span.set_status(Status(StatusCode.OK))
+                return result
+            except Exception as err:
+                span.record_exception(err)
+                span.set_status(Status(StatusCode.ERROR, str(err)))
+                raise err
+
+    async def _expire_partitions(self, cutoff: date) -> int:
+        expired = 0
+        for row in await self.db.select(list_messages_partitions, {}):
+            name = row[0]
+            match = re.match(model.messages_range_partition_pattern, name)
+            if not match:
+                continue
+
+            # Секция целиком старше границы: верхняя граница месяца не позже cutoff
+            partition_end = _add_months(date(int(match.group(1)), int(match.group(2)), 1), 1)
+            if partition_end > cutoff:
+                continue
+
+            queries = [f"ALTER TABLE messages DETACH PARTITION {name};"]
+            if self.archive:
+                queries.append(f"ALTER TABLE {name} SET SCHEMA {model.messages_archive_schema};")
+            else:
+                queries.append(f"DROP TABLE {name};")
+            await self.db.multi_query(queries)
+
+            self.logger.info("Секция messages снята по сроку хранения", {
+                "partition": name,
+                "archived": self.archive,
+            })
+            expired += 1
+        return expired
+
+    async def _expire_messages(self, cutoff: date, table: str, whole_table: bool = False) -> int:
+        if self.archive:
+            query = archive_expired_messages.format(
+                table=table,
+                archive_schema=model.messages_archive_schema,
+                columns=_columns,
+            )
+        else:
+            query = delete_expired_messages.format(table=table)
+        cutoff_at = datetime.combine(cutoff, datetime.min.time(), tzinfo=timezone.utc)
+
+        # id растет вместе с created_at, поэтому старые сообщения лежат в начале первичного ключа.
+        # Окна идут от самого старого id, пока первое сообщение окна не окажется моложе границы
+        expired = 0
+        after_id = 0
+        while True:
+            rows = await self.db.select(next_message_id.format(table=table), {"after_id": after_id})
+            start_id = rows[0][0]
+            if start_id is None:
+                return expired
+
+            end_id = start_id + self.batch_size - 1
+            # Через путь записи: select мог бы уйти на реплику или в EXPLAIN ANALYZE медленных запросов
+            deleted = await self.db.delete(query, {"cutoff": cutoff_at, "start_id": start_id, "end_id": end_id})
+            expired += deleted
+            if deleted == 0 and not whole_table:
+                return expired
+            after_id = end_id
+
+    async def _backfill_token_count(self) -> int:
+        rows = await self.db.select(get_maintenance_progress, {"name": TOKEN_COUNT_BACKFILL})
+        last_id = rows[0][0] if rows else 0
+        max_id = (await self.db.select(get_messages_max_id, {}))[0][0]
+
+        # Каждая пачка — отдельная короткая транзакция по диапазону первичного ключа.
+        # Новые сообщения пишутся с token_count, поэтому следующие запуски проходят только их id
+        backfilled = 0
+        while last_id < max_id:
+            end_id = min(last_id + self.batch_size, max_id)
+            backfilled += await self.db.update(backfill_messages_token_count, {
+                "name": TOKEN_COUNT_BACKFILL,
+                "start_id": last_id + 1,
+                "end_id": end_id,
+            })
+            last_id = end_id
+        return backfilled
+
+
+def _add_months(value: date, months: int) -> date:
+    """Первое число месяца, отстоящего от value на months"""
+    month_index = value.year * 12 + value.month - 1 + months
+    return date(month_index // 12, month_index % 12 + 1, 1)
@@ -1,26 +1,64 @@
-from typing import Any, Sequence
+import asyncio
+import itertools
+import math
+import time
+import uuid
+from contextlib import asynccontextmanager
+from typing import Any, AsyncIterator, Sequence
 
-from opentelemetry.trace import Status, StatusCode, SpanKind
+from opentelemetry.metrics import CallbackOptions, Observation
+from opentelemetry.trace import Status, StatusCode, SpanKind, get_current_span
 from sqlalchemy import text
+from sqlalchemy.exc import DBAPIError, InterfaceError, OperationalError, TimeoutError as PoolTimeoutError
 from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker, create_async_engine
 
+from infrastructure.pg.query_stats import DB_QUERY_FINGERPRINT_KEY, fingerprint, normalize
 from internal import interface
 
 
+DB_CONNECTION_COUNT_METRIC = "db.client.connection.count"
+DB_CONNECTION_MAX_METRIC = "db.client.connection.max"
+DB_CONNECTION_OVERFLOW_METRIC = "db.client.connection.overflow"
+DB_CONNECTION_WAIT_TIME_METRIC = "db.client.connection.wait_time"
+DB_POOL_NAME_KEY = "db.client.connection.pool.name"
+DB_CONNECTION_STATE_KEY = "db.client.connection.state"
+
+# Ожидание соединения обычно доли миллисекунды, стандартные границы гистограммы для него слишком грубые
+CHECKOUT_WAIT_BUCKETS = [0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30]
+
+
 def NewPool(
         db_user,
         db_pass,
         db_host
         , db_port,
-        db_name
+        db_name,
+        pool_size: int = 15,
+        max_overflow: int = 15,
+        pool_recycle: int = 300,
+        pool_timeout: float = 30,
+        pgbouncer: bool = False,
 ):
+    connect_args = {}
+    if pgbouncer:
+        # В transaction режиме PgBouncer соединение сервера меняется между транзакциями:
+        # без кэша подготовленных выражений и с уникальными именами они не переживают смену
+        connect_args = {
+            "statement_cache_size": 0,
+            "prepared_statement_cache_size": 0,
+            "prepared_statement_name_func": lambda: f"__asyncpg_{uuid.uuid4()}__",
+        }
+
     async_engine = create_async_engine(
         f"postgresql+asyncpg://{db_user}:{db_pass}@{db_host}:{db_port}/{db_name}",
         echo=False,
         future=True,
-        pool_size=15,
-        max_overflow=15,
-        pool_recycle=300
+        pool_size=pool_size,
+        max_overflow=max_overflow,
+        pool_recycle=pool_recycle,
+        pool_timeout=pool_timeout,
+        pool_pre_ping=pgbouncer,
+        connect_args=connect_args
     )
 
     pool = async_sessionmaker(
@@ -29,75 +67,359 @@ def NewPool(
         autoflush=False,
         expire_on_commit=False
     )
-    return pool
+    return async_engine, pool
+
+
+class Replica:
+    __slots__ = ("host", "engine", "pool", "retry_at")
+
+    def __init__(self, host: str, engine, pool):
+        self.host = host
+        self.engine = engine
+        self.pool = pool
+        # До этого момента реплика считается недоступной и запросы идут мимо нее
+        self.retry_at = 0.0
+
+
+def _is_connection_error(err: Exception) -> bool:
+    # PoolTimeoutError: все соединения к реплике заняты дольше pool_timeout, читаем с другой или с primary
+    if isinstance(err, (OSError, asyncio.TimeoutError, PoolTimeoutError, InterfaceError, OperationalError)):
+        return True
+    return isinstance(err, DBAPIError) and err.connection_invalidated
+
+
+def _sticky_store_key(sticky_key: str) -> str:
+    return f"pg_sticky:{sticky_key}"
 
 
 class PG(interface.IDB):
 
-    def __init__(self, tel: interface.ITelemetry, db_user, db_pass, db_host, db_port, db_name):
-        self.pool = NewPool(db_user, db_pass, db_host, db_port, db_name)
+    def __init__(
+            self,
+            tel: interface.ITelemetry,
+            db_user,
+            db_pass,
+            db_host,
+            db_port,
+            db_name,
+            replica_hosts: list[str] = None,
+            sticky_window: float = 2.0,
+            replica_retry_interval: float = 5.0,
+            pool_size: int = 15,
+            max_overflow: int = 15,
+            pool_recycle: int = 300,
+            pool_timeout: float = 30,
+            slow_checkout_threshold: float = 0.1,
+            pgbouncer: bool = False,
+            query_stats: interface.IQueryStats = None,
+            explain_timeout: float = 5.0,
+            sticky_store: interface.IRedis = None,
+    ):
+        pool_options = {
+            "pool_size": pool_size,
+            "max_overflow": max_overflow,
+            "pool_recycle": pool_recycle,
+            "pool_timeout": pool_timeout,
+            "pgbouncer": pgbouncer,
+        }
+        self.engine, self.pool = NewPool(db_user, db_pass, db_host, db_port, db_name, **pool_options)
         self.tracer = tel.tracer()
+        self.logger = tel.logger()
+
+        # host или host:port, остальное как у primary
+        self.replicas = []
+        for replica_host in replica_hosts or []:
+            host, _, port = replica_host.partition(":")
+            engine, pool = NewPool(db_user, db_pass, host, port or db_port, db_name, **pool_options)
+            self.replicas.append(Replica(replica_host, engine, pool))
+        self._next_replica = itertools.cycle(self.replicas)
 
-    async def insert(self, query: str, query_params: dict) -> int:
+        self.max_connections = pool_size + max_overflow
+        self.slow_checkout_threshold = slow_checkout_threshold
+        meter = tel.meter()
+        meter.create_observable_gauge(
+            name=DB_CONNECTION_COUNT_METRIC,
+            callbacks=[self._observe_connections],
+            description="Connections in the pool by state: used, idle",
+            unit="{connection}"
+        )
+        meter.create_observable_gauge(
+            name=DB_CONNECTION_OVERFLOW_METRIC,
+            callbacks=[self._observe_overflow],
+            description="Connections opened above pool_size",
+            unit="{connection}"
+        )
+        meter.create_observable_gauge(
+            name=DB_CONNECTION_MAX_METRIC,
+            callbacks=[self._observe_max],
+            description="Maximum connections allowed: pool_size + max_overflow",
+            unit="{connection}"
+        )
+        self.checkout_wait = meter.create_histogram(
+            name=DB_CONNECTION_WAIT_TIME_METRIC,
+            description="Time spent waiting for a pool connection in seconds",
+            unit="s",
+            explicit_bucket_boundaries_advisory=CHECKOUT_WAIT_BUCKETS
+        )
+
+        self.query_stats = query_stats
+        # EXPLAIN ANALYZE повторно выполняет медленный запрос на соединении из общего пула,
+        # statement_timeout не дает ему держать соединение дольше этого предела
+        self.explain_timeout = explain_timeout
+        self._explain_tasks: set[asyncio.Task] = set()
+
+        # Ключ -> момент, до которого его чтения идут на primary (read-your-writes).
+        # Словарь видит только свой процесс: при нескольких воркерах метка дублируется
+        # в sticky_store, иначе чтение в другом воркере сразу после записи может уйти на реплику
+        self.sticky_window = sticky_window
+        self.sticky_store = sticky_store
+        self._sticky_until: dict[str, float] = {}
+        self.replica_retry_interval = replica_retry_interval
+
+    async def insert(self, query: str, query_params: dict, sticky_key: str = None) -> int | None:
         with self.tracer.start_as_current_span(
                 "PG.insert",
                 kind=SpanKind.CLIENT,
         ) as span:
             try:
-                async with self.pool() as session:
+                self._describe(span, query, query_params)
+                async with self._session() as session:
+                    start = time.perf_counter()
                     result = await session.execute(text(query), query_params)
                     rows = result.all()
                     await session.commit()
+                    self._observe(span, "insert", query, time.perf_counter() - start, len(rows))
+                    await self._stick(sticky_key)
                     span.set_status(Status(StatusCode.OK))
-                    return rows[0][0]
+                    # ON CONFLICT DO NOTHING при конфликте не возвращает строк
+                    return rows[0][0] if rows else None
 
             except Exception as err:
                 span.record_exception(err)
                 span.set_status(Status(StatusCode.ERROR, str(err)))
                 raise err
 
-    async def delete(self, query: str, query_params: dict) -> None:
+    async def delete(self, query: str, query_params: dict, sticky_key: str = None) -> int:
+        """Число затронутых строк верхнего оператора"""
         with self.tracer.start_as_current_span(
                 "PG.delete",
                 kind=SpanKind.CLIENT,
         ) as span:
             try:
-                async with self.pool() as session:
-                    await session.execute(text(query), query_params)
+                self._describe(span, query, query_params)
+                async with self._session() as session:
+                    start = time.perf_counter()
+                    result = await session.execute(text(query), query_params)
                     await session.commit()
+                    self._observe(span, "delete", query, time.perf_counter() - start, result.rowcount)
+                    await self._stick(sticky_key)
                     span.set_status(Status(StatusCode.OK))
+                    return result.rowcount
             except Exception as err:
                 span.record_exception(err)
                 span.set_status(Status(StatusCode.ERROR, str(err)))
                 raise err
 
-    async def update(self, query: str, query_params: dict) -> None:
+    async def update(self, query: str, query_params: dict, sticky_key: str = None) -> int:
+        """Число затронутых строк верхнего оператора"""
         with self.tracer.start_as_current_span(
                 "PG.update",
                 kind=SpanKind.CLIENT,
         ) as span:
             try:
-                async with self.pool() as session:
-                    await session.execute(text(query), query_params)
+                self._describe(span, query, query_params)
+                async with self._session() as session:
+                    start = time.perf_counter()
+                    result = await session.execute(text(query), query_params)
                     await session.commit()
+                    self._observe(span, "update", query, time.perf_counter() - start, result.rowcount)
+                    await self._stick(sticky_key)
                     span.set_status(Status(StatusCode.OK))
+                    return result.rowcount
             except Exception as err:
                 span.record_exception(err)
                 span.set_status(Status(StatusCode.ERROR, str(err)))
                 raise err
 
-    async def select(self, query: str, query_params: dict) -> Sequence[Any]:
+    async def select(
+            self,
+            query: str,
+            query_params: dict,
+            replica: bool = False,
+            sticky_key: str = None,
+    ) -> Sequence[Any]:
+        """replica=True разрешает чтение с реплики, если по sticky_key недавно не было записи"""
         with self.tracer.start_as_current_span(
                 "PG.select",
                 kind=SpanKind.CLIENT,
         ) as span:
             try:
-                async with self.pool() as session:
-                    result = await session.execute(text(query), query_params)
+                self._describe(span, query, query_params)
+                # Недоступная реплика выпадает из ротации, пробуем следующую, в конце primary
+                replica = replica and not await self._is_sticky(sticky_key)
+                target = self._route(replica)
+                while target is not None:
+                    span.set_attribute("db.replica", target.host)
+                    try:
+                        rows = await self._select(span, target.pool, query, query_params, target.host)
+                        span.set_status(Status(StatusCode.OK))
+                        return rows
+                    except Exception as err:
+                        if not _is_connection_error(err):
+                            raise err
+                        self._mark_unhealthy(target, err)
+                        span.set_attribute("db.replica_failover", True)
+                        target = self._route(replica)
+
+                span.set_attribute("db.replica", "primary")
+                rows = await self._select(span, self.pool, query, query_params, "primary")
+                span.set_status(Status(StatusCode.OK))
+                return rows
+            except Exception as err:
+                span.record_exception(err)
+                span.set_status(Status(StatusCode.ERROR, str(err)))
+                raise err
+
+    async def _select(
+            self,
+            span,
+            pool: async_sessionmaker,
+            query: str,
+            query_params: dict,
+            pool_name: str,
+    ) -> Sequence[Any]:
+        async with self._session(pool, pool_name) as session:
+            start = time.perf_counter()
+            result = await session.execute(text(query), query_params)
+            await session.commit()
+            rows = result.all()
+            if self._observe(span, "select", query, time.perf_counter() - start, len(rows)):
+                self._explain_later(pool, query, query_params)
+            return rows
+
+    def _describe(self, span, query: str, query_params: dict):
+        """Запрос в спане до выполнения, чтобы он был и у упавших. Значения параметров не пишем, только имена"""
+        span.set_attributes({
+            "db.system": "postgresql",
+            "db.statement": normalize(query),
+            DB_QUERY_FINGERPRINT_KEY: fingerprint(query),
+            "db.query.params": ",".join(sorted(query_params)),
+        })
+
+    def _observe(self, span, operation: str, query: str, duration: float, rows: int) -> bool:
+        """Число строк в спан и длительность в статистику, True если пора снять план запроса"""
+        span.set_attribute("db.rows_affected", rows)
+        if self.query_stats is None:
+            return False
+        return self.query_stats.record(operation, query, duration, rows)
+
+    def _explain_later(self, pool: async_sessionmaker, query: str, query_params: dict):
+        # План снимается в фоне, ответ на исходный запрос его не ждет
+        task = asyncio.create_task(self._explain(pool, query, query_params))
+        self._explain_tasks.add(task)
+        task.add_done_callback(self._explain_tasks.discard)
+
+    async def _explain(self, pool: async_sessionmaker, query: str, query_params: dict):
+        try:
+            async with pool() as session:
+                # set_config(..., true) действует как SET LOCAL: только до конца транзакции плана
+                await session.execute(
+                    text("SELECT set_config('statement_timeout', :timeout, true)"),
+                    {"timeout": f"{int(self.explain_timeout * 1000)}ms"}
+                )
+                result = await session.execute(text("EXPLAIN (ANALYZE, BUFFERS) " + query), query_params)
+                plan = "\n".join(row[0] for row in result.all())
+                await session.rollback()
+            self.query_stats.set_plan(query, plan)
+        except Exception as err:
+            self.logger.warning("Не удалось снять план медленного запроса", {
+                DB_QUERY_FINGERPRINT_KEY: fingerprint(query),
+                "error": str(err),
+            })
+
+    def _route(self, replica: bool) -> Replica | None:
+        """Реплика для чтения или None, если читать нужно с primary"""
+        if not replica or not self.replicas:
+            return None
+
+        now = time.monotonic()
+        for _ in range(len(self.replicas)):
+            candidate = next(self._next_replica)
+            if candidate.retry_at <= now:
+                return candidate
+        return None
+
+    async def _is_sticky(self, sticky_key: str = None) -> bool:
+        """По ключу недавно писали, его чтения должны идти на primary"""
+        if sticky_key is None or not self.replicas:
+            return False
+        if self._sticky_until.get(sticky_key, 0.0) > time.monotonic():
+            return True
+        if self.sticky_store is None:
+            return False
+
+        try:
+            return await self.sticky_store.get(_sticky_store_key(sticky_key)) is not None
+        except Exception as err:
+            # Без метки нельзя обещать свежие данные, поэтому читаем с primary
+            self.logger.warning("Не удалось проверить метку записи, чтение идет на primary", {
+                "sticky_key": sticky_key,
+                "error": str(err),
+            })
+            return True
+
+    async def _stick(self, sticky_key: str = None):
+        if sticky_key is None or not self.replicas:
+            return
+
+        now = time.monotonic()
+        if len(self._sticky_until) > 10000:
+            self._sticky_until = {key: until for key, until in self._sticky_until.items() if until > now}
+        self._sticky_until[sticky_key] = now + self.sticky_window
+
+        if self.sticky_store is None:
+            return
+        try:
+            # TTL Redis в целых секундах: окно округляется вверх, лишнее чтение с primary безопасно
+            await self.sticky_store.set(_sticky_store_key(sticky_key), 1, ttl=math.ceil(self.sticky_window))
+        except Exception as err:
+            self.logger.warning("Не удалось сохранить метку записи, другие воркеры могут читать с реплики", {
+                "sticky_key": sticky_key,
+                "error": str(err),
+            })
+
+    def _mark_unhealthy(self, target: Replica, err: Exception):
+        target.retry_at = time.monotonic() + self.replica_retry_interval
+        self.logger.warning("Реплика недоступна, чтение переключено на primary", {
+            "db.replica": target.host,
+            "retry_interval": self.replica_retry_interval,
+            "error": str(err),
+        })
+
+    async def transaction(self, queries: list[tuple[str, dict]], sticky_key: str = None) -> None:
+        with self.tracer.start_as_current_span(
+                "PG.transaction",
+                kind=SpanKind.CLIENT,
+                attributes={"queries": len(queries)}
+        ) as span:
+            try:
+                span.set_attributes({
+                    "db.system": "postgresql",
+                    "db.query.fingerprints": [fingerprint(query) for query, _ in queries],
+                })
+                async with self._session() as session:
+                    rows_affected = 0
+                    for query, query_params in queries:
+                        start = time.perf_counter()
+                        result = await session.execute(text(query), query_params)
+                        rows = max(result.rowcount, 0)
+                        rows_affected += rows
+                        if self.query_stats is not None:
+                            self.query_stats.record("transaction", query, time.perf_counter() - start, rows)
                     await session.commit()
-                    rows = result.all()
+                    span.set_attribute("db.rows_affected", rows_affected)
+                    await self._stick(sticky_key)
                     span.set_status(Status(StatusCode.OK))
-                    return rows
             except Exception as err:
                 span.record_exception(err)
                 span.set_status(Status(StatusCode.ERROR, str(err)))
@@ -107,8 +429,97 @@ class PG(interface.IDB):
             self,
             queries: list[str]
     ) -> None:
-        async with self.pool() as session:
+        async with self._session() as session:
             for query in queries:
                 await session.execute(text(query))
             await session.commit()
         return None
+
+    async def autocommit(self, queries: list[str]) -> None:
+        """Запросы вне транзакции, например CREATE INDEX CONCURRENTLY"""
+        with self.tracer.start_as_current_span(
+                "PG.autocommit",
+                kind=SpanKind.CLIENT,
+                attributes={"queries": len(queries)}
+        ) as span:
+            try:
+                async with self.engine.connect() as conn:
+                    conn = await conn.execution_options(isolation_level="AUTOCOMMIT")
+                    for query in queries:
+                        await conn.execute(text(query))
+                    span.set_status(Status(StatusCode.OK))
+            except Exception as err:
+                span.record_exception(err)
+                span.set_status(Status(StatusCode.ERROR, str(err)))
+                raise err
+
+    @asynccontextmanager
+    async def advisory_lock(self, name: str, poll_interval: float = 0.5) -> AsyncIterator[None]:
+        """Сессионная advisory блокировка: держит отдельное соединение до выхода из контекста.
+
+        Ждем через pg_try_advisory_lock, а не блокирующий pg_advisory_lock: висящий запрос
+        ожидающего держит снимок, и CREATE INDEX CONCURRENTLY владельца блокировки ждал бы его вечно.
+        """
+        async with self.engine.connect() as conn:
+            conn = await conn.execution_options(isolation_level="AUTOCOMMIT")
+            while not (await conn.execute(
+                    text("SELECT pg_try_advisory_lock(hashtext(:name));"),
+                    {"name": name}
+            )).scalar():
+                await asyncio.sleep(poll_interval)
+            try:
+                yield
+            finally:
+                await conn.execute(text("SELECT pg_advisory_unlock(hashtext(:name));"), {"name": name})
+
+    @asynccontextmanager
+    async def _session(self, pool: async_sessionmaker = None, pool_name: str = "primary") -> AsyncIterator[AsyncSession]:
+        """Сессия с уже выданным соединением: ожидание пула меряется отдельно от запроса"""
+        async with (pool or self.pool)() as session:
+            start = time.perf_counter()
+            await session.connection()
+            wait = time.perf_counter() - start
+
+            self.checkout_wait.record(wait, {DB_POOL_NAME_KEY: pool_name})
+            if wait >= self.slow_checkout_threshold:
+                self._warn_slow_checkout(pool_name, session, wait)
+            yield session
+
+    def _warn_slow_checkout(self, pool_name: str, session: AsyncSession, wait: float):
+        sync_pool = session.bind.sync_engine.pool
+        fields = {
+            DB_POOL_NAME_KEY: pool_name,
+            "wait_ms": round(wait * 1000, 2),
+            "checked_out": sync_pool.checkedout(),
+            "overflow": max(sync_pool.overflow(), 0),
+            "max_connections": self.max_connections,
+        }
+        # Лог пишется внутри спана запроса, поэтому несет его trace_id и span_id
+        get_current_span().add_event("db.connection.slow_checkout", fields)
+        self.logger.warning("Долгое ожидание соединения из пула", fields)
+
+    def _pools(self):
+        yield "primary", self.engine.sync_engine.pool
+        for replica in self.replicas:
+            yield replica.host, replica.engine.sync_engine.pool
+
+    def _observe_connections(self, options: CallbackOptions):
+        for pool_name, sync_pool in self._pools():
+            yield Observation(sync_pool.checkedout(), {DB_POOL_NAME_KEY: pool_name, DB_CONNECTION_STATE_KEY: "used"})
+            yield Observation(sync_pool.checkedin(), {DB_POOL_NAME_KEY: pool_name, DB_CONNECTION_STATE_KEY: "idle"})
+
+    def _observe_overflow(self, options: CallbackOptions):
+        for pool_name, sync_pool in self._pools():
+            # До заполнения pool_size overflow отрицательный
+            yield Observation(max(sync_pool.overflow(), 0), {DB_POOL_NAME_KEY: pool_name})
+
+    def _observe_max(self, options: CallbackOptions):
+        for pool_name, _ in self._pools():
+            yield Observation(self.max_connections, {DB_POOL_NAME_KEY: pool_name})
+
+    async def close(self) -> None:
+        for task in self._explain_tasks:
+            task.cancel()
+        await self.engine.dispose()
+        for replica in self.replicas:
+            await replica.engine.dispose()
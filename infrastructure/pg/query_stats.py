@@ -0,0 +1,132 @@
+import hashlib
+import re
+import time
+from datetime import datetime, timezone
+from functools import lru_cache
+
+from internal import interface
+
+DB_OPERATION_DURATION_METRIC = "db.client.operation.duration"
+DB_OPERATION_KEY = "db.operation.name"
+DB_QUERY_FINGERPRINT_KEY = "db.query.fingerprint"
+
+# Отпечатков столько же, сколько констант запросов. Запросы, собранные с литералами,
+# дали бы бесконечно много, сверх предела они идут в метрику как other и в отчет не попадают
+MAX_FINGERPRINTS = 1000
+
+_whitespace = re.compile(r"\s+")
+
+
+@lru_cache(maxsize=MAX_FINGERPRINTS)
+def normalize(query: str) -> str:
+    return _whitespace.sub(" ", query).strip()
+
+
+@lru_cache(maxsize=MAX_FINGERPRINTS)
+def fingerprint(query: str) -> str:
+    """Стабильный между процессами отпечаток текста запроса без учета форматирования"""
+    return hashlib.blake2b(normalize(query).encode(), digest_size=8).hexdigest()
+
+
+class QueryStat:
+    """Накопленная статистика одного отпечатка с момента старта процесса"""
+    __slots__ = (
+        "fingerprint", "operation", "statement", "calls", "total", "max", "rows",
+        "slow_calls", "last_slow_at", "plan", "explained_at",
+    )
+
+    def __init__(self, fingerprint: str, operation: str, statement: str):
+        self.fingerprint = fingerprint
+        self.operation = operation
+        self.statement = statement
+        self.calls = 0
+        self.total = 0.0
+        self.max = 0.0
+        self.rows = 0
+        self.slow_calls = 0
+        self.last_slow_at: datetime | None = None
+        self.plan: str | None = None
+        self.explained_at = 0.0
+
+    def to_dict(self) -> dict:
+        return {
+            "fingerprint": self.fingerprint,
+            "operation": self.operation,
+            "statement": self.statement,
+            "calls": self.calls,
+            "slow_calls": self.slow_calls,
+            "mean_ms": round(self.total / self.calls * 1000, 2),
+            "max_ms": round(self.max * 1000, 2),
+            "total_ms": round(self.total * 1000, 2),
+            "mean_rows": round(self.rows / self.calls, 1),
+            "last_slow_at": self.last_slow_at.isoformat() if self.last_slow_at else None,
+            "plan": self.plan,
+        }
+
+
+class QueryStats(interface.IQueryStats):
+    def __init__(
+            self,
+            tel: interface.ITelemetry,
+            slow_query_threshold: float = 0.5,
+            slow_queries_size: int = 20,
+            explain_interval: float = 0.0,
+    ):
+        meter = tel.meter()
+        self.duration = meter.create_histogram(
+            name=DB_OPERATION_DURATION_METRIC,
+            description="Postgres statement duration in seconds by query fingerprint",
+            unit="s"
+        )
+        self.slow_query_threshold = slow_query_threshold
+        self.slow_queries_size = slow_queries_size
+        # 0 выключает EXPLAIN ANALYZE, иначе план отпечатка снимается не чаще раза в интервал
+        self.explain_interval = explain_interval
+        self._stats: dict[str, QueryStat] = {}
+
+    def record(self, operation: str, query: str, duration: float, rows: int) -> bool:
+        """Учитывает выполнение запроса, True если пора снять его план через EXPLAIN ANALYZE"""
+        query_fingerprint = fingerprint(query)
+        stat = self._stats.get(query_fingerprint)
+        if stat is None and len(self._stats) < MAX_FINGERPRINTS:
+            stat = self._stats[query_fingerprint] = QueryStat(query_fingerprint, operation, normalize(query))
+
+        self.duration.record(duration, attributes={
+            DB_OPERATION_KEY: operation,
+            DB_QUERY_FINGERPRINT_KEY: query_fingerprint if stat is not None else "other",
+        })
+        if stat is None:
+            return False
+
+        stat.calls += 1
+        stat.total += duration
+        stat.max = max(stat.max, duration)
+        stat.rows += rows
+        if duration < self.slow_query_threshold:
+            return False
+
+        stat.slow_calls += 1
+        stat.last_slow_at = datetime.now(timezone.utc)
+
+        # ANALYZE выполняет запрос повторно, поэтому планы снимаются только для чтений
+        if self.explain_interval <= 0 or operation != "select":
+            return False
+        now = time.monotonic()
+        if stat.explained_at and now - stat.explained_at < self.explain_interval:
+            return False
+        stat.explained_at = now
+        return True
+
+    def set_plan(self, query: str, plan: str) -> None:
+        stat = self._stats.get(fingerprint(query))
+        if stat is not None:
+            stat.plan = plan
+
+    def slow_queries(self) -> list[dict]:
+        """Отпечатки с медленными выполнениями, самые долгие первыми"""
+        slow = sorted(
+            (stat for stat in self._stats.values() if stat.slow_calls),
+            key=lambda stat: stat.max,
+            reverse=True
+        )
+        return [stat.to_dict() for stat in slow[:self.slow_queries_size]]
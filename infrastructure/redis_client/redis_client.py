@@ -1,12 +1,60 @@
 import redis.asyncio as aioredis
-from redis.connection import ConnectionPool
-from typing import Any
-import json
-import asyncio
+from redis.commands.core import AsyncScript
+from contextlib import asynccontextmanager
+from typing import Any, AsyncIterator, Iterable, Mapping
 
+from infrastructure.redis_client.serializer import JsonSerializer
 from internal import interface
 
 
+class RedisPipeline:
+    """Команды копятся локально и уходят одним round trip в execute.
+
+    Значения сериализуются при постановке в очередь, результаты get
+    десериализуются в execute, остальные команды возвращают ответ Redis как есть.
+    """
+
+    def __init__(self, pipe: aioredis.client.Pipeline, serializer: interface.ISerializer):
+        self._pipe = pipe
+        self._serializer = serializer
+        self._decode: list[bool] = []
+
+    def set(self, key: str, value: Any, ttl: int = None, nx: bool = False) -> "RedisPipeline":
+        self._pipe.set(key, self._serializer.dumps(value), ex=ttl, nx=nx)
+        self._decode.append(False)
+        return self
+
+    def get(self, key: str) -> "RedisPipeline":
+        self._pipe.get(key)
+        self._decode.append(True)
+        return self
+
+    def delete(self, *keys: str) -> "RedisPipeline":
+        self._pipe.delete(*keys)
+        self._decode.append(False)
+        return self
+
+    def expire(self, key: str, ttl: int) -> "RedisPipeline":
+        self._pipe.expire(key, ttl)
+        self._decode.append(False)
+        return self
+
+    def incr(self, key: str, amount: int = 1) -> "RedisPipeline":
+        self._pipe.incrby(key, amount)
+        self._decode.append(False)
+        return self
+
+    async def execute(self) -> list[Any]:
+        results = await self._pipe.execute()
+        decode = self._decode
+        self._decode = []
+        loads = self._serializer.loads
+        return [
+            loads(result) if need_decode and result is not None else result
+            for need_decode, result in zip(decode, results)
+        ]
+
+
 class RedisClient(interface.IRedis):
     def __init__(
             self,
@@ -17,81 +65,89 @@ class RedisClient(interface.IRedis):
             max_connections: int = 20,
             socket_connect_timeout: int = 5,
             socket_timeout: int = 5,
-            decode_responses: bool = True,
             retry_on_timeout: bool = True,
-            health_check_interval: int = 30
+            health_check_interval: int = 30,
+            serializer: interface.ISerializer = None,
     ):
-        self.pool = ConnectionPool(
+        # Ответы всегда байтами: декодирование делает сериализатор, иначе msgpack невозможен
+        self.pool = aioredis.ConnectionPool(
             host=host,
             port=port,
             db=db,
-            password=password,
+            password=password or None,
             max_connections=max_connections,
             socket_connect_timeout=socket_connect_timeout,
             socket_timeout=socket_timeout,
-            decode_responses=decode_responses,
             retry_on_timeout=retry_on_timeout,
-            health_check_interval=health_check_interval
+            health_check_interval=health_check_interval,
         )
-
-        self.async_pool = None
-        self.async_client = None
+        self.client = aioredis.Redis(connection_pool=self.pool)
+        self.serializer = serializer or JsonSerializer()
+        self._scripts: dict[str, AsyncScript] = {}
 
     async def set(self, key: str, value: Any, ttl: int = None) -> bool:
-        try:
-            client = await self.get_async_client()
-            serialized_value = self._serialize_value(value)
-            if ttl:
-                return await client.setex(key, ttl, serialized_value)
-            return await client.set(key, serialized_value)
-        except Exception as e:
-            raise e
+        return bool(await self.client.set(key, self.serializer.dumps(value), ex=ttl))
+
+    async def set_nx(self, key: str, value: Any, ttl: int = None) -> bool:
+        """SET NX EX одной командой: True, если ключ создан этим вызовом"""
+        return bool(await self.client.set(key, self.serializer.dumps(value), ex=ttl, nx=True))
 
     async def get(self, key: str, default: Any = None) -> Any:
-        try:
-            client = await self.get_async_client()
-            value = await client.get(key)
-            if value is None:
-                return default
-            return self._deserialize_value(value)
-        except Exception as e:
+        value = await self.client.get(key)
+        if value is None:
             return default
+        return self.serializer.loads(value)
+
+    async def mget(self, keys: Iterable[str], default: Any = None) -> list[Any]:
+        keys = list(keys)
+        if not keys:
+            return []
+        loads = self.serializer.loads
+        return [default if value is None else loads(value) for value in await self.client.mget(keys)]
+
+    async def mset(self, mapping: Mapping[str, Any], ttl: int = None) -> bool:
+        if not mapping:
+            return True
+        dumps = self.serializer.dumps
+        if ttl is None:
+            return bool(await self.client.mset({key: dumps(value) for key, value in mapping.items()}))
+
+        # У MSET нет TTL, поэтому SET EX пачкой в одном round trip
+        async with self.client.pipeline(transaction=False) as pipe:
+            for key, value in mapping.items():
+                pipe.set(key, dumps(value), ex=ttl)
+            return all(await pipe.execute())
+
+    async def delete(self, *keys: str) -> int:
+        if not keys:
+            return 0
+        return await self.client.delete(*keys)
+
+    @asynccontextmanager
+    async def pipeline(self, transaction: bool = False) -> AsyncIterator[RedisPipeline]:
+        """Пачка команд за один round trip, transaction=True оборачивает ее в MULTI/EXEC"""
+        async with self.client.pipeline(transaction=transaction) as pipe:
+            yield RedisPipeline(pipe, self.serializer)
+
+    def register_script(self, source: str) -> AsyncScript:
+        """Lua скрипт вызывается через EVALSHA, при NOSCRIPT redis-py сам загружает его заново"""
+        script = self._scripts.get(source)
+        if script is None:
+            script = self._scripts[source] = self.client.register_script(source)
+        return script
+
+    async def eval_script(self, source: str, keys: list[str] = None, args: list[Any] = None) -> Any:
+        return await self.register_script(source)(keys=keys or [], args=args or [])
 
     async def get_async_client(self) -> aioredis.Redis:
-        if self.async_client is None:
-            self.async_pool = aioredis.ConnectionPool.from_url(
-                f"redis://:{self.pool.connection_kwargs.get('password')}@{self.pool.connection_kwargs['host']}:{self.pool.connection_kwargs['port']}/{self.pool.connection_kwargs['db']}",
-                max_connections=self.pool.max_connections,
-                decode_responses=True
-            )
-            self.async_client = aioredis.Redis(connection_pool=self.async_pool)
-        return self.async_client
-
-    def _serialize_value(self, value: Any) -> str:
-        if isinstance(value, str):
-            return value
-        return json.dumps(value, default=str, ensure_ascii=False)
-
-    def _deserialize_value(self, value: str) -> Any:
-        if not isinstance(value, str):
-            return value
-        try:
-            return json.loads(value)
-        except (json.JSONDecodeError, TypeError):
-            return value
-
-    def close(self):
-        try:
-            if self.async_client:
-                asyncio.create_task(self.async_client.aclose())
-            if self.async_pool:
-                asyncio.create_task(self.async_pool.aclose())
-            self.pool.disconnect()
-        except Exception as e:
-            pass
-
-    def __enter__(self):
+        return self.client
+
+    async def aclose(self):
+        await self.client.aclose()
+        await self.pool.aclose()
+
+    async def __aenter__(self):
         return self
 
-    def __exit__(self, exc_type, exc_val, exc_tb):
-        self.close()
+    async def __aexit__(self, exc_type, exc_val, exc_tb):
+        await self.aclose()
@@ -0,0 +1,41 @@
+from typing import Any
+
+from internal import interface
+from pkg.serializer import serializer
+
+
+class JsonSerializer(interface.ISerializer):
+    """Совместим с прежним форматом: строки пишутся как есть, остальное JSON через pkg.serializer"""
+
+    def dumps(self, value: Any) -> bytes | str:
+        if isinstance(value, str):
+            return value
+        return serializer.dumps(value)
+
+    def loads(self, data: bytes) -> Any:
+        try:
+            return serializer.loads(data)
+        except (serializer.JSONDecodeError, UnicodeDecodeError):
+            return data.decode("utf-8", errors="replace")
+
+
+class MsgpackSerializer(interface.ISerializer):
+    """Компактный бинарный формат, несовместим с JSON ключами"""
+
+    def __init__(self):
+        import msgpack
+
+        self._msgpack = msgpack
+
+    def dumps(self, value: Any) -> bytes | str:
+        return self._msgpack.packb(value, default=str, use_bin_type=True)
+
+    def loads(self, data: bytes) -> Any:
+        return self._msgpack.unpackb(data, raw=False)
+
+
+def new_serializer(name: str = "json") -> interface.ISerializer:
+    if name == "msgpack":
+        return MsgpackSerializer()
+    # orjson выбирается внутри pkg.serializer, если установлен
+    return JsonSerializer()
@@ -1,10 +1,26 @@
 import asyncio
+import time
+from collections import OrderedDict
+from typing import Awaitable, Callable
+
 from aiogram import Bot
+from aiogram.exceptions import TelegramRetryAfter
+from opentelemetry import metrics
 from infrastructure.redis_client.redis_client import RedisClient
 from aiogram.types import InlineKeyboardMarkup, InlineKeyboardButton
 
+DROPPED_ALERTS_METRIC = "alert.dropped.total"
+
 
 class AlertManager:
+    """Алерты об ошибках в Telegram.
+
+    send_error_alert только кладет trace_id в ограниченную очередь, все остальное делает
+    одна корутина-отправщик: первая ошибка уходит сразу, остальные за окно
+    aggregation_window собираются в одно сообщение "N ошибок в M трейсах".
+    Дубликаты отсекаются локальным TTL кэшем и атомарным SET NX EX в Redis между воркерами.
+    """
+
     def __init__(
             self,
             tg_bot_token: str,
@@ -16,7 +32,10 @@ class AlertManager:
             monitoring_redis_port: int,
             monitoring_redis_db: int,
             monitoring_redis_password: str,
-
+            queue_size: int = 1000,
+            aggregation_window: float = 30,
+            dedup_ttl: int = 30,
+            dedup_size: int = 10000,
     ):
         self.bot = Bot(tg_bot_token)
         self.alert_tg_chat_id = alert_tg_chat_id
@@ -30,17 +49,106 @@ class AlertManager:
             monitoring_redis_password
         )
 
+        self.aggregation_window = aggregation_window
+        self.dedup_ttl = dedup_ttl
+        self.dedup_size = dedup_size
+        self._queue: asyncio.Queue[tuple[str, str]] = asyncio.Queue(maxsize=queue_size)
+        # trace_id -> момент истечения, порядок вставки совпадает с порядком истечения
+        self._seen: OrderedDict[str, float] = OrderedDict()
+        self._sender: asyncio.Task | None = None
+        self._errors = 0
+
+        # Глобальный meter: AlertManager создается раньше телеметрии, прокси подхватит провайдер позже
+        self.dropped_alerts = metrics.get_meter(__name__).create_counter(
+            name=DROPPED_ALERTS_METRIC,
+            description="Error alerts dropped before sending",
+            unit="1"
+        )
+
     def send_error_alert(self, trace_id: str, span_id: str):
-        loop = asyncio.get_running_loop()
-        loop.create_task(self.__send_error_alert(trace_id, span_id))
+        self._errors += 1
+        now = time.monotonic()
+        if self._is_seen(trace_id, now):
+            return
+
+        try:
+            loop = asyncio.get_running_loop()
+        except RuntimeError:
+            self.dropped_alerts.add(1, attributes={"reason": "no_event_loop"})
+            return
 
-    async def __send_error_alert(self, trace_id: str, span_id: str):
-        alert_send = await self.redis_client.get(trace_id)
-        if alert_send:
+        try:
+            self._queue.put_nowait((trace_id, span_id))
+        except asyncio.QueueFull:
+            self.dropped_alerts.add(1, attributes={"reason": "queue_full"})
             return
 
-        await self.redis_client.set(trace_id, "1", ttl=30)
-        await self.__send_error_alert_to_tg(trace_id, span_id)
+        self._seen[trace_id] = now + self.dedup_ttl
+        if self._sender is None or self._sender.done():
+            self._sender = loop.create_task(self._run_sender())
+
+    def _is_seen(self, trace_id: str, now: float) -> bool:
+        seen = self._seen
+        while seen:
+            expires_at = next(iter(seen.values()))
+            if expires_at > now and len(seen) < self.dedup_size:
+                break
+            seen.popitem(last=False)
+        return trace_id in seen
+
+    async def _run_sender(self):
+        loop = asyncio.get_running_loop()
+        while True:
+            trace_id, span_id = await self._queue.get()
+            if await self._claim([trace_id]):
+                await self._send_safe(lambda: self.__send_error_alert_to_tg(trace_id, span_id))
+
+            # Все, что пришло за окно, уходит одним сообщением. Счетчик снимается на границах окна:
+            # ошибки, пришедшие пока отправлялся первый алерт или сводка, не попадают в чужое окно
+            batch: list[tuple[str, str]] = []
+            self._errors = 0
+            deadline = loop.time() + self.aggregation_window
+            while (remaining := deadline - loop.time()) > 0:
+                try:
+                    batch.append(await asyncio.wait_for(self._queue.get(), remaining))
+                except asyncio.TimeoutError:
+                    break
+
+            window_errors, self._errors = self._errors, 0
+            if not batch:
+                continue
+
+            errors = max(window_errors, len(batch))
+            new_trace_ids = await self._claim([batch_trace_id for batch_trace_id, _ in batch])
+            if new_trace_ids:
+                await self._send_safe(lambda: self.__send_aggregated_alert_to_tg(errors, new_trace_ids))
+
+    async def _claim(self, trace_ids: list[str]) -> list[str]:
+        """Атомарно помечает трейсы в Redis, возвращает те, о которых еще не сообщал ни один воркер"""
+        try:
+            async with self.redis_client.pipeline() as pipe:
+                for trace_id in trace_ids:
+                    pipe.set(self._claim_key(trace_id), "1", ttl=self.dedup_ttl, nx=True)
+                results = await pipe.execute()
+            return [trace_id for trace_id, claimed in zip(trace_ids, results) if claimed]
+        except Exception:
+            # Без Redis лучше продублировать алерт между воркерами, чем потерять его
+            return trace_ids
+
+    def _claim_key(self, trace_id: str) -> str:
+        # Redis мониторинга общий для сервисов, ключи без пространства имен пересеклись бы
+        return f"alert:{self.service_name}:{trace_id}"
+
+    async def _send_safe(self, send: Callable[[], Awaitable]):
+        try:
+            try:
+                await send()
+            except TelegramRetryAfter as err:
+                # Одна повторная попытка после паузы, которую просит Telegram
+                await asyncio.sleep(err.retry_after)
+                await send()
+        except Exception:
+            self.dropped_alerts.add(1, attributes={"reason": "send_failed"})
 
     async def __send_error_alert_to_tg(self, trace_id: str, span_id: str):
         log_link = f"{self.grafana_url}/explore?schemaVersion=1&panes=%7B%220pz%22:%7B%22datasource%22:%22loki%22,%22queries%22:%5B%7B%22refId%22:%22A%22,%22expr%22:%22%7Bservice_name%3D~%5C%22.%2B%5C%22%7D%20%7C%20trace_id%3D%60{trace_id}%60%20%7C%3D%20%60%60%22,%22queryType%22:%22range%22,%22datasource%22:%7B%22type%22:%22loki%22,%22uid%22:%22loki%22%7D,%22editorMode%22:%22code%22,%22direction%22:%22backward%22%7D%5D,%22range%22:%7B%22from%22:%22now-2d%22,%22to%22:%22now%22%7D%7D%7D&orgId=1"
@@ -61,3 +169,27 @@ SpanID: <code>{span_id}</code>"""
             message_thread_id=self.alert_tg_chat_thread_id,
             reply_markup=keyboard
         )
+
+    async def __send_aggregated_alert_to_tg(self, errors: int, trace_ids: list[str]):
+        shown_trace_ids = "\n".join(f"<code>{trace_id}</code>" for trace_id in trace_ids[:5])
+        more = f"\n... и еще {len(trace_ids) - 5}" if len(trace_ids) > 5 else ""
+        text = f"""Ошибки в сервисе: <b>{self.service_name}</b>
+{errors} ошибок в {len(trace_ids)} трейсах за последние {int(self.aggregation_window)} с
+{shown_trace_ids}{more}"""
+
+        await self.bot.send_message(
+            self.alert_tg_chat_id,
+            text,
+            parse_mode="HTML",
+            message_thread_id=self.alert_tg_chat_thread_id,
+        )
+
+    async def close(self):
+        if self._sender is not None:
+            self._sender.cancel()
+            try:
+                await self._sender
+            except asyncio.CancelledError:
+                pass
+        await self.bot.session.close()
+        await self.redis_client.aclose()
@@ -1,65 +1,88 @@
 import logging
+from functools import lru_cache
+from typing import Union, TYPE_CHECKING
 
-import inspect
-from typing import Union
-
-import asyncio
 from opentelemetry import trace
 from opentelemetry.sdk._logs import LoggerProvider, LoggingHandler
 
 from internal import common
 from internal import interface
 
-from .alertmanger import AlertManager
+if TYPE_CHECKING:
+    from .alertmanger import AlertManager
+
+# Кадры над logger.log: вызывающий код -> debug/info/... -> _log
+_CALLER_STACKLEVEL = 3
+
+
+@lru_cache(maxsize=4096)
+def _format_trace_id(trace_id: int) -> str:
+    return format(trace_id, '032x')
+
+
+@lru_cache(maxsize=4096)
+def _format_span_id(span_id: int) -> str:
+    return format(span_id, '016x')
+
+
+class _FileFilter(logging.Filter):
+    """Атрибут file из pathname и lineno, которые logging уже нашел по stacklevel.
+
+    Фильтр вызывается только для записей, прошедших проверку уровня.
+    """
+
+    def filter(self, record: logging.LogRecord) -> bool:
+        record.__dict__[common.FILE_KEY] = f"{record.pathname}:{record.lineno}"
+        return True
 
 
 class OtelLogger(interface.IOtelLogger):
     def __init__(
             self,
-            alert_manger: AlertManager | None,
+            alert_manger: 'AlertManager | None',
             logger_provider: LoggerProvider,
             service_name: str,
+            log_level: str = "DEBUG",
     ):
+        self.level = self._parse_level(log_level)
         self.handler = LoggingHandler(
-            level=logging.DEBUG,
+            level=self.level,
             logger_provider=logger_provider
         )
+        self.handler.addFilter(_FileFilter())
         self.service_name = service_name
+        self.prefix = service_name + " | "
         self.logger = logging.getLogger("main")
-        self.logger.setLevel(logging.DEBUG)
+        self.logger.setLevel(self.level)
         self.logger.addHandler(self.handler)
         self.logger.propagate = False
 
         self.alert_manger = alert_manger
 
     def log(self, level: str, message: str, fields: dict = None) -> None:
-        file_info = self._get_caller_info(3)
-        attributes: dict = {common.FILE_KEY: file_info}
+        self._log(getattr(logging, level.upper(), logging.INFO), message, fields)
 
-        if fields:
-            extra_fields = self._extract_extra_params(fields)
-            if extra_fields:
-                # attributes[common.EXTRA_LOG_FIELDS_KEY] = extra_fields
-                attributes.update(extra_fields)
+    def _log(self, levelno: int, message: str, fields: dict = None) -> None:
+        # Отключенный уровень не стоит ничего: ни атрибутов, ни поиска спана
+        if levelno < self.level:
+            return
 
-        current_span = trace.get_current_span()
-        if current_span and current_span.get_span_context().is_valid:
-            span_context = current_span.get_span_context()
+        attributes = self._extract_extra_params(fields) if fields else {}
 
-            trace_id = format(span_context.trace_id, '032x')
-            span_id = format(span_context.span_id, '016x')
+        span_context = trace.get_current_span().get_span_context()
+        if span_context.is_valid:
+            trace_id = _format_trace_id(span_context.trace_id)
+            span_id = _format_span_id(span_context.span_id)
 
-            attributes[common.TRACE_ID_KEY] =trace_id
-            attributes[common.SPAN_ID_KEY] =span_id
+            attributes[common.TRACE_ID_KEY] = trace_id
+            attributes[common.SPAN_ID_KEY] = span_id
 
-            if level == "ERROR":
+            if levelno >= logging.ERROR:
                 if self.alert_manger is not None:
                     self.alert_manger.send_error_alert(trace_id, span_id)
 
-        log_level = getattr(logging, level.upper(), logging.INFO)
-        self.logger.log(log_level, self.service_name + " | " + message, extra=attributes)
-
-
+        # Место вызова определяет сам logging по stacklevel, без обхода кадров на каждый вызов
+        self.logger.log(levelno, self.prefix + message, extra=attributes, stacklevel=_CALLER_STACKLEVEL)
 
     def _extract_extra_params(self, fields: dict) -> dict:
         extra_attrs = {}
@@ -75,32 +98,21 @@ class OtelLogger(interface.IOtelLogger):
             return value
         return str(value)
 
-    def _get_caller_info(self, skip: int) -> str:
-        try:
-            frame = inspect.currentframe()
-            for _ in range(skip):
-                if frame is None:
-                    break
-                frame = frame.f_back
-
-            if frame is None:
-                return "unknown:0"
-
-            filename = frame.f_code.co_filename
-            line_number = frame.f_lineno
-
-            return f"{filename}:{line_number}"
-        except Exception:
-            return "unknown:0"
+    @staticmethod
+    def _parse_level(log_level: str | None) -> int:
+        if not log_level:
+            return logging.DEBUG
+        level = logging.getLevelName(log_level.upper())
+        return level if isinstance(level, int) else logging.DEBUG
 
     def debug(self, message: str, fields: dict = None) -> None:
-        self.log("DEBUG", message, fields)
+        self._log(logging.DEBUG, message, fields)
 
     def info(self, message: str, fields: dict = None) -> None:
-        self.log("INFO", message, fields)
+        self._log(logging.INFO, message, fields)
 
     def warning(self, message: str, fields: dict = None) -> None:
-        self.log("WARN", message, fields)
+        self._log(logging.WARNING, message, fields)
 
     def error(self, message: str, fields: dict = None) -> None:
-        self.log("ERROR", message, fields)
+        self._log(logging.ERROR, message, fields)
@@ -0,0 +1,181 @@
+import threading
+from collections import OrderedDict
+from typing import Optional, Sequence
+
+from opentelemetry.context import Context
+from opentelemetry.sdk.trace import ReadableSpan, SpanProcessor, Span
+from opentelemetry.sdk.trace.sampling import (
+    Decision,
+    ParentBased,
+    Sampler,
+    SamplingResult,
+    StaticSampler,
+    TraceIdRatioBased,
+)
+from opentelemetry.trace import Link, SpanContext, SpanKind, StatusCode, TraceFlags
+from opentelemetry.util.types import Attributes
+
+TAIL_SAMPLING_REASON_KEY = "sampling.tail.reason"
+
+RECORD_ONLY = StaticSampler(Decision.RECORD_ONLY)
+
+
+class RatioOrRecordSampler(TraceIdRatioBased):
+    """Головное решение по доле трейсов, но невыбранные трейсы записываются без флага sampled.
+
+    Такие спаны не уходят в экспорт сами по себе, их судьбу решает TailSamplingSpanProcessor
+    по завершении локального корня: ошибки и медленные запросы сохраняются.
+    """
+
+    def should_sample(
+            self,
+            parent_context: Optional[Context],
+            trace_id: int,
+            name: str,
+            kind: SpanKind = None,
+            attributes: Attributes = None,
+            links: Sequence[Link] = None,
+            trace_state=None,
+    ) -> SamplingResult:
+        result = super().should_sample(parent_context, trace_id, name, kind, attributes, links, trace_state)
+        if result.decision == Decision.DROP:
+            return SamplingResult(Decision.RECORD_ONLY, attributes, result.trace_state)
+        return result
+
+    def get_description(self) -> str:
+        return f"RatioOrRecord{{{self.rate}}}"
+
+
+def new_sampler(ratio: float, tail_sampling: bool) -> Sampler:
+    """ParentBased поверх доли трейсов, с tail sampling невыбранные спаны только записываются"""
+    if not tail_sampling:
+        return ParentBased(TraceIdRatioBased(ratio))
+
+    return ParentBased(
+        RatioOrRecordSampler(ratio),
+        remote_parent_not_sampled=RECORD_ONLY,
+        local_parent_not_sampled=RECORD_ONLY,
+    )
+
+
+class _TraceBuffer:
+    __slots__ = ("spans", "error")
+
+    def __init__(self):
+        self.spans: list[ReadableSpan] = []
+        self.error = False
+
+
+class TailSamplingSpanProcessor(SpanProcessor):
+    """Буферизует записанные, но не выбранные головным сэмплером спаны до конца локального корня.
+
+    Трейс отправляется в delegate целиком, если в нем есть спан с ошибкой или локальный
+    корень длился дольше slow_threshold. Выбранные головным сэмплером спаны идут
+    в delegate сразу, без буфера. Буфер ограничен max_traces трейсами и
+    max_spans_per_trace спанами, при переполнении отбрасываются самые старые трейсы.
+
+    Решение по трейсу запоминается для последних max_traces трейсов: спаны, закончившиеся
+    после корня (фоновые задачи), уходят в delegate вслед за трейсом или отбрасываются.
+    """
+
+    def __init__(
+            self,
+            delegate: SpanProcessor,
+            slow_threshold: float = 2.0,
+            max_traces: int = 4096,
+            max_spans_per_trace: int = 512,
+    ):
+        self.delegate = delegate
+        self.slow_threshold_ns = int(slow_threshold * 1e9)
+        self.max_traces = max_traces
+        self.max_spans_per_trace = max_spans_per_trace
+        self._traces: OrderedDict[int, _TraceBuffer] = OrderedDict()
+        # trace_id -> причина сохранения или None, если трейс отброшен
+        self._decided: OrderedDict[int, str | None] = OrderedDict()
+        self._lock = threading.Lock()
+
+    def on_start(self, span: Span, parent_context: Optional[Context] = None) -> None:
+        self.delegate.on_start(span, parent_context)
+
+    def on_end(self, span: ReadableSpan) -> None:
+        if span.context.trace_flags.sampled:
+            self.delegate.on_end(span)
+            return
+
+        trace_id = span.context.trace_id
+        is_local_root = span.parent is None or span.parent.is_remote
+
+        with self._lock:
+            if trace_id in self._decided:
+                reason = self._decided[trace_id]
+                if reason is not None:
+                    self.delegate.on_end(_as_sampled(span, reason))
+                return
+
+            buffer = self._traces.get(trace_id)
+            if buffer is None:
+                if is_local_root:
+                    # Трейс из одного спана, буфер не нужен
+                    buffer = _TraceBuffer()
+                else:
+                    buffer = self._traces[trace_id] = _TraceBuffer()
+                    if len(self._traces) > self.max_traces:
+                        self._traces.popitem(last=False)
+
+            if span.status.status_code == StatusCode.ERROR:
+                buffer.error = True
+            if len(buffer.spans) < self.max_spans_per_trace:
+                buffer.spans.append(span)
+
+            if not is_local_root:
+                return
+            self._traces.pop(trace_id, None)
+
+            if buffer.error:
+                reason = "error"
+            elif span.end_time - span.start_time >= self.slow_threshold_ns:
+                reason = "slow"
+            else:
+                reason = None
+            self._decided[trace_id] = reason
+            if len(self._decided) > self.max_traces:
+                self._decided.popitem(last=False)
+
+        if reason is None:
+            return
+        for buffered in buffer.spans:
+            self.delegate.on_end(_as_sampled(buffered, reason))
+
+    def shutdown(self) -> None:
+        with self._lock:
+            self._traces.clear()
+            self._decided.clear()
+        self.delegate.shutdown()
+
+    def force_flush(self, timeout_millis: int = 30000) -> bool:
+        return self.delegate.force_flush(timeout_millis)
+
+
+def _as_sampled(span: ReadableSpan, reason: str) -> ReadableSpan:
+    """Копия спана с флагом sampled, иначе экспортирующий процессор его пропустит"""
+    context = span.context
+    return ReadableSpan(
+        name=span.name,
+        context=SpanContext(
+            context.trace_id,
+            context.span_id,
+            context.is_remote,
+            TraceFlags(TraceFlags.SAMPLED),
+            context.trace_state,
+        ),
+        parent=span.parent,
+        resource=span.resource,
+        attributes={**(span.attributes or {}), TAIL_SAMPLING_REASON_KEY: reason},
+        events=span.events,
+        links=span.links,
+        kind=span.kind,
+        status=span.status,
+        start_time=span.start_time,
+        end_time=span.end_time,
+        instrumentation_scope=span.instrumentation_scope,
+    )
@@ -0,0 +1,114 @@
+import time
+from collections import deque
+from contextlib import contextmanager
+from contextvars import ContextVar
+from datetime import datetime, timezone
+from typing import Iterator
+
+from internal import interface
+
+STAGE_DURATION_METRIC = "chat.turn.stage.duration"
+TURN_DURATION_METRIC = "chat.turn.duration"
+
+
+class TurnTiming:
+    """Разбивка одного хода по этапам, время этапов исключающее (без вложенных этапов)"""
+
+    def __init__(self, name: str):
+        self.name = name
+        self.started_at = datetime.now(timezone.utc)
+        self.attributes: dict[str, str | int] = {}
+        self.stages: dict[str, float] = {}
+        self.total = 0.0
+        # Стек времени вложенных этапов для вычета из родителя
+        self._children: list[float] = []
+
+    def to_dict(self) -> dict:
+        return {
+            "name": self.name,
+            "started_at": self.started_at.isoformat(),
+            "total_ms": round(self.total * 1000, 2),
+            "attributes": self.attributes,
+            "stages_ms": {stage: round(duration * 1000, 2) for stage, duration in self.stages.items()},
+        }
+
+    def server_timing(self) -> str:
+        metrics = [f"{stage};dur={duration * 1000:.1f}" for stage, duration in self.stages.items()]
+        metrics.append(f"total;dur={self.total * 1000:.1f}")
+        return ", ".join(metrics)
+
+
+_current_turn: ContextVar[TurnTiming | None] = ContextVar("current_turn", default=None)
+
+
+class StageTimer(interface.IStageTimer):
+    def __init__(
+            self,
+            tel: interface.ITelemetry,
+            slow_turn_threshold: float = 5.0,
+            slow_turns_size: int = 100,
+    ):
+        meter = tel.meter()
+        self.stage_duration = meter.create_histogram(
+            name=STAGE_DURATION_METRIC,
+            description="Chat turn stage duration in seconds",
+            unit="s"
+        )
+        self.turn_duration = meter.create_histogram(
+            name=TURN_DURATION_METRIC,
+            description="Chat turn duration in seconds",
+            unit="s"
+        )
+        self.slow_turn_threshold = slow_turn_threshold
+        self._slow_turns: deque[dict] = deque(maxlen=slow_turns_size)
+
+    @contextmanager
+    def turn(self, name: str) -> Iterator[TurnTiming]:
+        turn = TurnTiming(name)
+        token = _current_turn.set(turn)
+        start = time.perf_counter()
+        try:
+            yield turn
+        finally:
+            turn.total = time.perf_counter() - start
+            _current_turn.reset(token)
+            self._finish(turn)
+
+    @contextmanager
+    def stage(self, name: str) -> Iterator[None]:
+        turn = _current_turn.get()
+        if turn is None:
+            yield
+            return
+
+        turn._children.append(0.0)
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            duration = time.perf_counter() - start
+            children = turn._children.pop()
+            turn.stages[name] = turn.stages.get(name, 0.0) + duration - children
+            if turn._children:
+                turn._children[-1] += duration
+
+    def set_attribute(self, key: str, value: str | int) -> None:
+        turn = _current_turn.get()
+        if turn is not None:
+            turn.attributes[key] = value
+
+    def current_turn(self) -> TurnTiming | None:
+        return _current_turn.get()
+
+    def slow_turns(self) -> list[dict]:
+        return list(self._slow_turns)
+
+    def _finish(self, turn: TurnTiming) -> None:
+        # В метрики идет только эксперт, student_id остается в кольцевом буфере
+        attributes = {"turn": turn.name, "expert": str(turn.attributes.get("expert", "unknown"))}
+        for stage, duration in turn.stages.items():
+            self.stage_duration.record(duration, attributes={**attributes, "stage": stage})
+        self.turn_duration.record(turn.total, attributes=attributes)
+
+        if turn.total >= self.slow_turn_threshold:
+            self._slow_turns.append(turn.to_dict())
@@ -2,8 +2,7 @@ from opentelemetry import trace, metrics, propagate
 from opentelemetry.sdk.trace import TracerProvider, SpanLimits
 from opentelemetry._logs import set_logger_provider
 from opentelemetry.sdk.trace.export import BatchSpanProcessor
-from opentelemetry.sdk.trace.sampling import TraceIdRatioBased, ALWAYS_ON
-from opentelemetry.sdk.metrics import MeterProvider
+from opentelemetry.sdk.metrics import MeterProvider, TraceBasedExemplarFilter
 from opentelemetry.sdk.metrics.export import PeriodicExportingMetricReader
 from opentelemetry.sdk._logs import LoggerProvider
 from opentelemetry.sdk._logs.export import BatchLogRecordProcessor
@@ -16,10 +15,15 @@ from opentelemetry.trace.propagation.tracecontext import TraceContextTextMapProp
 from opentelemetry.baggage.propagation import W3CBaggagePropagator
 from opentelemetry.propagators.composite import CompositePropagator
 
+from typing import TYPE_CHECKING
+
 from .logger import OtelLogger
-from .alertmanger import AlertManager
+from .sampling import TailSamplingSpanProcessor, new_sampler
 from internal import interface
 
+if TYPE_CHECKING:
+    from .alertmanger import AlertManager
+
 class Telemetry(interface.ITelemetry):
     def __init__(
             self,
@@ -30,7 +34,13 @@ class Telemetry(interface.ITelemetry):
             service_version: str,
             otlp_host: str,
             otlp_port: int,
-            alert_manager: AlertManager = None
+            alert_manager: 'AlertManager' = None,
+            trace_sample_ratio: float = None,
+            trace_tail_sampling: bool = None,
+            trace_slow_threshold: float = 2.0,
+            trace_tail_max_traces: int = 2048,
+            trace_tail_max_spans_per_trace: int = 256,
+            trace_max_attribute_length: int = 4096,
     ):
 
         self.log_level = log_level
@@ -40,6 +50,18 @@ class Telemetry(interface.ITelemetry):
         self.service_version = service_version
         self.otlp_endpoint = f"{otlp_host}:{otlp_port}"
         self.alert_manager = alert_manager
+        # Без явной доли в prod пишем каждый десятый трейс, в остальных окружениях все
+        if trace_sample_ratio is None:
+            trace_sample_ratio = 0.1 if environment == "prod" else 1.0
+        self.trace_sample_ratio = trace_sample_ratio
+        # Без явного решения ошибки и медленные запросы сохраняются всегда, когда пишутся не все трейсы
+        if trace_tail_sampling is None:
+            trace_tail_sampling = trace_sample_ratio < 1.0
+        self.trace_tail_sampling = trace_tail_sampling
+        self.trace_slow_threshold = trace_slow_threshold
+        self.trace_tail_max_traces = trace_tail_max_traces
+        self.trace_tail_max_spans_per_trace = trace_tail_max_spans_per_trace
+        self.trace_max_attribute_length = trace_max_attribute_length
 
         self._setup_telemetry()
 
@@ -66,17 +88,14 @@ class Telemetry(interface.ITelemetry):
             insecure=True
         )
 
-        if self.environment == "prod":
-            sampler = ALWAYS_ON
-        else:
-            sampler = ALWAYS_ON
+        sampler = new_sampler(self.trace_sample_ratio, self.trace_tail_sampling)
 
         span_limits = SpanLimits(
             max_span_attributes=256,
             max_attributes=256,
             max_events=128,
             max_links=128,
-            max_attribute_length=None
+            max_attribute_length=self.trace_max_attribute_length
         )
 
         self._tracer_provider = TracerProvider(
@@ -91,6 +110,14 @@ class Telemetry(interface.ITelemetry):
             max_queue_size=2048,
             export_timeout_millis=5000
         )
+        if self.trace_tail_sampling:
+            # Ошибки и медленные трейсы сохраняются независимо от доли
+            span_processor = TailSamplingSpanProcessor(
+                span_processor,
+                self.trace_slow_threshold,
+                self.trace_tail_max_traces,
+                self.trace_tail_max_spans_per_trace
+            )
         self._tracer_provider.add_span_processor(span_processor)
         trace.set_tracer_provider(self._tracer_provider)
 
@@ -112,7 +139,9 @@ class Telemetry(interface.ITelemetry):
 
         self._meter_provider = MeterProvider(
             resource=resource,
-            metric_readers=[reader]
+            metric_readers=[reader],
+            # Связь метрик с трейсами через exemplars, а не через trace_id в атрибутах
+            exemplar_filter=TraceBasedExemplarFilter()
         )
 
         metrics.set_meter_provider(self._meter_provider)
@@ -149,7 +178,7 @@ class Telemetry(interface.ITelemetry):
         )
 
     def _setup_logger(self) -> None:
-        self._logger = OtelLogger(self.alert_manager, self._logger_provider, self.service_name)
+        self._logger = OtelLogger(self.alert_manager, self._logger_provider, self.service_name, self.log_level)
 
     def logger(self) -> interface.IOtelLogger:
         return self._logger
@@ -1,7 +1,12 @@
-from fastapi import FastAPI
+import hmac
+from contextlib import asynccontextmanager
+from typing import Awaitable, Callable
+
+from fastapi import Depends, FastAPI, Header, HTTPException
 
 from internal import interface
 from internal import model
+from internal.controller.http.handler.response import FastJSONResponse
 
 
 def NewHTTP(
@@ -10,26 +15,45 @@ def NewHTTP(
         edu_student_controller: interface.IEduStudentController,
         edu_topic_controller: interface.IEduTopicController,
         http_middleware: interface.IHttpMiddleware,
-        prefix: str
+        stage_timer: interface.IStageTimer,
+        query_stats: interface.IQueryStats,
+        prefix: str,
+        environment: str = None,
+        debug_token: str = None,
+        on_shutdown: Callable[[], Awaitable[None]] = None
 ):
-    app = FastAPI()
+    app = FastAPI(lifespan=new_lifespan(on_shutdown), default_response_class=FastJSONResponse)
     include_middleware(app, http_middleware)
 
     include_db_handler(app, db, prefix)
     include_chat_handlers(app, chat_controller, prefix)
     include_edu_student_handlers(app, edu_student_controller, prefix)
     include_edu_topic_handlers(app, edu_topic_controller, prefix)
+    # В prod отчеты с текстами запросов и разбивкой ходов доступны только по токену
+    if debug_token or environment != "prod":
+        include_debug_handlers(app, stage_timer, query_stats, prefix, debug_token)
 
     return app
 
 
+def new_lifespan(on_shutdown: Callable[[], Awaitable[None]] = None):
+    @asynccontextmanager
+    async def lifespan(app: FastAPI):
+        try:
+            yield
+        finally:
+            # uvicorn вызывает shutdown после дренажа запросов при SIGTERM
+            if on_shutdown is not None:
+                await on_shutdown()
+
+    return lifespan
+
+
 def include_middleware(
         app: FastAPI,
         http_middleware: interface.IHttpMiddleware
 ):
-    http_middleware.logger_middleware03(app)
-    http_middleware.metrics_middleware02(app)
-    http_middleware.trace_middleware01(app)
+    http_middleware.asgi_middleware(app)
 
 
 def include_chat_handlers(
@@ -75,19 +99,59 @@ def include_edu_student_handlers(
     )
 
 
-def include_db_handler(app: FastAPI, db: interface.IDB, prefix: str):
-    app.add_api_route(prefix + "/table/create", create_table_handler(db), methods=["GET"])
-    app.add_api_route(prefix + "/table/drop", drop_table_handler(db), methods=["GET"])
+def include_debug_handlers(
+        app: FastAPI,
+        stage_timer: interface.IStageTimer,
+        query_stats: interface.IQueryStats,
+        prefix: str,
+        debug_token: str = None
+):
+    dependencies = [Depends(debug_token_checker(debug_token))] if debug_token else None
 
+    app.add_api_route(
+        prefix + "/debug/chat/slow-turns",
+        slow_turns_handler(stage_timer),
+        methods=["GET"],
+        dependencies=dependencies,
+        summary="Медленные ходы чата",
+        description="Разбивка по этапам последних медленных ходов из кольцевого буфера"
+    )
 
-def create_table_handler(db: interface.IDB):
-    async def create_table():
-        try:
-            await db.multi_query(model.create_queries)
-        except Exception as err:
-            raise err
+    app.add_api_route(
+        prefix + "/debug/db/slow-queries",
+        slow_queries_handler(query_stats),
+        methods=["GET"],
+        dependencies=dependencies,
+        summary="Медленные запросы к Postgres",
+        description="Отпечатки запросов с выполнениями дольше порога, статистика и последний план EXPLAIN ANALYZE"
+    )
+
+
+def debug_token_checker(debug_token: str):
+    async def check_debug_token(x_debug_token: str = Header(default="")):
+        if not hmac.compare_digest(x_debug_token.encode(), debug_token.encode()):
+            raise HTTPException(status_code=403, detail="invalid debug token")
+
+    return check_debug_token
+
+
+def slow_turns_handler(stage_timer: interface.IStageTimer):
+    async def slow_turns():
+        return stage_timer.slow_turns()
 
-    return create_table
+    return slow_turns
+
+
+def slow_queries_handler(query_stats: interface.IQueryStats):
+    async def slow_queries():
+        return query_stats.slow_queries()
+
+    return slow_queries
+
+
+def include_db_handler(app: FastAPI, db: interface.IDB, prefix: str):
+    # Схема создается только командой migrate, после drop ее восстанавливает следующий migrate
+    app.add_api_route(prefix + "/table/drop", drop_table_handler(db), methods=["GET"])
 
 
 def drop_table_handler(db: interface.IDB):
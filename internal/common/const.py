@@ -25,6 +25,15 @@ HTTP_METHOD_KEY = "http.request.method"
 HTTP_STATUS_KEY = "http.response.status_code"
 HTTP_ROUTE_KEY = "http.route"
 HTTP_REQUEST_DURATION_KEY = "http.server.request.duration"
+ERROR_TYPE_KEY = "error.type"
+
+# Значения http.route вне шаблонов роутера
+UNMATCHED_ROUTE = "__unmatched__"
+OVERFLOW_ROUTE = "__overflow__"
+
+# Ключи read-your-writes для IDB: после записи чтения по ключу недолго идут на primary
+STUDENT_STICKY_KEY = "student:{}"
+CHAT_STICKY_KEY = "chat:{}"
 
 CRM_SYSTEM_NAME_KEY = "crm.system.name"
 
@@ -6,19 +6,75 @@ class Config:
     db_name: str = os.environ.get('BACKEND_POSTGRES_DB_NAME')
     db_host: str = os.environ.get('BACKEND_POSTGRES_HOST')
     db_port: str = "5432"
+    # Реплики для чтения через запятую, host или host:port, пусто — все запросы на primary
+    db_replica_hosts: list[str] = [
+        host.strip() for host in os.environ.get('BACKEND_POSTGRES_REPLICA_HOSTS', '').split(',') if host.strip()
+    ]
+    db_sticky_window: float = float(os.environ.get('BACKEND_POSTGRES_STICKY_WINDOW', 2))
+    db_replica_retry_interval: float = float(os.environ.get('BACKEND_POSTGRES_REPLICA_RETRY_INTERVAL', 5))
+    # Размер пула на процесс: pool_size постоянных соединений и до max_overflow временных сверху
+    db_pool_size: int = int(os.environ.get('BACKEND_POSTGRES_POOL_SIZE', 15))
+    db_max_overflow: int = int(os.environ.get('BACKEND_POSTGRES_MAX_OVERFLOW', 15))
+    db_pool_recycle: int = int(os.environ.get('BACKEND_POSTGRES_POOL_RECYCLE', 300))
+    db_pool_timeout: float = float(os.environ.get('BACKEND_POSTGRES_POOL_TIMEOUT', 30))
+    # Ожидание соединения дольше порога в секундах пишется в лог с trace_id запроса
+    db_slow_checkout_threshold: float = float(os.environ.get('BACKEND_POSTGRES_SLOW_CHECKOUT_THRESHOLD', 0.1))
+    # PgBouncer в transaction режиме: без кэша подготовленных выражений. Только для http приложения,
+    # migrate и maintain_messages держат advisory lock сессии и подключаются напрямую
+    db_pgbouncer: bool = os.environ.get('BACKEND_POSTGRES_PGBOUNCER', 'false').lower() == 'true'
+    # Запросы дольше порога в секундах попадают в отчет /debug/db/slow-queries
+    db_slow_query_threshold: float = float(os.environ.get('BACKEND_POSTGRES_SLOW_QUERY_THRESHOLD', 0.5))
+    db_slow_queries_size: int = int(os.environ.get('BACKEND_POSTGRES_SLOW_QUERIES_SIZE', 20))
+    # Интервал в секундах между EXPLAIN ANALYZE медленного select одного отпечатка, 0 выключает
+    db_explain_interval: float = float(os.environ.get('BACKEND_POSTGRES_EXPLAIN_INTERVAL', 0))
+    # statement_timeout в секундах для EXPLAIN ANALYZE, повторное выполнение дольше прерывается
+    db_explain_timeout: float = float(os.environ.get('BACKEND_POSTGRES_EXPLAIN_TIMEOUT', 5))
+
+    # Секционирование messages: none, range (по месяцам created_at) или hash (по chat_id)
+    messages_partitioning: str = os.environ.get('MESSAGES_PARTITIONING', 'none')
+    messages_hash_partitions: int = int(os.environ.get('MESSAGES_HASH_PARTITIONS', 16))
+    messages_partition_premake_months: int = int(os.environ.get('MESSAGES_PARTITION_PREMAKE_MONTHS', 3))
+    # 0 хранит сообщения бессрочно
+    messages_retention_months: int = int(os.environ.get('MESSAGES_RETENTION_MONTHS', 0))
+    messages_retention_archive: bool = os.environ.get('MESSAGES_RETENTION_ARCHIVE', 'true').lower() == 'true'
 
     http_port: int = int(os.environ.get('BACKEND_PORT'))
+    http_workers: int = int(os.environ.get('BACKEND_HTTP_WORKERS', 1))
+    http_graceful_shutdown_timeout: int = int(os.environ.get('BACKEND_HTTP_GRACEFUL_SHUTDOWN_TIMEOUT', 30))
     prefix = os.environ.get('BACKEND_PREFIX')
+    http_metrics_max_label_sets: int = int(os.environ.get('BACKEND_HTTP_METRICS_MAX_LABEL_SETS', 1000))
+    http_access_log_sample_ratio: float = float(os.environ.get('BACKEND_HTTP_ACCESS_LOG_SAMPLE_RATIO', 0.1))
     service_name = "backend"
 
     root_path = "/app"
     service_version = "0.0.1"
     otlp_host: str = os.environ.get("OTEL_COLLECTOR_HOST")
     otlp_port: int = os.environ.get("OTEL_COLLECTOR_GRPC_PORT")
+    trace_sample_ratio: float | None = float(os.environ['OTEL_TRACE_SAMPLE_RATIO']) if os.environ.get('OTEL_TRACE_SAMPLE_RATIO') else None
+    # Tail sampling сохраняет ошибки и медленные трейсы, не выбранные головной долей. Без явного
+    # значения включается, когда доля меньше 1 (в prod по умолчанию 0.1). Память на невыбранные
+    # спаны ограничена max_traces трейсами по max_spans_per_trace спанов
+    trace_tail_sampling: bool | None = (
+        os.environ['OTEL_TRACE_TAIL_SAMPLING'].lower() == 'true' if os.environ.get('OTEL_TRACE_TAIL_SAMPLING') else None
+    )
+    trace_tail_max_traces: int = int(os.environ.get('OTEL_TRACE_TAIL_MAX_TRACES', 2048))
+    trace_tail_max_spans_per_trace: int = int(os.environ.get('OTEL_TRACE_TAIL_MAX_SPANS_PER_TRACE', 256))
+    trace_slow_threshold: float = float(os.environ.get('OTEL_TRACE_SLOW_THRESHOLD', 2))
+    trace_max_attribute_length: int = int(os.environ.get('OTEL_TRACE_MAX_ATTRIBUTE_LENGTH', 4096))
 
     openai_api_key: str = os.environ.get('OPEN_AI_API_KEY')
 
+    chat_server_timing_enabled: bool = os.environ.get('CHAT_SERVER_TIMING_ENABLED', 'false').lower() == 'true'
+    chat_slow_turn_threshold: float = float(os.environ.get('CHAT_SLOW_TURN_THRESHOLD', 5))
+    chat_slow_turns_size: int = int(os.environ.get('CHAT_SLOW_TURNS_SIZE', 100))
+
+    # Как часто в секундах индекс каталога сверяется с БД после загрузки курса, 0 — только при старте
+    catalog_refresh_interval: float = float(os.environ.get('CATALOG_REFRESH_INTERVAL', 60))
+    chat_history_token_budget: int = int(os.environ.get('CHAT_HISTORY_TOKEN_BUDGET', 0))
+
     environment = os.environ.get('ENVIRONMENT')
+    # Токен для /debug/* в заголовке X-Debug-Token. В prod без токена отладочные ручки не регистрируются
+    debug_token: str = os.environ.get('BACKEND_DEBUG_TOKEN')
     log_level = os.environ.get('LOG_LEVEL')
 
     alert_tg_bot_token: str = os.environ.get('ALERT_TG_BOT_TOKEN')
@@ -32,4 +88,13 @@ class Config:
     monitoring_redis_password: str = os.environ.get('MONITORING_REDIS_PASSWORD')
 
     weed_master_host: str = os.environ.get('WEED_MASTER_CONTAINER_NAME')
-    weed_master_port: int = int(os.environ.get('WEED_MASTER_PORT'))
\ No newline at end of file
+    weed_master_port: int = int(os.environ.get('WEED_MASTER_PORT'))
+    edu_content_upload_concurrency: int = int(os.environ.get('EDU_CONTENT_UPLOAD_CONCURRENCY', 16))
+
+    # Redis для межпроцессных блокировок студентов, без хоста используется только локальная блокировка
+    student_lock_redis_host: str = os.environ.get('BACKEND_REDIS_HOST')
+    student_lock_redis_port: int = int(os.environ.get('BACKEND_REDIS_PORT', 6379))
+    student_lock_redis_db: int = int(os.environ.get('BACKEND_STUDENT_LOCK_REDIS_DB', 0))
+    student_lock_redis_password: str = os.environ.get('BACKEND_REDIS_PASSWORD')
+    student_lock_ttl: int = int(os.environ.get('BACKEND_STUDENT_LOCK_TTL', 120))
+    student_lock_blocking_timeout: int = int(os.environ.get('BACKEND_STUDENT_LOCK_BLOCKING_TIMEOUT', 120))
@@ -1,5 +1,5 @@
 from fastapi import status
-from fastapi.responses import JSONResponse
+from internal.controller.http.handler.response import FastJSONResponse
 from opentelemetry.trace import StatusCode, SpanKind
 
 from internal import interface
@@ -10,11 +10,15 @@ class ChatController(interface.IChatController):
     def __init__(
             self,
             tel: interface.ITelemetry,
-            chat_service: interface.IChatService
+            chat_service: interface.IChatService,
+            stage_timer: interface.IStageTimer,
+            server_timing_enabled: bool = False
     ):
         self.tracer = tel.tracer()
         self.logger = tel.logger()
         self.chat_service = chat_service
+        self.stage_timer = stage_timer
+        self.server_timing_enabled = server_timing_enabled
 
     async def send_message_to_expert(self, body: SendMessageToExpert):
         with self.tracer.start_as_current_span(
@@ -22,24 +26,31 @@ class ChatController(interface.IChatController):
                 kind=SpanKind.INTERNAL,
                 attributes={
                     "student_id": body.student_id,
-                    "text": body.text
+                    "text_length": len(body.text)
                 }
         ) as span:
             try:
-                user_message, commands = await self.chat_service.send_message_to_expert(
-                    body.student_id,
-                    body.text
-                )
+                with self.stage_timer.turn("send_message_to_expert") as turn:
+                    self.stage_timer.set_attribute("student_id", body.student_id)
+                    user_message, commands = await self.chat_service.send_message_to_expert(
+                        body.student_id,
+                        body.text
+                    )
 
                 response = SendMessageToExpertResponse(
                     user_message=user_message,
                     commands=commands
                 )
 
+                headers = None
+                if self.server_timing_enabled:
+                    headers = {"Server-Timing": turn.server_timing()}
+
                 span.set_status(StatusCode.OK)
-                return JSONResponse(
+                return FastJSONResponse(
                     status_code=status.HTTP_200_OK,
                     content=response.to_dict(),
+                    headers=headers,
                 )
             except Exception as err:
                 span.record_exception(err)
@@ -1,5 +1,5 @@
 from fastapi import status
-from fastapi.responses import JSONResponse
+from internal.controller.http.handler.response import FastJSONResponse
 from opentelemetry.trace import StatusCode, SpanKind
 
 from internal import interface
@@ -54,7 +54,7 @@ class EduStudentController(interface.IEduStudentController):
                 )
 
                 span.set_status(StatusCode.OK)
-                return JSONResponse(
+                return FastJSONResponse(
                     status_code=status.HTTP_200_OK,
                     content=response.model_dump(),
                 )
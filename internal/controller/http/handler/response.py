@@ -0,0 +1,12 @@
+from typing import Any
+
+from fastapi.responses import JSONResponse
+
+from pkg.serializer import serializer
+
+
+class FastJSONResponse(JSONResponse):
+    """JSONResponse через pkg.serializer: orjson, datetime и не строковые ключи без подготовки"""
+
+    def render(self, content: Any) -> bytes:
+        return serializer.dumps(content)
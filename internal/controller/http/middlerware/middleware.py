@@ -1,7 +1,7 @@
 import time
-from typing import Callable
-from fastapi import FastAPI, Request
-from fastapi.responses import JSONResponse
+import random
+from fastapi import FastAPI
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
 
 from opentelemetry import propagate
 from opentelemetry.semconv.trace import SpanAttributes
@@ -16,216 +16,261 @@ class HttpMiddleware(interface.IHttpMiddleware):
             self,
             tel: interface.ITelemetry,
             prefix: str,
+            max_label_sets: int = 1000,
+            access_log_sample_ratio: float = 1.0,
     ):
         self.tracer = tel.tracer()
         self.meter = tel.meter()
         self.logger = tel.logger()
         self.prefix = prefix
-
-    def trace_middleware01(self, app: FastAPI):
-        @app.middleware("http")
-        async def _trace_middleware01(request: Request, call_next: Callable):
-            if self.prefix not in request.url.path:
-                return JSONResponse(
-                    status_code=404,
-                    content={"error": "not found"}
-                )
-            with self.tracer.start_as_current_span(
-                    f"{request.method} {request.url.path}",
-                    context=propagate.extract(dict(request.headers)),
-                    kind=SpanKind.SERVER,
-                    attributes={
-                        SpanAttributes.HTTP_ROUTE: str(request.url.path),
-                        SpanAttributes.HTTP_METHOD: request.method,
-                    }
-            ) as root_span:
-                span_ctx = root_span.get_span_context()
-                trace_id = format(span_ctx.trace_id, '032x')
-                span_id = format(span_ctx.span_id, '016x')
-
-                request.state.trace_id = trace_id
-                request.state.span_id = span_id
-                try:
-                    response = await call_next(request)
-
-                    status_code = response.status_code
-                    response_size = response.headers.get("content-length")
-
-                    root_span.set_attributes({
-                        SpanAttributes.HTTP_STATUS_CODE: status_code,
-                    })
-
-                    if response_size:
-                        try:
-                            root_span.set_attribute(SpanAttributes.HTTP_RESPONSE_BODY_SIZE, int(response_size))
-                        except ValueError:
-                            pass
-
-                    response.headers[common.TRACE_ID_HEADER] = trace_id
-                    response.headers[common.SPAN_ID_HEADER] = span_id
-
-                    if status_code >= 500:
-                        err = Exception("Internal server error")
-                        root_span.record_exception(err)
-                        root_span.set_status(Status(StatusCode.ERROR, str(err)))
-                        root_span.set_attribute(common.ERROR_KEY, True)
-                        raise err
-                    elif status_code >= 400:
-                        err = Exception("Client error")
-                        root_span.record_exception(err)
-                        root_span.set_status(Status(StatusCode.ERROR, str(err)))
-                        root_span.set_attribute(common.ERROR_KEY, True)
-                        raise err
-                    else:
-                        root_span.set_status(Status(StatusCode.OK))
-
-                    return response
-
-                except Exception as err:
-                    root_span.record_exception(err)
-                    root_span.set_status(Status(StatusCode.ERROR, str(err)))
-                    root_span.set_attribute(common.ERROR_KEY, True)
-                    return JSONResponse(
-                        status_code=500,
-                        content={"message": "Internal Server Error"},
-                    )
-
-        return _trace_middleware01
-
-    def metrics_middleware02(self,app: FastAPI):
-        ok_request_counter = self.meter.create_counter(
+        self.label_guard = CardinalityGuard(max_label_sets)
+        # Доля запросов с info логами начала и успешного конца, ошибки логируются всегда
+        self.access_log_sample_ratio = access_log_sample_ratio
+        self._instruments = None
+
+    def asgi_middleware(self, app: FastAPI):
+        """Трейсинг, метрики и access лог за один проход чистым ASGI middleware"""
+        app.add_middleware(AsgiHttpMiddleware, http_middleware=self)
+
+    def http_instruments(self) -> "HttpInstruments":
+        if self._instruments is None:
+            self._instruments = HttpInstruments(self.meter)
+        return self._instruments
+
+
+def route_template(scope: Scope) -> str:
+    """Шаблон маршрута FastAPI (/edu/student/{student_id}), Router кладет совпавший route в scope"""
+    route = scope.get("route")
+    if route is None:
+        return common.UNMATCHED_ROUTE
+    return getattr(route, "path", None) or common.UNMATCHED_ROUTE
+
+
+class CardinalityGuard:
+    """Ограничивает число различных наборов меток HTTP метрик.
+
+    Каждый новый набор меток это новый временной ряд в агрегаторе SDK и в коллекторе.
+    После max_label_sets наборов маршрут сворачивается в OVERFLOW_ROUTE, так что
+    мусорные методы или непредусмотренные маршруты не раздувают память.
+    Готовые словари атрибутов переиспользуются, на горячем пути нет аллокаций.
+    """
+
+    def __init__(self, max_label_sets: int = 1000):
+        self.max_label_sets = max_label_sets
+        self._label_sets: dict[tuple, dict] = {}
+        self.overflowed = 0
+
+    def attributes(self, method: str, route: str, status_code: int, error_type: str = None) -> dict:
+        key = (method, route, status_code, error_type)
+        attrs = self._label_sets.get(key)
+        if attrs is not None:
+            return attrs
+
+        if len(self._label_sets) >= self.max_label_sets:
+            self.overflowed += 1
+            key = (common.OVERFLOW_ROUTE, common.OVERFLOW_ROUTE, status_code, None)
+            attrs = self._label_sets.get(key)
+            if attrs is not None:
+                return attrs
+            # Наборы overflow по статусу не ограничены лимитом, их не больше числа статусов
+            method = route = common.OVERFLOW_ROUTE
+            error_type = None
+
+        attrs = {
+            SpanAttributes.HTTP_METHOD: method,
+            SpanAttributes.HTTP_ROUTE: route,
+            common.HTTP_STATUS_KEY: status_code,
+        }
+        if error_type is not None:
+            attrs[common.ERROR_TYPE_KEY] = error_type
+        self._label_sets[key] = attrs
+        return attrs
+
+
+class HttpInstruments:
+    def __init__(self, meter):
+        self.ok_request_counter = meter.create_counter(
             name=common.OK_REQUEST_TOTAL_METRIC,
             description="Total count of 200 HTTP requests",
             unit="1"
         )
 
-        error_request_counter = self.meter.create_counter(
+        self.error_request_counter = meter.create_counter(
             name=common.ERROR_REQUEST_TOTAL_METRIC,
             description="Total count of 500 HTTP requests",
             unit="1"
         )
 
-        request_duration = self.meter.create_histogram(
+        self.request_duration = meter.create_histogram(
             name=common.REQUEST_DURATION_METRIC,
             description="HTTP request duration in seconds",
             unit="s"
         )
 
-        request_size = self.meter.create_histogram(
+        self.request_size = meter.create_histogram(
             name=common.REQUEST_BODY_SIZE_METRIC,
             description="HTTP request size in bytes",
             unit="by"
         )
 
-        response_size = self.meter.create_histogram(
+        self.response_size = meter.create_histogram(
             name=common.RESPONSE_BODY_SIZE_METRIC,
             description="HTTP response size in bytes",
             unit="by"
         )
 
-        active_requests = self.meter.create_up_down_counter(
+        self.active_requests = meter.create_up_down_counter(
             name=common.ACTIVE_REQUESTS_METRIC,
             description="Number of active HTTP requests",
             unit="1"
         )
 
-        @app.middleware("http")
-        async def _metrics_middleware02(request: Request, call_next: Callable):
-            start_time = time.time()
-            active_requests.add(1)
-
-            trace_id = request.state.trace_id
-            span_id = request.state.span_id
-
-            content_length = request.headers.get("content-length")
-            request_attrs = {
-                SpanAttributes.HTTP_METHOD: request.method,
-                SpanAttributes.HTTP_ROUTE: request.url.path,
-                common.SPAN_ID_KEY: span_id,
-                common.TRACE_ID_KEY: trace_id,
-            }
-            try:
-                if content_length and int(content_length) > 0:
-                    request_size.record(int(content_length), attributes=request_attrs)
-
-                response = await call_next(request)
 
-                duration_seconds = time.time() - start_time
-                status_code = response.status_code
-
-                request_attrs[common.HTTP_STATUS_KEY] = status_code
-                request_attrs[common.HTTP_REQUEST_DURATION_KEY] = duration_seconds
-
-                if status_code >= 500:
-                    error_request_counter.add(1, attributes=request_attrs)
-                else:
-                    ok_request_counter.add(1, attributes=request_attrs)
-
-                request_duration.record(duration_seconds, attributes=request_attrs)
-                response_content_length = response.headers.get("content-length")
-
-                if response_content_length:
-                    try:
-                        response_size.record(int(response_content_length), attributes=request_attrs)
-                    except ValueError:
-                        pass
-
-                return response
-            except Exception as err:
-                duration_seconds = time.time() - start_time
-                request_attrs[common.HTTP_STATUS_KEY] = 500
-                request_attrs[common.ERROR_KEY] = str(err)
-
-                error_request_counter.add(1, attributes=request_attrs)
-                request_duration.record(duration_seconds, attributes=request_attrs)
-                raise
-            finally:
-                active_requests.add(-1)
-
-        return _metrics_middleware02
-
-    def logger_middleware03(self, app: FastAPI):
-        @app.middleware("http")
-        async def _logger_middleware03(request: Request, call_next: Callable):
-            start_time = time.time()
+NOT_FOUND_BODY = b'{"error":"not found"}'
+INTERNAL_ERROR_BODY = b'{"message":"Internal Server Error"}'
+
+
+class AsgiHttpMiddleware:
+    """Замена трем BaseHTTPMiddleware: без лишних задач и стримов на запрос, тело ответа не буферизуется"""
+
+    def __init__(self, app: ASGIApp, http_middleware: HttpMiddleware):
+        self.app = app
+        self.prefix = http_middleware.prefix
+        self.tracer = http_middleware.tracer
+        self.logger = http_middleware.logger
+        self.instruments = http_middleware.http_instruments()
+        self.label_guard = http_middleware.label_guard
+        self.access_log_sample_ratio = http_middleware.access_log_sample_ratio
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        path = scope["path"]
+        if self.prefix not in path:
+            await self._send_json(send, 404, NOT_FOUND_BODY)
+            return
+
+        start = time.perf_counter()
+        method = scope["method"]
+        headers = {key.decode("latin-1"): value.decode("latin-1") for key, value in scope["headers"]}
+        instruments = self.instruments
+        instruments.active_requests.add(1)
+
+        # Имя спана уточняется шаблоном маршрута после роутинга
+        with self.tracer.start_as_current_span(
+                method,
+                context=propagate.extract(headers),
+                kind=SpanKind.SERVER,
+                attributes={
+                    SpanAttributes.HTTP_METHOD: method,
+                    SpanAttributes.HTTP_TARGET: path,
+                }
+        ) as root_span:
+            span_ctx = root_span.get_span_context()
+            trace_id = format(span_ctx.trace_id, '032x')
+            span_id = format(span_ctx.span_id, '016x')
 
-            trace_id = request.state.trace_id
-            span_id = request.state.span_id
+            state = scope.setdefault("state", {})
+            state["trace_id"] = trace_id
+            state["span_id"] = span_id
 
             extra_log = {
-                common.HTTP_METHOD_KEY: request.method,
-                common.HTTP_ROUTE_KEY: request.url.path,
+                common.HTTP_METHOD_KEY: method,
+                common.HTTP_ROUTE_KEY: path,
                 common.TRACE_ID_KEY: trace_id,
                 common.SPAN_ID_KEY: span_id,
             }
-            try:
+            log_sampled = random.random() < self.access_log_sample_ratio
+            if log_sampled:
                 self.logger.info("Началась обработка HTTP запроса", extra_log)
-                response = await call_next(request)
-
-                status_code = response.status_code
-
-                extra_log = {
-                    **extra_log,
-                    common.HTTP_REQUEST_DURATION_KEY: time.time() - start_time,
-                    common.HTTP_STATUS_KEY: response.status_code,
-                }
-
-                if 400 <= status_code < 500:
-                    self.logger.warning("Обработка HTTP запроса завершена с ошибкой клиента", extra_log)
-                else:
-                    self.logger.info("Обработка HTTP запроса завершена успешно", extra_log)
-
-                return response
 
+            response = {"status": 500, "size": None, "started": False}
+            trace_headers = [
+                (common.TRACE_ID_HEADER.lower().encode("latin-1"), trace_id.encode("latin-1")),
+                (common.SPAN_ID_HEADER.lower().encode("latin-1"), span_id.encode("latin-1")),
+            ]
+
+            async def send_wrapper(message: Message) -> None:
+                if message["type"] == "http.response.start":
+                    response["status"] = message["status"]
+                    response["started"] = True
+                    response_headers = [*message.get("headers", ()), *trace_headers]
+                    for key, value in response_headers:
+                        if key == b"content-length":
+                            response["size"] = int(value)
+                            break
+                    message = {**message, "headers": response_headers}
+                await send(message)
+
+            error = None
+            try:
+                await self.app(scope, receive, send_wrapper)
             except Exception as err:
-                extra_log = {
-                    **extra_log,
-                    common.HTTP_REQUEST_DURATION_KEY: time.time() - start_time,
-                    common.HTTP_STATUS_KEY: 500,
-                    common.ERROR_KEY: str(err),
-                }
-
-                self.logger.error(f"Обработка HTTP запроса завершена с ошибкой", extra_log)
-                raise
+                error = err
+                if not response["started"]:
+                    await self._send_json(send_wrapper, 500, INTERNAL_ERROR_BODY)
+                response["status"] = 500
+            finally:
+                instruments.active_requests.add(-1)
+
+            duration_seconds = time.perf_counter() - start
+            status_code = response["status"]
+            route = route_template(scope)
+
+            root_span.update_name(f"{method} {route}")
+            root_span.set_attribute(SpanAttributes.HTTP_ROUTE, route)
+            root_span.set_attribute(SpanAttributes.HTTP_STATUS_CODE, status_code)
+
+            # В метриках только шаблон маршрута, метод, статус и тип ошибки,
+            # связь с трейсом дают exemplars, записанные в контексте root_span
+            attrs = self.label_guard.attributes(
+                method, route, status_code, type(error).__name__ if error is not None else None
+            )
+
+            content_length = headers.get("content-length")
+            if content_length and content_length.isdigit() and int(content_length) > 0:
+                instruments.request_size.record(int(content_length), attributes=attrs)
+
+            if response["size"] is not None:
+                root_span.set_attribute(SpanAttributes.HTTP_RESPONSE_BODY_SIZE, response["size"])
+                instruments.response_size.record(response["size"], attributes=attrs)
+
+            extra_log[common.HTTP_REQUEST_DURATION_KEY] = duration_seconds
+            extra_log[common.HTTP_STATUS_KEY] = status_code
+
+            if error is not None or status_code >= 400:
+                err = error or Exception("Internal server error" if status_code >= 500 else "Client error")
+                root_span.record_exception(err)
+                root_span.set_status(Status(StatusCode.ERROR, str(err)))
+                root_span.set_attribute(common.ERROR_KEY, True)
+            else:
+                root_span.set_status(Status(StatusCode.OK))
+
+            if status_code >= 500:
+                if error is not None:
+                    extra_log[common.ERROR_KEY] = str(error)
+                instruments.error_request_counter.add(1, attributes=attrs)
+                self.logger.error("Обработка HTTP запроса завершена с ошибкой", extra_log)
+            elif status_code >= 400:
+                instruments.ok_request_counter.add(1, attributes=attrs)
+                self.logger.warning("Обработка HTTP запроса завершена с ошибкой клиента", extra_log)
+            else:
+                instruments.ok_request_counter.add(1, attributes=attrs)
+                if log_sampled:
+                    self.logger.info("Обработка HTTP запроса завершена успешно", extra_log)
 
-        return _logger_middleware03
+            instruments.request_duration.record(duration_seconds, attributes=attrs)
+
+    @staticmethod
+    async def _send_json(send: Send, status_code: int, body: bytes) -> None:
+        await send({
+            "type": "http.response.start",
+            "status": status_code,
+            "headers": [
+                (b"content-type", b"application/json"),
+                (b"content-length", str(len(body)).encode("latin-1")),
+            ],
+        })
+        await send({"type": "http.response.body", "body": body})
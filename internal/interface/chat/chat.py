@@ -1,9 +1,13 @@
+from __future__ import annotations
+
 from abc import abstractmethod
-from typing import Protocol
+from typing import Protocol, TYPE_CHECKING
 
-from internal.controller.http.handler.chat.model import *
 from internal import model, common
 
+if TYPE_CHECKING:
+    from internal.controller.http.handler.chat.model import SendMessageToExpert
+
 
 class IChatController(Protocol):
     async def send_message_to_expert(self, body: SendMessageToExpert): pass
@@ -22,11 +26,14 @@ class IChatRepo(Protocol):
     async def get_chat_by_student_id(self, student_id: int) -> list[model.Chat]: pass
 
     @abstractmethod
-    async def create_message(self, chat_id: int, role: str, text: str): pass
+    async def create_message(self, chat_id: int, role: str, text: str, token_count: int = None): pass
 
     @abstractmethod
     async def get_messages(self, chat_id: int) -> list[model.Message]: pass
 
+    @abstractmethod
+    async def get_messages_within_token_budget(self, chat_id: int, token_budget: int) -> list[model.Message]: pass
+
 
 class IPromptGenerator(Protocol):
     @abstractmethod
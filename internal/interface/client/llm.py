@@ -7,7 +7,7 @@ class ILLMClient(Protocol):
     @abstractmethod
     async def generate(
             self,
-            history: list[model.Message],
+            history: list[model.Message] | model.MessageHistory,
             system_prompt: str = "",
             temperature: float = 0.5,
             llm_model: str = "gpt-4o-mini",
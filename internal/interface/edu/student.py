@@ -20,6 +20,15 @@ class IStudentRepo(Protocol):
     @abstractmethod
     async def get_by_id(self, student_id: int) -> list[model.Student]: pass
 
+    @abstractmethod
+    async def get_expert_by_id(self, student_id: int) -> list[model.Student]: pass
+
+    @abstractmethod
+    async def get_progress_by_id(self, student_id: int) -> list[model.Student]: pass
+
+    @abstractmethod
+    async def get_profile_by_id(self, student_id: int) -> list[model.Student]: pass
+
     @abstractmethod
     async def update_student_background(self, student_id: int, background: dict): pass
 
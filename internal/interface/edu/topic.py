@@ -3,7 +3,6 @@ from abc import abstractmethod
 from typing import Protocol
 
 from internal import model
-from internal.controller.http.handler.edu.topic.model import *
 
 
 class IEduTopicController(Protocol):
@@ -22,6 +21,19 @@ class IEduTopicService(Protocol):
     async def download_block_content(self, block_id: int) -> tuple[io.BytesIO, str]: pass
 
 
+class IEduContentService(Protocol):
+    @abstractmethod
+    async def ingest_course(self, course_dir: str, manifest_path: str = None) -> None: pass
+
+
+class ICatalogService(Protocol):
+    @abstractmethod
+    async def index(self) -> model.CatalogIndex: pass
+
+    @abstractmethod
+    async def refresh(self) -> model.CatalogIndex: pass
+
+
 class ITopicRepo(Protocol):
     @abstractmethod
     async def create_topic(self, name: str, intro_file_id: str, edu_plan_file_id: str) -> int: pass
@@ -50,6 +62,18 @@ class ITopicRepo(Protocol):
     @abstractmethod
     async def get_chapter_by_id(self, chapter_id: int) -> list[model.Chapter]: pass
 
+    @abstractmethod
+    async def get_topics_by_ids(self, topic_ids: list[int]) -> list[model.Topic]: pass
+
+    @abstractmethod
+    async def get_blocks_by_ids(self, block_ids: list[int]) -> list[model.Block]: pass
+
+    @abstractmethod
+    async def get_chapters_by_ids(self, chapter_ids: list[int]) -> list[model.Chapter]: pass
+
+    @abstractmethod
+    async def get_catalog_stamp(self) -> str: pass
+
     @abstractmethod
     async def get_all_topic(self) -> list[model.Topic]: pass
 
@@ -59,6 +83,17 @@ class ITopicRepo(Protocol):
     @abstractmethod
     async def get_all_chapter(self) -> list[model.Chapter]: pass
 
+    @abstractmethod
+    async def bulk_upsert_content(
+            self,
+            topics: list[model.TopicContent],
+            blocks: list[model.BlockContent],
+            chapters: list[model.ChapterContent],
+    ) -> None: pass
+
+    @abstractmethod
+    async def analyze_content(self) -> None: pass
+
     @abstractmethod
     async def upload_file(self, file: io.BytesIO, file_name: str) -> str: pass
 
@@ -1,11 +1,18 @@
+from __future__ import annotations
+
 import io
 from abc import abstractmethod
-from typing import Protocol, Sequence, Any
+from contextlib import AbstractAsyncContextManager, AbstractContextManager
+from typing import Protocol, Sequence, Any, Iterable, Mapping, TYPE_CHECKING
 
-from fastapi import FastAPI
 from opentelemetry.metrics import Meter
 from opentelemetry.trace import Tracer
-from weed.util import WeedOperationResponse
+
+if TYPE_CHECKING:
+    # Нужны только для аннотаций, иначе любой импорт internal тянет fastapi и weed
+    from fastapi import FastAPI
+    from weed.util import WeedOperationResponse
+    from internal import model
 
 
 class IOtelLogger(Protocol):
@@ -42,13 +49,17 @@ class ITelemetry(Protocol):
 
 class IHttpMiddleware(Protocol):
     @abstractmethod
-    def trace_middleware01(self, app: FastAPI): pass
+    def asgi_middleware(self, app: FastAPI): pass
+
+
+class ISerializer(Protocol):
+    """Преобразование значений в байты Redis и обратно"""
 
     @abstractmethod
-    def metrics_middleware02(self, app: FastAPI): pass
+    def dumps(self, value: Any) -> bytes | str: pass
 
     @abstractmethod
-    def logger_middleware03(self, app: FastAPI): pass
+    def loads(self, data: bytes) -> Any: pass
 
 
 class IRedis(Protocol):
@@ -58,6 +69,58 @@ class IRedis(Protocol):
     @abstractmethod
     async def get(self, key: str, default: Any = None) -> Any: pass
 
+    @abstractmethod
+    async def set_nx(self, key: str, value: Any, ttl: int = None) -> bool: pass
+
+    @abstractmethod
+    async def mget(self, keys: Iterable[str], default: Any = None) -> list[Any]: pass
+
+    @abstractmethod
+    async def mset(self, mapping: Mapping[str, Any], ttl: int = None) -> bool: pass
+
+    @abstractmethod
+    async def delete(self, *keys: str) -> int: pass
+
+    @abstractmethod
+    def pipeline(self, transaction: bool = False) -> AbstractAsyncContextManager[Any]: pass
+
+    @abstractmethod
+    async def eval_script(self, source: str, keys: list[str] = None, args: list[Any] = None) -> Any: pass
+
+    @abstractmethod
+    async def aclose(self) -> None: pass
+
+
+class IStageTimer(Protocol):
+    @abstractmethod
+    def turn(self, name: str) -> AbstractContextManager[Any]: pass
+
+    @abstractmethod
+    def stage(self, name: str) -> AbstractContextManager[None]: pass
+
+    @abstractmethod
+    def set_attribute(self, key: str, value: str | int) -> None: pass
+
+    @abstractmethod
+    def slow_turns(self) -> list[dict]: pass
+
+
+class IQueryStats(Protocol):
+    @abstractmethod
+    def record(self, operation: str, query: str, duration: float, rows: int) -> bool: pass
+
+    @abstractmethod
+    def set_plan(self, query: str, plan: str) -> None: pass
+
+    @abstractmethod
+    def slow_queries(self) -> list[dict]: pass
+
+
+class IKeyedLock(Protocol):
+    @abstractmethod
+    def lock(self, key: str) -> AbstractAsyncContextManager[None]: pass
+
+
 class IStorage(Protocol):
     @abstractmethod
     def delete(self, fid: str, name: str): pass
@@ -75,16 +138,47 @@ class IStorage(Protocol):
 class IDB(Protocol):
 
     @abstractmethod
-    async def insert(self, query: str, query_params: dict) -> int: pass
+    async def insert(self, query: str, query_params: dict, sticky_key: str = None) -> int | None: pass
 
     @abstractmethod
-    async def delete(self, query: str, query_params: dict) -> None: pass
+    async def delete(self, query: str, query_params: dict, sticky_key: str = None) -> int: pass
 
     @abstractmethod
-    async def update(self, query: str, query_params: dict) -> None: pass
+    async def update(self, query: str, query_params: dict, sticky_key: str = None) -> int: pass
 
     @abstractmethod
-    async def select(self, query: str, query_params: dict) -> Sequence[Any]: pass
+    async def select(
+            self,
+            query: str,
+            query_params: dict,
+            replica: bool = False,
+            sticky_key: str = None,
+    ) -> Sequence[Any]: pass
+
+    @abstractmethod
+    async def transaction(self, queries: list[tuple[str, dict]], sticky_key: str = None) -> None: pass
 
     @abstractmethod
     async def multi_query(self, queries: list[str]) -> None: pass
+
+    @abstractmethod
+    async def autocommit(self, queries: list[str]) -> None: pass
+
+    @abstractmethod
+    def advisory_lock(self, name: str) -> AbstractAsyncContextManager[None]: pass
+
+    @abstractmethod
+    async def close(self) -> None: pass
+
+
+class IMigrator(Protocol):
+    @abstractmethod
+    async def migrate(self) -> list[int]: pass
+
+    @abstractmethod
+    async def applied(self) -> list[model.AppliedMigration]: pass
+
+
+class IMessagesMaintenance(Protocol):
+    @abstractmethod
+    async def maintain(self) -> dict: pass
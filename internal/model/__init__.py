@@ -1,5 +1,9 @@
 from internal.model.edu.topic import *
+from internal.model.edu.catalog import *
 from internal.model.edu.student import *
 from internal.model.chat.chat import *
+from internal.model.chat.history import *
 from internal.model.account.account import *
-from internal.model.sql_model import *
\ No newline at end of file
+from internal.model.sql_model import *
+from internal.model.migration import *
+from internal.model.partition import *
\ No newline at end of file
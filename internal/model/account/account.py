@@ -1,8 +1,10 @@
 from dataclasses import dataclass, field
 from datetime import datetime
 
+from internal.model.row_mapper import map_rows
 
-@dataclass
+
+@dataclass(slots=True)
 class Account:
     id: int
 
@@ -14,13 +16,4 @@ class Account:
 
     @classmethod
     def serialize(cls, rows) -> list['Account']:
-        return [
-            cls(
-                id=row.id,
-                login=row.login,
-                password=row.password,
-                created_at=row.created_at,
-                updated_at=row.updated_at,
-            )
-            for row in rows
-        ]
\ No newline at end of file
+        return map_rows(cls, rows)
\ No newline at end of file
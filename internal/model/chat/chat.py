@@ -1,7 +1,10 @@
 from dataclasses import dataclass, field
 from datetime import datetime
 
-@dataclass
+from internal.model.row_mapper import map_rows
+
+
+@dataclass(slots=True)
 class Chat:
     id: int
 
@@ -12,38 +15,21 @@ class Chat:
 
     @classmethod
     def serialize(cls, rows) -> list:
-        return [
-            cls(
-                id=row.id,
-                student_id=row.student_id,
-                created_at=row.created_at,
-                updated_at=row.updated_at,
-            )
-            for row in rows
-        ]
-
-
-@dataclass
+        return map_rows(cls, rows)
+
+
+@dataclass(slots=True)
 class Message:
     id: int
     chat_id: int
 
     text: str
     role: str
+    token_count: int = 0
 
     created_at: datetime = field(default_factory=datetime.now)
     updated_at: datetime = field(default_factory=datetime.now)
 
     @classmethod
     def serialize(cls, rows) -> list:
-        return [
-            cls(
-                id=row.id,
-                chat_id=row.chat_id,
-                text=row.text,
-                role=row.role,
-                created_at=row.created_at,
-                updated_at=row.updated_at,
-            )
-            for row in rows
-        ]
\ No newline at end of file
+        return map_rows(cls, rows)
\ No newline at end of file
@@ -0,0 +1,137 @@
+"""Колоночное представление истории чата для бюджетирования токенов.
+
+Тексты лежат в одном буфере строк, а смещения, коды ролей, число токенов и время
+сообщений в массивах array, поэтому подсчет окна по бюджету это один проход по
+числам, а не по спискам объектов Message. С NumPy окно считается векторно.
+"""
+import bisect
+from array import array
+from datetime import datetime
+from itertools import accumulate
+from typing import Callable, Sequence
+
+from internal.common import Roles
+from pkg.tokenizer.tokenizer import MESSAGE_OVERHEAD, count_tokens_batch
+
+try:
+    import numpy as np
+except ImportError:  # pragma: no cover - зависит от окружения
+    np = None
+
+__all__ = ["MessageHistory", "ROLE_CODES", "ROLE_NAMES"]
+
+ROLE_NAMES = (Roles.user, Roles.assistant, Roles.system)
+ROLE_CODES = {role: code for code, role in enumerate(ROLE_NAMES)}
+
+
+class MessageHistory:
+    __slots__ = ("_buffer", "_pending", "_offsets", "_roles", "_tokens", "_timestamps")
+
+    def __init__(self):
+        self._buffer = ""
+        # Добавленные тексты склеиваются в буфер лениво, чтобы append не был квадратичным
+        self._pending: list[str] = []
+        self._offsets = array("q", [0])
+        self._roles = array("b")
+        self._tokens = array("l")
+        self._timestamps = array("d")
+
+    @classmethod
+    def from_messages(
+            cls,
+            messages: Sequence,
+            token_counts: Sequence[int] | None = None,
+            count_tokens: Callable[[list[str]], list[int]] = count_tokens_batch,
+    ) -> "MessageHistory":
+        """Из model.Message или любых объектов с role, text, created_at и, опционально, token_count"""
+        history = cls()
+        texts = [message.text for message in messages]
+        if token_counts is None:
+            token_counts = [getattr(message, "token_count", None) for message in messages]
+            if any(count is None for count in token_counts):
+                token_counts = count_tokens(texts)
+
+        history._pending = texts
+        offset = 0
+        offsets = history._offsets
+        for text in texts:
+            offset += len(text)
+            offsets.append(offset)
+
+        history._roles = array("b", [ROLE_CODES[message.role] for message in messages])
+        history._tokens = array("l", token_counts)
+        history._timestamps = array("d", [_timestamp(message.created_at) for message in messages])
+        return history
+
+    def append(self, role: str, text: str, token_count: int, created_at: datetime | None = None) -> None:
+        self._pending.append(text)
+        self._offsets.append(self._offsets[-1] + len(text))
+        self._roles.append(ROLE_CODES[role])
+        self._tokens.append(token_count)
+        self._timestamps.append(_timestamp(created_at or datetime.now()))
+
+    def __len__(self) -> int:
+        return len(self._roles)
+
+    @property
+    def total_tokens(self) -> int:
+        return sum(self._tokens) + MESSAGE_OVERHEAD * len(self._tokens)
+
+    @property
+    def token_counts(self) -> array:
+        return self._tokens
+
+    @property
+    def roles(self) -> array:
+        return self._roles
+
+    @property
+    def timestamps(self) -> array:
+        return self._timestamps
+
+    def text(self, index: int) -> str:
+        buffer = self._text_buffer()
+        return buffer[self._offsets[index]:self._offsets[index + 1]]
+
+    def role(self, index: int) -> str:
+        return ROLE_NAMES[self._roles[index]]
+
+    def window_start(self, budget: int) -> int:
+        """Индекс начала самого длинного суффикса истории, который помещается в budget токенов"""
+        size = len(self._tokens)
+        if size == 0 or budget <= 0:
+            return size
+
+        if np is not None:
+            costs = np.frombuffer(self._tokens, dtype=np.int64 if self._tokens.itemsize == 8 else np.int32)
+            suffix_sums = np.cumsum(costs[::-1] + MESSAGE_OVERHEAD)
+            fits = int(np.searchsorted(suffix_sums, budget, side="right"))
+        else:
+            suffix_sums = list(accumulate(count + MESSAGE_OVERHEAD for count in reversed(self._tokens)))
+            fits = bisect.bisect_right(suffix_sums, budget)
+
+        return size - fits
+
+    def to_llm_messages(self, start: int = 0) -> list[dict]:
+        """Список сообщений в формате chat completions, как его строит GPTClient.generate"""
+        buffer = self._text_buffer()
+        offsets = self._offsets
+        roles = self._roles
+        return [
+            {"role": ROLE_NAMES[roles[index]], "content": buffer[offsets[index]:offsets[index + 1]]}
+            for index in range(start, len(roles))
+        ]
+
+    def to_llm_messages_within(self, budget: int) -> list[dict]:
+        return self.to_llm_messages(self.window_start(budget))
+
+    def _text_buffer(self) -> str:
+        if self._pending:
+            self._buffer = "".join([self._buffer, *self._pending])
+            self._pending = []
+        return self._buffer
+
+
+def _timestamp(value: datetime | None) -> float:
+    return value.timestamp() if value is not None else 0.0
+
@@ -0,0 +1,106 @@
+from dataclasses import dataclass, field
+from datetime import datetime
+from types import MappingProxyType
+from typing import Mapping
+
+from internal.model.edu.topic import Topic, Block, Chapter
+
+
+@dataclass(frozen=True, slots=True)
+class CatalogIndex:
+    """Неизменяемый снимок каталога: темы, блоки и главы с готовыми связями.
+
+    Дочерние элементы и сквозной порядок глав посчитаны при сборке, поэтому навигация
+    по каталогу не ходит в БД и не перебирает строки. Новый каталог — новый снимок
+    с большей версией, старый у тех, кто его уже взял, не меняется.
+    """
+    version: int
+    # Отпечаток содержимого таблиц на момент сборки, по нему видно, что каталог устарел
+    stamp: str
+
+    topics: Mapping[int, Topic]
+    blocks: Mapping[int, Block]
+    chapters: Mapping[int, Chapter]
+
+    topic_order: tuple[int, ...]
+    blocks_by_topic: Mapping[int, tuple[Block, ...]]
+    chapters_by_block: Mapping[int, tuple[Chapter, ...]]
+    chapters_by_topic: Mapping[int, tuple[Chapter, ...]]
+
+    # Главы в порядке прохождения курса: тема, блок, глава
+    chapter_order: tuple[int, ...]
+    chapter_position: Mapping[int, int]
+
+    built_at: datetime = field(default_factory=datetime.now)
+
+    @classmethod
+    def build(
+            cls,
+            version: int,
+            stamp: str,
+            topics: list[Topic],
+            blocks: list[Block],
+            chapters: list[Chapter],
+    ) -> 'CatalogIndex':
+        """Сборка из get_all_*, порядок внутри родителя берется из порядка строк"""
+        blocks_by_topic: dict[int, list[Block]] = {topic.id: [] for topic in topics}
+        for block in blocks:
+            blocks_by_topic.setdefault(block.topic_id, []).append(block)
+
+        chapters_by_block: dict[int, list[Chapter]] = {block.id: [] for block in blocks}
+        chapters_by_topic: dict[int, list[Chapter]] = {topic.id: [] for topic in topics}
+        for chapter in chapters:
+            chapters_by_block.setdefault(chapter.block_id, []).append(chapter)
+            chapters_by_topic.setdefault(chapter.topic_id, []).append(chapter)
+
+        chapter_order = tuple(
+            chapter.id
+            for topic in topics
+            for block in blocks_by_topic[topic.id]
+            for chapter in chapters_by_block[block.id]
+        )
+
+        return cls(
+            version=version,
+            stamp=stamp,
+            topics=MappingProxyType({topic.id: topic for topic in topics}),
+            blocks=MappingProxyType({block.id: block for block in blocks}),
+            chapters=MappingProxyType({chapter.id: chapter for chapter in chapters}),
+            topic_order=tuple(topic.id for topic in topics),
+            blocks_by_topic=MappingProxyType({key: tuple(value) for key, value in blocks_by_topic.items()}),
+            chapters_by_block=MappingProxyType({key: tuple(value) for key, value in chapters_by_block.items()}),
+            chapters_by_topic=MappingProxyType({key: tuple(value) for key, value in chapters_by_topic.items()}),
+            chapter_order=chapter_order,
+            chapter_position=MappingProxyType({chapter_id: index for index, chapter_id in enumerate(chapter_order)}),
+        )
+
+    def topic(self, topic_id: int) -> Topic | None:
+        return self.topics.get(topic_id)
+
+    def block(self, block_id: int) -> Block | None:
+        return self.blocks.get(block_id)
+
+    def chapter(self, chapter_id: int) -> Chapter | None:
+        return self.chapters.get(chapter_id)
+
+    def blocks_of(self, topic_id: int) -> tuple[Block, ...]:
+        return self.blocks_by_topic.get(topic_id, ())
+
+    def chapters_of_block(self, block_id: int) -> tuple[Chapter, ...]:
+        return self.chapters_by_block.get(block_id, ())
+
+    def chapters_of_topic(self, topic_id: int) -> tuple[Chapter, ...]:
+        return self.chapters_by_topic.get(topic_id, ())
+
+    def next_chapter(self, chapter_id: int) -> Chapter | None:
+        """Следующая глава курса, в том числе из следующего блока или темы"""
+        position = self.chapter_position.get(chapter_id)
+        if position is None or position + 1 >= len(self.chapter_order):
+            return None
+        return self.chapters[self.chapter_order[position + 1]]
+
+    def previous_chapter(self, chapter_id: int) -> Chapter | None:
+        position = self.chapter_position.get(chapter_id)
+        if not position:
+            return None
+        return self.chapters[self.chapter_order[position - 1]]
@@ -1,8 +1,10 @@
 from dataclasses import dataclass, field
 from datetime import datetime
 
+from internal.model.row_mapper import map_rows
 
-@dataclass
+
+@dataclass(slots=True)
 class Student:
     id: int
     account_id: int
@@ -49,32 +51,4 @@ class Student:
     @classmethod
     def serialize(cls, rows) -> list['Student']:
         """Сериализация из результатов БД"""
-        return [
-            cls(
-                id=row.id,
-                account_id=row.account_id,
-                current_expert=row.current_expert,
-                current_topic=row.current_topic,
-                current_block=row.current_block,
-                current_chapter=row.current_chapter,
-                programming_experience=row.programming_experience,
-                education_background=row.education_background,
-                learning_goals=row.learning_goals,
-                career_goals=row.career_goals,
-                timeline=row.timeline,
-                learning_style=row.learning_style,
-                lesson_duration=row.lesson_duration,
-                preferred_difficulty=row.preferred_difficulty,
-                recommended_topics=row.recommended_topics,
-                recommended_blocks=row.recommended_blocks,
-                approved_topics=row.approved_topics,
-                approved_blocks=row.approved_blocks,
-                approved_chapters=row.approved_chapters,
-                assessment_score=row.assessment_score,
-                strong_areas=row.strong_areas,
-                weak_areas=row.weak_areas,
-                created_at=row.created_at,
-                updated_at=row.updated_at,
-            )
-            for row in rows
-        ]
+        return map_rows(cls, rows)
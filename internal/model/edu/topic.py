@@ -1,8 +1,10 @@
 from dataclasses import dataclass, field
 from datetime import datetime
 
+from internal.model.row_mapper import map_rows
 
-@dataclass
+
+@dataclass(slots=True)
 class Topic:
     id: int
 
@@ -19,26 +21,16 @@ class Topic:
             "name": self.name,
             "intro_file_id": self.intro_file_id,
             "edu_plan_file_id": self.edu_plan_file_id,
-            "created_at": self.created_at.isoformat(),
-            "updated_at": self.updated_at.isoformat()
+            "created_at": self.created_at,
+            "updated_at": self.updated_at
         }
 
     @classmethod
     def serialize(cls, rows) -> list:
-        return [
-            cls(
-                id=row.id,
-                name=row.name,
-                intro_file_id=row.intro_file_id,
-                edu_plan_file_id=row.edu_plan_file_id,
-                created_at=row.created_at,
-                updated_at=row.updated_at,
-            )
-            for row in rows
-        ]
-
-
-@dataclass
+        return map_rows(cls, rows)
+
+
+@dataclass(slots=True)
 class Block:
     id: int
     topic_id: int
@@ -55,26 +47,16 @@ class Block:
             "topic_id": self.topic_id,
             "name": self.name,
             "content_file_id": self.content_file_id,
-            "created_at": self.created_at.isoformat(),
-            "updated_at": self.updated_at.isoformat()
+            "created_at": self.created_at,
+            "updated_at": self.updated_at
         }
 
     @classmethod
     def serialize(cls, rows) -> list:
-        return [
-            cls(
-                id=row.id,
-                topic_id=row.topic_id,
-                name=row.name,
-                content_file_id=row.content_file_id,
-                created_at=row.created_at,
-                updated_at=row.updated_at,
-            )
-            for row in rows
-        ]
-
-
-@dataclass
+        return map_rows(cls, rows)
+
+
+@dataclass(slots=True)
 class Chapter:
     id: int
     topic_id: int
@@ -93,21 +75,33 @@ class Chapter:
             "block_id": self.block_id,
             "name": self.name,
             "content_file_id": self.content_file_id,
-            "created_at": self.created_at.isoformat(),
-            "updated_at": self.updated_at.isoformat()
+            "created_at": self.created_at,
+            "updated_at": self.updated_at
         }
 
     @classmethod
     def serialize(cls, rows) -> list:
-        return [
-            cls(
-                id=row.id,
-                topic_id=row.topic_id,
-                block_id=row.block_id,
-                name=row.name,
-                content_file_id=row.content_file_id,
-                created_at=row.created_at,
-                updated_at=row.updated_at,
-            )
-            for row in rows
-        ]
+        return map_rows(cls, rows)
+
+
+# Черновики контента для массовой загрузки, родители указываются по имени
+@dataclass(slots=True)
+class TopicContent:
+    name: str
+    intro_file_id: str = None
+    edu_plan_file_id: str = None
+
+
+@dataclass(slots=True)
+class BlockContent:
+    topic_name: str
+    name: str
+    content_file_id: str = None
+
+
+@dataclass(slots=True)
+class ChapterContent:
+    topic_name: str
+    block_name: str
+    name: str
+    content_file_id: str = None
@@ -0,0 +1,173 @@
+from dataclasses import dataclass, field
+from datetime import datetime
+
+from internal.model.row_mapper import map_rows
+from internal.model.sql_model import initial_schema_queries
+
+
+@dataclass(slots=True)
+class Migration:
+    version: int
+    name: str
+    queries: list[str]
+    # CREATE INDEX CONCURRENTLY нельзя выполнять в транзакции: такие шаги идут в autocommit
+    concurrently: bool = False
+
+
+@dataclass(slots=True)
+class AppliedMigration:
+    version: int
+    name: str
+    duration_ms: float = 0
+    applied_at: datetime = field(default_factory=datetime.now)
+
+    @classmethod
+    def serialize(cls, rows) -> list['AppliedMigration']:
+        """Сериализация из результатов БД"""
+        return map_rows(cls, rows)
+
+
+create_schema_migrations_table = """
+CREATE TABLE IF NOT EXISTS schema_migrations (
+    version INTEGER PRIMARY KEY,
+    name VARCHAR(255) NOT NULL,
+    duration_ms DOUBLE PRECISION NOT NULL DEFAULT 0,
+    applied_at TIMESTAMP WITH TIME ZONE DEFAULT NOW()
+);
+"""
+
+# Версии только добавляются, примененные миграции не меняются: новое изменение схемы — новая версия.
+# Упавший CONCURRENTLY оставляет INVALID индекс, поэтому перед созданием он удаляется.
+# Версия 4 занята необязательным секционированием messages (internal/model/partition.py)
+migrations = [
+    Migration(1, "initial_schema", initial_schema_queries),
+    Migration(
+        2,
+        "messages_chat_id_created_at_index",
+        [
+            "DROP INDEX CONCURRENTLY IF EXISTS idx_messages_chat_id_created_at;",
+            "CREATE INDEX CONCURRENTLY idx_messages_chat_id_created_at ON messages(chat_id, created_at);",
+        ],
+        concurrently=True
+    ),
+    Migration(
+        3,
+        "chats_student_id_created_at_index",
+        [
+            "DROP INDEX CONCURRENTLY IF EXISTS idx_chats_student_id_created_at;",
+            "CREATE INDEX CONCURRENTLY idx_chats_student_id_created_at ON chats(student_id, created_at);",
+        ],
+        concurrently=True
+    ),
+    Migration(
+        5,
+        "chats_student_id_unique",
+        [
+            # До атомарного create_chat гонка могла создать студенту несколько чатов. Остается
+            # последний, его читает get_chat_by_student_id, сообщения остальных переносятся в него
+            """
+            CREATE TEMPORARY TABLE chats_duplicates ON COMMIT DROP AS
+            SELECT id, student_id,
+                   FIRST_VALUE(id) OVER w AS keep_id,
+                   MIN(created_at) OVER (PARTITION BY student_id) AS first_created_at
+            FROM chats
+            WHERE student_id IN (SELECT student_id FROM chats GROUP BY student_id HAVING COUNT(*) > 1)
+            WINDOW w AS (PARTITION BY student_id ORDER BY created_at DESC NULLS LAST, id DESC);
+            """,
+            """
+            UPDATE messages m SET chat_id = d.keep_id
+            FROM chats_duplicates d
+            WHERE m.chat_id = d.id AND d.id <> d.keep_id;
+            """,
+            # История читается с момента создания чата, поэтому он начинается с самого раннего из склеенных
+            """
+            UPDATE chats c SET created_at = d.first_created_at
+            FROM chats_duplicates d
+            WHERE c.id = d.keep_id AND d.id = d.keep_id;
+            """,
+            "DELETE FROM chats c USING chats_duplicates d WHERE c.id = d.id AND d.id <> d.keep_id;",
+            "CREATE UNIQUE INDEX IF NOT EXISTS idx_chats_student_id_unique ON chats(student_id);",
+            # Уникальный индекс покрывает поиск по student_id, обычный больше не нужен
+            "DROP INDEX IF EXISTS idx_chats_student_id;",
+        ]
+    ),
+    Migration(
+        6,
+        "catalog_natural_keys",
+        [
+            # Естественные ключи каталога для идемпотентной загрузки контента
+            "CREATE UNIQUE INDEX IF NOT EXISTS idx_topics_name_unique ON topics(name);",
+            "CREATE UNIQUE INDEX IF NOT EXISTS idx_blocks_topic_id_name_unique ON blocks(topic_id, name);",
+            "CREATE UNIQUE INDEX IF NOT EXISTS idx_chapters_block_id_name_unique ON chapters(block_id, name);",
+        ]
+    ),
+    Migration(
+        7,
+        "messages_token_count",
+        [
+            "ALTER TABLE messages ADD COLUMN IF NOT EXISTS token_count INTEGER NOT NULL DEFAULT 0;",
+        ]
+    ),
+    Migration(
+        8,
+        "student_progress",
+        [
+            # Пройденные темы, блоки и главы: одна строка на сущность вместо растущих approved_* JSONB
+            """
+            CREATE TABLE IF NOT EXISTS student_progress (
+                student_id INTEGER NOT NULL REFERENCES students(id) ON DELETE CASCADE,
+                entity_type VARCHAR(16) NOT NULL CHECK (entity_type IN ('topic', 'block', 'chapter')),
+                entity_id INTEGER NOT NULL,
+                entity_name VARCHAR(255) NOT NULL,
+                approved_at TIMESTAMP WITH TIME ZONE DEFAULT NOW(),
+                PRIMARY KEY (student_id, entity_type, entity_id)
+            );
+            """,
+            "CREATE INDEX IF NOT EXISTS idx_student_progress_entity ON student_progress(entity_type, entity_id);",
+        ]
+    ),
+    Migration(
+        9,
+        "messages_token_count_backfill",
+        [
+            # Сообщения до версии 7 получили token_count = 0 и не занимали бюджет истории. Пересчет
+            # всей таблицы одной транзакцией переписал бы каждую строку, поэтому его пачками по id
+            # делает maintain_messages, а здесь только таблица, где он запоминает, докуда дошел
+            """
+            CREATE TABLE IF NOT EXISTS maintenance_progress (
+                name VARCHAR(64) PRIMARY KEY,
+                last_id BIGINT NOT NULL DEFAULT 0,
+                updated_at TIMESTAMP WITH TIME ZONE DEFAULT NOW()
+            );
+            """,
+        ]
+    ),
+    Migration(
+        10,
+        "student_progress_copy",
+        [
+            # Перенос уже пройденного из JSONB колонок students. Ключи не числа пропускаются
+            """
+            INSERT INTO student_progress (student_id, entity_type, entity_id, entity_name)
+            SELECT s.id, e.entity_type, e.key::integer, e.value
+            FROM students s
+            CROSS JOIN LATERAL (
+                SELECT 'topic' AS entity_type, key, value
+                FROM jsonb_each_text(CASE WHEN jsonb_typeof(s.approved_topics) = 'object' THEN s.approved_topics ELSE '{}'::jsonb END)
+                UNION ALL
+                SELECT 'block', key, value
+                FROM jsonb_each_text(CASE WHEN jsonb_typeof(s.approved_blocks) = 'object' THEN s.approved_blocks ELSE '{}'::jsonb END)
+                UNION ALL
+                SELECT 'chapter', key, value
+                FROM jsonb_each_text(CASE WHEN jsonb_typeof(s.approved_chapters) = 'object' THEN s.approved_chapters ELSE '{}'::jsonb END)
+            ) e
+            WHERE e.key ~ '^[0-9]+$'
+            ON CONFLICT (student_id, entity_type, entity_id) DO NOTHING;
+            """,
+            # Колонки остаются только для отката на код, который их еще читает
+            "COMMENT ON COLUMN students.approved_topics IS 'deprecated: данные в student_progress, колонка не пишется';",
+            "COMMENT ON COLUMN students.approved_blocks IS 'deprecated: данные в student_progress, колонка не пишется';",
+            "COMMENT ON COLUMN students.approved_chapters IS 'deprecated: данные в student_progress, колонка не пишется';",
+        ]
+    ),
+]
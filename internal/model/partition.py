@@ -0,0 +1,102 @@
+from internal.model.migration import Migration
+
+messages_partition_strategies = ("none", "range", "hash")
+messages_archive_schema = "messages_archive"
+
+# Месячные секции range схемы называются messages_yYYYYmMM, по имени обслуживание находит их границы
+messages_range_partition_pattern = r"^messages_y(\d{4})m(\d{2})$"
+
+_create_ensure_partitions_function = """
+CREATE OR REPLACE FUNCTION messages_ensure_partitions(p_from TIMESTAMPTZ, p_to TIMESTAMPTZ)
+RETURNS INTEGER
+LANGUAGE plpgsql
+AS $$
+DECLARE
+    month_start DATE := date_trunc('month', p_from)::date;
+    partition_name TEXT;
+    created INTEGER := 0;
+BEGIN
+    WHILE month_start <= p_to LOOP
+        partition_name := format('messages_y%sm%s', to_char(month_start, 'YYYY'), to_char(month_start, 'MM'));
+        IF to_regclass(partition_name) IS NULL THEN
+            EXECUTE format(
+                'CREATE TABLE %I PARTITION OF messages FOR VALUES FROM (%L) TO (%L)',
+                partition_name, month_start, (month_start + INTERVAL '1 month')::date
+            );
+            created := created + 1;
+        END IF;
+        month_start := (month_start + INTERVAL '1 month')::date;
+    END LOOP;
+    RETURN created;
+END;
+$$;
+"""
+
+
+def messages_partition_migration(
+        strategy: str,
+        hash_partitions: int = 16,
+        premake_months: int = 3,
+) -> Migration | None:
+    """Перевод messages на декларативное секционирование, None если секционирование выключено.
+
+    range: месячные секции по created_at, старые месяцы отсоединяются целиком.
+    hash: секции по chat_id, чтение истории чата всегда попадает в одну секцию.
+    Таблица копируется в одной транзакции под эксклюзивной блокировкой, поэтому миграцию
+    запускают в окно обслуживания. Стратегия выбирается один раз: версия 4 больше не применяется.
+    """
+    if strategy not in messages_partition_strategies:
+        raise ValueError(f"Неизвестная стратегия секционирования messages: {strategy}")
+    if strategy == "none":
+        return None
+
+    if strategy == "range":
+        partition_by = "PARTITION BY RANGE (created_at)"
+        primary_key = "PRIMARY KEY (id, created_at)"
+        partitions = [
+            _create_ensure_partitions_function,
+            "CREATE TABLE messages_default PARTITION OF messages DEFAULT;",
+            f"""
+            SELECT messages_ensure_partitions(
+                COALESCE((SELECT MIN(created_at) FROM messages_unpartitioned), NOW()),
+                NOW() + INTERVAL '{int(premake_months)} months'
+            );
+            """,
+        ]
+    else:
+        partition_by = "PARTITION BY HASH (chat_id)"
+        primary_key = "PRIMARY KEY (id, chat_id)"
+        partitions = [
+            f"CREATE TABLE messages_h{remainder:02d} PARTITION OF messages "
+            f"FOR VALUES WITH (MODULUS {hash_partitions}, REMAINDER {remainder});"
+            for remainder in range(hash_partitions)
+        ]
+
+    return Migration(
+        4,
+        f"messages_partition_{strategy}",
+        [
+            # Последовательность id переживает пересоздание таблицы
+            "ALTER SEQUENCE messages_id_seq OWNED BY NONE;",
+            "ALTER TABLE messages RENAME TO messages_unpartitioned;",
+            # Колонки, умолчания и CHECK копируются из текущей таблицы: миграция не зависит от того,
+            # какие версии схемы применены до нее, и не теряет колонки, добавленные позже версии 4
+            f"""
+            CREATE TABLE messages (
+                LIKE messages_unpartitioned INCLUDING DEFAULTS INCLUDING CONSTRAINTS,
+                {primary_key},
+                FOREIGN KEY (chat_id) REFERENCES chats(id) ON DELETE CASCADE
+            ) {partition_by};
+            """,
+            "ALTER TABLE messages ALTER COLUMN chat_id SET NOT NULL;",
+            "ALTER TABLE messages ALTER COLUMN created_at SET NOT NULL;",
+            "ALTER TABLE messages ALTER COLUMN created_at SET DEFAULT NOW();",
+            *partitions,
+            "UPDATE messages_unpartitioned SET created_at = NOW() WHERE created_at IS NULL;",
+            "INSERT INTO messages SELECT * FROM messages_unpartitioned WHERE chat_id IS NOT NULL;",
+            "DROP TABLE messages_unpartitioned;",
+            "ALTER SEQUENCE messages_id_seq OWNED BY messages.id;",
+            # Индекс на родителе создается в каждой секции
+            "CREATE INDEX IF NOT EXISTS idx_messages_chat_id_created_at ON messages(chat_id, created_at);",
+        ]
+    )
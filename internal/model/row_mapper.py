@@ -0,0 +1,48 @@
+"""Генерация функции маппинга строк БД в модели, одна на форму запроса.
+
+Функция собирается через exec один раз на пару (класс, набор колонок) и кэшируется:
+строки распаковываются в локальные переменные без getattr по имени колонки,
+колонки, которых нет в модели, пропускаются, а отсутствующие в запросе поля
+получают значения по умолчанию из dataclass.
+"""
+import dataclasses
+from typing import Any, Callable, Sequence, TypeVar
+
+T = TypeVar("T")
+
+_mappers: dict[tuple[type, tuple[str, ...]], Callable[[Sequence[Any]], list]] = {}
+
+
+def row_mapper(cls: type[T], columns: tuple[str, ...]) -> Callable[[Sequence[Any]], list[T]]:
+    key = (cls, columns)
+    mapper = _mappers.get(key)
+    if mapper is None:
+        mapper = _mappers[key] = _build_mapper(cls, columns)
+    return mapper
+
+
+def map_rows(cls: type[T], rows: Sequence[Any]) -> list[T]:
+    if not rows:
+        return []
+    return row_mapper(cls, tuple(rows[0]._fields))(rows)
+
+
+def _build_mapper(cls: type, columns: tuple[str, ...]) -> Callable[[Sequence[Any]], list]:
+    init_fields = {field.name for field in dataclasses.fields(cls) if field.init}
+
+    # Имена колонок могут быть любыми, в коде используются только позиционные переменные
+    targets = [f"c{index}" for index in range(len(columns))]
+    unpack = ", ".join(targets) + ("," if len(targets) == 1 else "")
+    kwargs = ", ".join(
+        f"{column}={target}"
+        for column, target in zip(columns, targets)
+        if column in init_fields
+    )
+
+    source = (
+        f"def map_{cls.__name__.lower()}_rows(rows):\n"
+        f"    return [cls({kwargs}) for {unpack} in rows]\n"
+    )
+    namespace: dict[str, Any] = {"cls": cls}
+    exec(compile(source, f"<row_mapper {cls.__name__}>", "exec"), namespace)
+    return namespace[f"map_{cls.__name__.lower()}_rows"]
@@ -1,4 +1,6 @@
-create_queries = [
+# Схема на момент появления миграций, версия 1. Снимок не меняется: изменения схемы
+# добавляются новыми версиями в internal/model/migration.py
+initial_schema_queries = [
     """
     CREATE TABLE IF NOT EXISTS accounts (
         id SERIAL PRIMARY KEY,
@@ -103,9 +105,13 @@ create_queries = [
 drop_queries = [
     "DROP TABLE IF EXISTS messages CASCADE;",
     "DROP TABLE IF EXISTS chats CASCADE;",
+    "DROP TABLE IF EXISTS student_progress CASCADE;",
     "DROP TABLE IF EXISTS chapters CASCADE;",
     "DROP TABLE IF EXISTS blocks CASCADE;",
     "DROP TABLE IF EXISTS topics CASCADE;",
     "DROP TABLE IF EXISTS students CASCADE;",
-    "DROP TABLE IF EXISTS accounts CASCADE;"
+    "DROP TABLE IF EXISTS accounts CASCADE;",
+    "DROP TABLE IF EXISTS schema_migrations CASCADE;",
+    "DROP TABLE IF EXISTS maintenance_progress CASCADE;",
+    "DROP FUNCTION IF EXISTS messages_ensure_partitions;"
 ]
\ No newline at end of file
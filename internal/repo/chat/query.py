@@ -1,6 +1,7 @@
 create_chat = """
 INSERT INTO chats (student_id, created_at, updated_at)
 VALUES (:student_id, NOW(), NOW())
+ON CONFLICT (student_id) DO NOTHING
 RETURNING id;
 """
 
@@ -19,20 +20,43 @@ WHERE id = :chat_id;
 """
 
 create_message = """
-INSERT INTO messages (chat_id, role, text, created_at, updated_at)
-VALUES (:chat_id, :role, :text, NOW(), NOW())
+INSERT INTO messages (chat_id, role, text, token_count, created_at, updated_at)
+VALUES (:chat_id, :role, :text, :token_count, NOW(), NOW())
 RETURNING id;
 """
 
+# Сообщения не старше чата: при секционировании по created_at граница из chats
+# отсекает месячные секции до создания чата прямо во время выполнения
 get_messages_by_chat_id = """
-SELECT id, chat_id, text, role, created_at, updated_at
+SELECT id, chat_id, text, role, token_count, created_at, updated_at
 FROM messages
 WHERE chat_id = :chat_id
+  AND created_at >= COALESCE((SELECT created_at FROM chats WHERE id = :chat_id), '-infinity')
 ORDER BY created_at ASC;
 """
 
+# Самый длинный суффикс истории, который помещается в бюджет токенов.
+# Накопительная сумма считается от последнего сообщения к первому, последнее сообщение
+# возвращается всегда, даже если одно превышает бюджет
+get_messages_within_token_budget = """
+SELECT id, chat_id, text, role, token_count, created_at, updated_at
+FROM (
+    SELECT id, chat_id, text, role, token_count, created_at, updated_at,
+           SUM(token_count + :message_overhead) OVER (
+               ORDER BY created_at DESC, id DESC
+               ROWS BETWEEN UNBOUNDED PRECEDING AND CURRENT ROW
+           ) AS suffix_tokens,
+           ROW_NUMBER() OVER (ORDER BY created_at DESC, id DESC) AS position
+    FROM messages
+    WHERE chat_id = :chat_id
+      AND created_at >= COALESCE((SELECT created_at FROM chats WHERE id = :chat_id), '-infinity')
+) AS history
+WHERE suffix_tokens <= :token_budget OR position = 1
+ORDER BY created_at ASC, id ASC;
+"""
+
 get_message_by_id = """
-SELECT id, chat_id, text, role, created_at, updated_at
+SELECT id, chat_id, text, role, token_count, created_at, updated_at
 FROM messages
 WHERE id = :message_id;
 """
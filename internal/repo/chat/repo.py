@@ -1,8 +1,15 @@
+import asyncio
+
 from opentelemetry.trace import SpanKind, Status, StatusCode
 
 from .query import *
 from internal import model
+from internal import common
 from internal import interface
+from pkg.tokenizer.tokenizer import MESSAGE_OVERHEAD, count_tokens
+
+# Длинные тексты токенизируются в отдельном потоке, чтобы не держать event loop
+TOKENIZE_INLINE_LIMIT = 2000
 
 
 class ChatRepo(interface.IChatRepo):
@@ -20,7 +27,15 @@ class ChatRepo(interface.IChatRepo):
         ) as span:
             try:
                 args = {'student_id': student_id}
-                chat_id = await self.db.insert(create_chat, args)
+                chat_id = await self.db.insert(
+                    create_chat,
+                    args,
+                    sticky_key=common.STUDENT_STICKY_KEY.format(student_id)
+                )
+                if chat_id is None:
+                    # Чат уже создал параллельный ход, конфликт дождался его коммита: читаем с primary
+                    rows = await self.db.select(get_chat_by_student_id, args)
+                    chat_id = rows[0].id
 
                 span.set_status(StatusCode.OK)
                 return chat_id
@@ -39,7 +54,12 @@ class ChatRepo(interface.IChatRepo):
         ) as span:
             try:
                 args = {'student_id': student_id}
-                rows = await self.db.select(get_chat_by_student_id, args)
+                rows = await self.db.select(
+                    get_chat_by_student_id,
+                    args,
+                    replica=True,
+                    sticky_key=common.STUDENT_STICKY_KEY.format(student_id)
+                )
                 result = model.Chat.serialize(rows) if rows else []
 
                 span.set_status(StatusCode.OK)
@@ -49,7 +69,7 @@ class ChatRepo(interface.IChatRepo):
                 span.set_status(StatusCode.ERROR, str(err))
                 raise err
 
-    async def create_message(self, chat_id: int, role: str, text: str):
+    async def create_message(self, chat_id: int, role: str, text: str, token_count: int = None):
         with self.tracer.start_as_current_span(
                 "ChatRepo.create_message",
                 kind=SpanKind.INTERNAL,
@@ -59,12 +79,24 @@ class ChatRepo(interface.IChatRepo):
                 }
         ) as span:
             try:
+                if token_count is None:
+                    if len(text) > TOKENIZE_INLINE_LIMIT:
+                        token_count = await asyncio.to_thread(count_tokens, text)
+                    else:
+                        token_count = count_tokens(text)
+                span.set_attribute("token_count", token_count)
+
                 args = {
                     'chat_id': chat_id,
                     'role': role,
                     'text': text,
+                    'token_count': token_count,
                 }
-                message_id = await self.db.insert(create_message, args)
+                message_id = await self.db.insert(
+                    create_message,
+                    args,
+                    sticky_key=common.CHAT_STICKY_KEY.format(chat_id)
+                )
 
                 span.set_status(StatusCode.OK)
                 return message_id
@@ -83,7 +115,12 @@ class ChatRepo(interface.IChatRepo):
         ) as span:
             try:
                 args = {'chat_id': chat_id}
-                rows = await self.db.select(get_messages_by_chat_id, args)
+                rows = await self.db.select(
+                    get_messages_by_chat_id,
+                    args,
+                    replica=True,
+                    sticky_key=common.CHAT_STICKY_KEY.format(chat_id)
+                )
                 result = model.Message.serialize(rows) if rows else []
 
                 span.set_status(StatusCode.OK)
@@ -91,4 +128,35 @@ class ChatRepo(interface.IChatRepo):
             except Exception as err:
                 span.record_exception(err)
                 span.set_status(StatusCode.ERROR, str(err))
-                raise err
\ No newline at end of file
+                raise err
+
+    async def get_messages_within_token_budget(self, chat_id: int, token_budget: int) -> list[model.Message]:
+        with self.tracer.start_as_current_span(
+                "ChatRepo.get_messages_within_token_budget",
+                kind=SpanKind.INTERNAL,
+                attributes={
+                    "chat_id": chat_id,
+                    "token_budget": token_budget,
+                }
+        ) as span:
+            try:
+                args = {
+                    'chat_id': chat_id,
+                    'token_budget': token_budget,
+                    'message_overhead': MESSAGE_OVERHEAD,
+                }
+                rows = await self.db.select(
+                    get_messages_within_token_budget,
+                    args,
+                    replica=True,
+                    sticky_key=common.CHAT_STICKY_KEY.format(chat_id)
+                )
+                result = model.Message.serialize(rows) if rows else []
+
+                span.set_attribute("messages", len(result))
+                span.set_status(StatusCode.OK)
+                return result
+            except Exception as err:
+                span.record_exception(err)
+                span.set_status(StatusCode.ERROR, str(err))
+                raise err
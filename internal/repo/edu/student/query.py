@@ -1,3 +1,5 @@
+from functools import lru_cache
+
 create_student = """
 INSERT INTO students (
     account_id, 
@@ -9,77 +11,157 @@ VALUES (:account_id, 'registrator', NOW(), NOW())
 RETURNING id;
 """
 
+# approved_* собираются из student_progress, JSONB колонки students больше не пишутся
 get_student_by_id = """
 SELECT 
-    id, account_id, current_expert, current_topic, current_block, current_chapter,
-    programming_experience, education_background, learning_goals, career_goals, timeline,
-    learning_style, lesson_duration, preferred_difficulty, recommended_topics, recommended_blocks,
-    approved_topics, approved_blocks, approved_chapters, assessment_score, strong_areas, weak_areas,
-    created_at, updated_at
+    s.id, s.account_id, s.current_expert, s.current_topic, s.current_block, s.current_chapter,
+    s.programming_experience, s.education_background, s.learning_goals, s.career_goals, s.timeline,
+    s.learning_style, s.lesson_duration, s.preferred_difficulty, s.recommended_topics, s.recommended_blocks,
+    COALESCE(p.approved_topics, '{}'::jsonb) AS approved_topics,
+    COALESCE(p.approved_blocks, '{}'::jsonb) AS approved_blocks,
+    COALESCE(p.approved_chapters, '{}'::jsonb) AS approved_chapters,
+    s.assessment_score, s.strong_areas, s.weak_areas,
+    s.created_at, s.updated_at
+FROM students s
+LEFT JOIN LATERAL (
+    SELECT
+        jsonb_object_agg(entity_id::text, entity_name) FILTER (WHERE entity_type = 'topic') AS approved_topics,
+        jsonb_object_agg(entity_id::text, entity_name) FILTER (WHERE entity_type = 'block') AS approved_blocks,
+        jsonb_object_agg(entity_id::text, entity_name) FILTER (WHERE entity_type = 'chapter') AS approved_chapters
+    FROM student_progress
+    WHERE student_id = s.id
+) p ON TRUE
+WHERE s.id = :student_id;
+"""
+
+get_student_by_account_id = """
+SELECT 
+    s.id, s.account_id, s.current_expert, s.current_topic, s.current_block, s.current_chapter,
+    s.programming_experience, s.education_background, s.learning_goals, s.career_goals, s.timeline,
+    s.learning_style, s.lesson_duration, s.preferred_difficulty, s.recommended_topics, s.recommended_blocks,
+    COALESCE(p.approved_topics, '{}'::jsonb) AS approved_topics,
+    COALESCE(p.approved_blocks, '{}'::jsonb) AS approved_blocks,
+    COALESCE(p.approved_chapters, '{}'::jsonb) AS approved_chapters,
+    s.assessment_score, s.strong_areas, s.weak_areas,
+    s.created_at, s.updated_at
+FROM students s
+LEFT JOIN LATERAL (
+    SELECT
+        jsonb_object_agg(entity_id::text, entity_name) FILTER (WHERE entity_type = 'topic') AS approved_topics,
+        jsonb_object_agg(entity_id::text, entity_name) FILTER (WHERE entity_type = 'block') AS approved_blocks,
+        jsonb_object_agg(entity_id::text, entity_name) FILTER (WHERE entity_type = 'chapter') AS approved_chapters
+    FROM student_progress
+    WHERE student_id = s.id
+) p ON TRUE
+WHERE s.account_id = :account_id;
+"""
+
+# Узкие проекции: не тащим большие JSONB карты туда, где они не нужны
+get_student_expert_by_id = """
+SELECT id, account_id, current_expert
 FROM students
 WHERE id = :student_id;
 """
 
-get_student_by_account_id = """
+get_student_progress_by_id = """
 SELECT 
-    id, account_id, current_expert, current_topic, current_block, current_chapter,
+    s.id, s.account_id, s.current_topic, s.current_block, s.current_chapter,
+    s.recommended_topics, s.recommended_blocks,
+    COALESCE(p.approved_topics, '{}'::jsonb) AS approved_topics,
+    COALESCE(p.approved_blocks, '{}'::jsonb) AS approved_blocks,
+    COALESCE(p.approved_chapters, '{}'::jsonb) AS approved_chapters,
+    s.assessment_score, s.strong_areas, s.weak_areas
+FROM students s
+LEFT JOIN LATERAL (
+    SELECT
+        jsonb_object_agg(entity_id::text, entity_name) FILTER (WHERE entity_type = 'topic') AS approved_topics,
+        jsonb_object_agg(entity_id::text, entity_name) FILTER (WHERE entity_type = 'block') AS approved_blocks,
+        jsonb_object_agg(entity_id::text, entity_name) FILTER (WHERE entity_type = 'chapter') AS approved_chapters
+    FROM student_progress
+    WHERE student_id = s.id
+) p ON TRUE
+WHERE s.id = :student_id;
+"""
+
+get_student_profile_by_id = """
+SELECT 
+    id, account_id, current_expert,
     programming_experience, education_background, learning_goals, career_goals, timeline,
-    learning_style, lesson_duration, preferred_difficulty, recommended_topics, recommended_blocks,
-    approved_topics, approved_blocks, approved_chapters, assessment_score, strong_areas, weak_areas,
-    created_at, updated_at
+    learning_style, lesson_duration, preferred_difficulty
 FROM students
-WHERE account_id = :account_id;
+WHERE id = :student_id;
 """
 
-update_student_background = """
+# Колонки, которые можно менять через update_student_background
+student_text_columns = (
+    "programming_experience",
+    "education_background",
+    "learning_goals",
+    "career_goals",
+    "timeline",
+    "learning_style",
+    "lesson_duration",
+    "preferred_difficulty",
+    "assessment_score",
+)
+# Пройденное из background уходит в student_progress, а не в колонки students
+student_progress_columns = {
+    "approved_topics": "topic",
+    "approved_blocks": "block",
+    "approved_chapters": "chapter",
+}
+student_jsonb_columns = (
+    "recommended_topics",
+    "recommended_blocks",
+    "strong_areas",
+    "weak_areas",
+)
+
+
+@lru_cache(maxsize=256)
+def update_student_columns(columns: tuple[str, ...]) -> str:
+    """UPDATE только по переданным колонкам, текст запроса кэшируется по набору колонок"""
+    assignments = [
+        f"{column} = CAST(:{column} AS jsonb)" if column in student_jsonb_columns else f"{column} = :{column}"
+        for column in columns
+    ]
+    assignments.append("updated_at = NOW()")
+    return f"""
 UPDATE students
-SET 
-    programming_experience = COALESCE(:programming_experience, programming_experience),
-    education_background = COALESCE(:education_background, education_background),
-    learning_goals = COALESCE(:learning_goals, learning_goals),
-    career_goals = COALESCE(:career_goals, career_goals),
-    timeline = COALESCE(:timeline, timeline),
-    learning_style = COALESCE(:learning_style, learning_style),
-    lesson_duration = COALESCE(:lesson_duration, lesson_duration),
-    preferred_difficulty = COALESCE(:preferred_difficulty, preferred_difficulty),
-    recommended_topics = COALESCE(:recommended_topics::jsonb, recommended_topics),
-    recommended_blocks = COALESCE(:recommended_blocks::jsonb, recommended_blocks),
-    approved_topics = COALESCE(:approved_topics::jsonb, approved_topics),
-    approved_blocks = COALESCE(:approved_blocks::jsonb, approved_blocks),
-    approved_chapters = COALESCE(:approved_chapters::jsonb, approved_chapters),
-    assessment_score = COALESCE(:assessment_score, assessment_score),
-    strong_areas = COALESCE(:strong_areas::jsonb, strong_areas),
-    weak_areas = COALESCE(:weak_areas::jsonb, weak_areas),
-    updated_at = NOW()
+SET {", ".join(assignments)}
 WHERE id = :student_id;
 """
 
+
 change_current_expert = """
 UPDATE students
 SET current_expert = :expert_name, updated_at = NOW()
 WHERE id = :student_id;
 """
 
+upsert_student_progress = """
+INSERT INTO student_progress (student_id, entity_type, entity_id, entity_name)
+SELECT CAST(:student_id AS integer), CAST(:entity_type AS varchar), key::integer, value
+FROM jsonb_each_text(CAST(:entities AS jsonb))
+WHERE key ~ '^[0-9]+$'
+ON CONFLICT (student_id, entity_type, entity_id) DO UPDATE SET entity_name = EXCLUDED.entity_name;
+"""
+
+# Одна короткая строка в индексе вместо перезаписи TOAST значения всей карты
 add_topic_to_approved = """
-UPDATE students
-SET 
-    approved_topics = COALESCE(approved_topics, '{}'::jsonb) || jsonb_build_object(:topic_id::text, :topic_name),
-    updated_at = NOW()
-WHERE id = :student_id;
+INSERT INTO student_progress (student_id, entity_type, entity_id, entity_name)
+VALUES (:student_id, 'topic', :topic_id, :topic_name)
+ON CONFLICT (student_id, entity_type, entity_id) DO UPDATE SET entity_name = EXCLUDED.entity_name;
 """
 
 add_block_to_approved = """
-UPDATE students
-SET 
-    approved_blocks = COALESCE(approved_blocks, '{}'::jsonb) || jsonb_build_object(:block_id::text, :block_name),
-    updated_at = NOW()
-WHERE id = :student_id;
+INSERT INTO student_progress (student_id, entity_type, entity_id, entity_name)
+VALUES (:student_id, 'block', :block_id, :block_name)
+ON CONFLICT (student_id, entity_type, entity_id) DO UPDATE SET entity_name = EXCLUDED.entity_name;
 """
 
 add_chapter_to_approved = """
-UPDATE students
-SET 
-    approved_chapters = COALESCE(approved_chapters, '{}'::jsonb) || jsonb_build_object(:chapter_id::text, :chapter_name),
-    updated_at = NOW()
-WHERE id = :student_id;
-"""
\ No newline at end of file
+INSERT INTO student_progress (student_id, entity_type, entity_id, entity_name)
+VALUES (:student_id, 'chapter', :chapter_id, :chapter_name)
+ON CONFLICT (student_id, entity_type, entity_id) DO UPDATE SET entity_name = EXCLUDED.entity_name;
+"""
@@ -1,9 +1,10 @@
-import json
 from opentelemetry.trace import SpanKind, StatusCode
 
 from .query import *
 from internal import model
+from internal import common
 from internal import interface
+from pkg.serializer import serializer
 
 
 class StudentRepo(interface.IStudentRepo):
@@ -40,7 +41,90 @@ class StudentRepo(interface.IStudentRepo):
         ) as span:
             try:
                 args = {'student_id': student_id}
-                rows = await self.db.select(get_student_by_id, args)
+                rows = await self.db.select(
+                    get_student_by_id,
+                    args,
+                    replica=True,
+                    sticky_key=common.STUDENT_STICKY_KEY.format(student_id)
+                )
+                result = model.Student.serialize(rows) if rows else []
+
+                span.set_status(StatusCode.OK)
+                return result
+            except Exception as err:
+                span.record_exception(err)
+                span.set_status(StatusCode.ERROR, str(err))
+                raise err
+
+    async def get_expert_by_id(self, student_id: int) -> list[model.Student]:
+        """Только current_expert, остальные поля Student остаются по умолчанию"""
+        with self.tracer.start_as_current_span(
+                "StudentRepo.get_expert_by_id",
+                kind=SpanKind.INTERNAL,
+                attributes={
+                    "student_id": student_id,
+                }
+        ) as span:
+            try:
+                args = {'student_id': student_id}
+                rows = await self.db.select(
+                    get_student_expert_by_id,
+                    args,
+                    replica=True,
+                    sticky_key=common.STUDENT_STICKY_KEY.format(student_id)
+                )
+                result = model.Student.serialize(rows) if rows else []
+
+                span.set_status(StatusCode.OK)
+                return result
+            except Exception as err:
+                span.record_exception(err)
+                span.set_status(StatusCode.ERROR, str(err))
+                raise err
+
+    async def get_progress_by_id(self, student_id: int) -> list[model.Student]:
+        """Текущий контент, рекомендации, пройденное и оценка без полей профиля"""
+        with self.tracer.start_as_current_span(
+                "StudentRepo.get_progress_by_id",
+                kind=SpanKind.INTERNAL,
+                attributes={
+                    "student_id": student_id,
+                }
+        ) as span:
+            try:
+                args = {'student_id': student_id}
+                rows = await self.db.select(
+                    get_student_progress_by_id,
+                    args,
+                    replica=True,
+                    sticky_key=common.STUDENT_STICKY_KEY.format(student_id)
+                )
+                result = model.Student.serialize(rows) if rows else []
+
+                span.set_status(StatusCode.OK)
+                return result
+            except Exception as err:
+                span.record_exception(err)
+                span.set_status(StatusCode.ERROR, str(err))
+                raise err
+
+    async def get_profile_by_id(self, student_id: int) -> list[model.Student]:
+        """Опыт, цели и предпочтения без JSONB карт прогресса"""
+        with self.tracer.start_as_current_span(
+                "StudentRepo.get_profile_by_id",
+                kind=SpanKind.INTERNAL,
+                attributes={
+                    "student_id": student_id,
+                }
+        ) as span:
+            try:
+                args = {'student_id': student_id}
+                rows = await self.db.select(
+                    get_student_profile_by_id,
+                    args,
+                    replica=True,
+                    sticky_key=common.STUDENT_STICKY_KEY.format(student_id)
+                )
                 result = model.Student.serialize(rows) if rows else []
 
                 span.set_status(StatusCode.OK)
@@ -59,34 +143,40 @@ class StudentRepo(interface.IStudentRepo):
                 }
         ) as span:
             try:
-                # Конвертируем JSON поля в строки для PostgreSQL
-                args = {
-                    'student_id': student_id,
-                    'programming_experience': background.get('programming_experience'),
-                    'education_background': background.get('education_background'),
-                    'learning_goals': background.get('learning_goals'),
-                    'career_goals': background.get('career_goals'),
-                    'timeline': background.get('timeline'),
-                    'learning_style': background.get('learning_style'),
-                    'lesson_duration': background.get('lesson_duration'),
-                    'preferred_difficulty': background.get('preferred_difficulty'),
-                    'recommended_topics': json.dumps(background.get('recommended_topics')) if background.get(
-                        'recommended_topics') else None,
-                    'recommended_blocks': json.dumps(background.get('recommended_blocks')) if background.get(
-                        'recommended_blocks') else None,
-                    'approved_topics': json.dumps(background.get('approved_topics')) if background.get(
-                        'approved_topics') else None,
-                    'approved_blocks': json.dumps(background.get('approved_blocks')) if background.get(
-                        'approved_blocks') else None,
-                    'approved_chapters': json.dumps(background.get('approved_chapters')) if background.get(
-                        'approved_chapters') else None,
-                    'assessment_score': background.get('assessment_score'),
-                    'strong_areas': json.dumps(background.get('strong_areas')) if background.get(
-                        'strong_areas') else None,
-                    'weak_areas': json.dumps(background.get('weak_areas')) if background.get('weak_areas') else None,
-                }
+                # Пишем только переданные поля: пустые значения раньше отбрасывал COALESCE,
+                # теперь они не попадают в SET и не переписывают JSONB колонки целиком
+                args = {'student_id': student_id}
+                for column in student_text_columns:
+                    value = background.get(column)
+                    if value is not None:
+                        args[column] = value
+                for column in student_jsonb_columns:
+                    value = background.get(column)
+                    if value:
+                        args[column] = serializer.dumps_str(value)
+
+                columns = tuple(column for column in args if column != 'student_id')
+                span.set_attribute("columns", ",".join(columns))
+
+                queries = []
+                if columns:
+                    queries.append((update_student_columns(columns), args))
+                for column, entity_type in student_progress_columns.items():
+                    entities = background.get(column)
+                    if entities and isinstance(entities, dict):
+                        queries.append((upsert_student_progress, {
+                            'student_id': student_id,
+                            'entity_type': entity_type,
+                            'entities': serializer.dumps_str(entities),
+                        }))
 
-                await self.db.update(update_student_background, args)
+                if len(queries) == 1:
+                    await self.db.update(*queries[0], sticky_key=common.STUDENT_STICKY_KEY.format(student_id))
+                elif queries:
+                    await self.db.transaction(
+                        queries,
+                        sticky_key=common.STUDENT_STICKY_KEY.format(student_id)
+                    )
                 span.set_status(StatusCode.OK)
             except Exception as err:
                 span.record_exception(err)
@@ -107,7 +197,11 @@ class StudentRepo(interface.IStudentRepo):
                     'student_id': student_id,
                     'expert_name': expert_name,
                 }
-                await self.db.update(change_current_expert, args)
+                await self.db.update(
+                    change_current_expert,
+                    args,
+                    sticky_key=common.STUDENT_STICKY_KEY.format(student_id)
+                )
                 span.set_status(StatusCode.OK)
             except Exception as err:
                 span.record_exception(err)
@@ -126,10 +220,14 @@ class StudentRepo(interface.IStudentRepo):
             try:
                 args = {
                     'student_id': student_id,
-                    'topic_id': str(topic_id),
+                    'topic_id': int(topic_id),
                     'topic_name': topic_name,
                 }
-                await self.db.update(add_topic_to_approved, args)
+                await self.db.update(
+                    add_topic_to_approved,
+                    args,
+                    sticky_key=common.STUDENT_STICKY_KEY.format(student_id)
+                )
                 span.set_status(StatusCode.OK)
             except Exception as err:
                 span.record_exception(err)
@@ -148,10 +246,14 @@ class StudentRepo(interface.IStudentRepo):
             try:
                 args = {
                     'student_id': student_id,
-                    'block_id': str(block_id),
+                    'block_id': int(block_id),
                     'block_name': block_name,
                 }
-                await self.db.update(add_block_to_approved, args)
+                await self.db.update(
+                    add_block_to_approved,
+                    args,
+                    sticky_key=common.STUDENT_STICKY_KEY.format(student_id)
+                )
                 span.set_status(StatusCode.OK)
             except Exception as err:
                 span.record_exception(err)
@@ -170,10 +272,14 @@ class StudentRepo(interface.IStudentRepo):
             try:
                 args = {
                     'student_id': student_id,
-                    'chapter_id': str(chapter_id),
+                    'chapter_id': int(chapter_id),
                     'chapter_name': chapter_name,
                 }
-                await self.db.update(add_chapter_to_approved, args)
+                await self.db.update(
+                    add_chapter_to_approved,
+                    args,
+                    sticky_key=common.STUDENT_STICKY_KEY.format(student_id)
+                )
                 span.set_status(StatusCode.OK)
             except Exception as err:
                 span.record_exception(err)
@@ -11,6 +11,13 @@ FROM topics
 WHERE id = :topic_id;
 """
 
+get_topics_by_ids = """
+SELECT id, name, intro_file_id, edu_plan_file_id, created_at, updated_at
+FROM topics
+WHERE id = ANY(:topic_ids)
+ORDER BY id ASC;
+"""
+
 get_all_topics = """
 SELECT id, name, intro_file_id, edu_plan_file_id, created_at, updated_at
 FROM topics
@@ -36,6 +43,13 @@ FROM blocks
 WHERE id = :block_id;
 """
 
+get_blocks_by_ids = """
+SELECT id, topic_id, name, content_file_id, created_at, updated_at
+FROM blocks
+WHERE id = ANY(:block_ids)
+ORDER BY id ASC;
+"""
+
 get_blocks_by_topic_id = """
 SELECT id, topic_id, name, content_file_id, created_at, updated_at
 FROM blocks
@@ -68,6 +82,13 @@ FROM chapters
 WHERE id = :chapter_id;
 """
 
+get_chapters_by_ids = """
+SELECT id, topic_id, block_id, name, content_file_id, created_at, updated_at
+FROM chapters
+WHERE id = ANY(:chapter_ids)
+ORDER BY id ASC;
+"""
+
 get_chapters_by_block_id = """
 SELECT id, topic_id, block_id, name, content_file_id, created_at, updated_at
 FROM chapters
@@ -81,27 +102,86 @@ FROM chapters
 ORDER BY topic_id ASC, block_id ASC, id ASC;
 """
 
+# Меняется при любой вставке, обновлении или удалении в каталоге: число строк и последний updated_at
+get_catalog_stamp = """
+SELECT concat_ws(
+    ':',
+    (SELECT COUNT(*) || '@' || COALESCE(MAX(updated_at)::text, '') FROM topics),
+    (SELECT COUNT(*) || '@' || COALESCE(MAX(updated_at)::text, '') FROM blocks),
+    (SELECT COUNT(*) || '@' || COALESCE(MAX(updated_at)::text, '') FROM chapters)
+);
+"""
+
 update_chapter = """
 UPDATE chapters
 SET name = :name, content_file_id = :content_file_id, updated_at = NOW()
 WHERE id = :chapter_id;
 """
 
+# Bulk catalog upserts, связь с родителями по естественным ключам внутри одной транзакции
+bulk_upsert_topics = """
+INSERT INTO topics (name, intro_file_id, edu_plan_file_id, created_at, updated_at)
+SELECT t.name, t.intro_file_id, t.edu_plan_file_id, NOW(), NOW()
+FROM unnest(
+    CAST(:names AS text[]),
+    CAST(:intro_file_ids AS text[]),
+    CAST(:edu_plan_file_ids AS text[])
+) AS t(name, intro_file_id, edu_plan_file_id)
+ON CONFLICT (name) DO UPDATE
+SET intro_file_id = EXCLUDED.intro_file_id, edu_plan_file_id = EXCLUDED.edu_plan_file_id, updated_at = NOW()
+WHERE (topics.intro_file_id, topics.edu_plan_file_id)
+    IS DISTINCT FROM (EXCLUDED.intro_file_id, EXCLUDED.edu_plan_file_id);
+"""
+
+bulk_upsert_blocks = """
+INSERT INTO blocks (topic_id, name, content_file_id, created_at, updated_at)
+SELECT topics.id, b.name, b.content_file_id, NOW(), NOW()
+FROM unnest(
+    CAST(:topic_names AS text[]),
+    CAST(:names AS text[]),
+    CAST(:content_file_ids AS text[])
+) WITH ORDINALITY AS b(topic_name, name, content_file_id, ord)
+JOIN topics ON topics.name = b.topic_name
+ORDER BY b.ord
+ON CONFLICT (topic_id, name) DO UPDATE
+SET content_file_id = EXCLUDED.content_file_id, updated_at = NOW()
+WHERE blocks.content_file_id IS DISTINCT FROM EXCLUDED.content_file_id;
+"""
+
+bulk_upsert_chapters = """
+INSERT INTO chapters (topic_id, block_id, name, content_file_id, created_at, updated_at)
+SELECT topics.id, blocks.id, c.name, c.content_file_id, NOW(), NOW()
+FROM unnest(
+    CAST(:topic_names AS text[]),
+    CAST(:block_names AS text[]),
+    CAST(:names AS text[]),
+    CAST(:content_file_ids AS text[])
+) WITH ORDINALITY AS c(topic_name, block_name, name, content_file_id, ord)
+JOIN topics ON topics.name = c.topic_name
+JOIN blocks ON blocks.topic_id = topics.id AND blocks.name = c.block_name
+ORDER BY c.ord
+ON CONFLICT (block_id, name) DO UPDATE
+SET content_file_id = EXCLUDED.content_file_id, updated_at = NOW()
+WHERE chapters.content_file_id IS DISTINCT FROM EXCLUDED.content_file_id;
+"""
+
+analyze_catalog = "ANALYZE topics, blocks, chapters;"
+
 # Student progress updates
 update_current_topic = """
 UPDATE students
-SET current_topic = jsonb_build_object(:topic_id::text, :topic_name), updated_at = NOW()
+SET current_topic = jsonb_build_object(CAST(:topic_id AS text), CAST(:topic_name AS text)), updated_at = NOW()
 WHERE id = :student_id;
 """
 
 update_current_block = """
 UPDATE students
-SET current_block = jsonb_build_object(:block_id::text, :block_name), updated_at = NOW()
+SET current_block = jsonb_build_object(CAST(:block_id AS text), CAST(:block_name AS text)), updated_at = NOW()
 WHERE id = :student_id;
 """
 
 update_current_chapter = """
 UPDATE students
-SET current_chapter = jsonb_build_object(:chapter_id::text, :chapter_name), updated_at = NOW()
+SET current_chapter = jsonb_build_object(CAST(:chapter_id AS text), CAST(:chapter_name AS text)), updated_at = NOW()
 WHERE id = :student_id;
 """
\ No newline at end of file
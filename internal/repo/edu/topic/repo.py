@@ -1,9 +1,12 @@
 import io
+import asyncio
 
 from opentelemetry.trace import SpanKind, Status, StatusCode
 
 from .query import *
 from internal import model
+from pkg.dataloader.dataloader import DataLoader
+from internal import common
 from internal import interface
 
 
@@ -13,6 +16,11 @@ class TopicRepo(interface.ITopicRepo):
         self.storage = storage
         self.tracer = tel.tracer()
 
+        # Конкурентные get_*_by_id одного шага цикла событий уходят одним запросом get_*_by_ids
+        self.topic_loader = DataLoader(self._load_topics)
+        self.block_loader = DataLoader(self._load_blocks)
+        self.chapter_loader = DataLoader(self._load_chapters)
+
     # Topic methods
     async def get_topic_by_id(self, topic_id: int) -> list[model.Topic]:
         with self.tracer.start_as_current_span(
@@ -21,8 +29,29 @@ class TopicRepo(interface.ITopicRepo):
                 attributes={"topic_id": topic_id}
         ) as span:
             try:
-                args = {'topic_id': topic_id}
-                rows = await self.db.select(get_topic_by_id, args)
+                topic = await self.topic_loader.load(int(topic_id))
+                result = [topic] if topic else []
+
+                span.set_status(StatusCode.OK)
+                return result
+            except Exception as err:
+                span.record_exception(err)
+                span.set_status(StatusCode.ERROR, str(err))
+                raise err
+
+    async def get_topics_by_ids(self, topic_ids: list[int]) -> list[model.Topic]:
+        with self.tracer.start_as_current_span(
+                "TopicRepo.get_topics_by_ids",
+                kind=SpanKind.INTERNAL,
+                attributes={"topic_ids_count": len(topic_ids)}
+        ) as span:
+            try:
+                if not topic_ids:
+                    span.set_status(StatusCode.OK)
+                    return []
+
+                args = {'topic_ids': [int(topic_id) for topic_id in topic_ids]}
+                rows = await self.db.select(get_topics_by_ids, args, replica=True)
                 result = model.Topic.serialize(rows) if rows else []
 
                 span.set_status(StatusCode.OK)
@@ -32,13 +61,31 @@ class TopicRepo(interface.ITopicRepo):
                 span.set_status(StatusCode.ERROR, str(err))
                 raise err
 
+    async def _load_topics(self, topic_ids: list[int]) -> dict[int, model.Topic]:
+        return {topic.id: topic for topic in await self.get_topics_by_ids(topic_ids)}
+
+    async def get_catalog_stamp(self) -> str:
+        with self.tracer.start_as_current_span(
+                "TopicRepo.get_catalog_stamp",
+                kind=SpanKind.INTERNAL
+        ) as span:
+            try:
+                rows = await self.db.select(get_catalog_stamp, {}, replica=True)
+
+                span.set_status(StatusCode.OK)
+                return rows[0][0]
+            except Exception as err:
+                span.record_exception(err)
+                span.set_status(StatusCode.ERROR, str(err))
+                raise err
+
     async def get_all_topic(self) -> list[model.Topic]:
         with self.tracer.start_as_current_span(
                 "TopicRepo.get_all_topic",
                 kind=SpanKind.INTERNAL
         ) as span:
             try:
-                rows = await self.db.select(get_all_topics, {})
+                rows = await self.db.select(get_all_topics, {}, replica=True)
                 result = model.Topic.serialize(rows) if rows else []
 
                 span.set_status(StatusCode.OK)
@@ -56,8 +103,29 @@ class TopicRepo(interface.ITopicRepo):
                 attributes={"block_id": block_id}
         ) as span:
             try:
-                args = {'block_id': block_id}
-                rows = await self.db.select(get_block_by_id, args)
+                block = await self.block_loader.load(int(block_id))
+                result = [block] if block else []
+
+                span.set_status(StatusCode.OK)
+                return result
+            except Exception as err:
+                span.record_exception(err)
+                span.set_status(StatusCode.ERROR, str(err))
+                raise err
+
+    async def get_blocks_by_ids(self, block_ids: list[int]) -> list[model.Block]:
+        with self.tracer.start_as_current_span(
+                "TopicRepo.get_blocks_by_ids",
+                kind=SpanKind.INTERNAL,
+                attributes={"block_ids_count": len(block_ids)}
+        ) as span:
+            try:
+                if not block_ids:
+                    span.set_status(StatusCode.OK)
+                    return []
+
+                args = {'block_ids': [int(block_id) for block_id in block_ids]}
+                rows = await self.db.select(get_blocks_by_ids, args, replica=True)
                 result = model.Block.serialize(rows) if rows else []
 
                 span.set_status(StatusCode.OK)
@@ -67,13 +135,16 @@ class TopicRepo(interface.ITopicRepo):
                 span.set_status(StatusCode.ERROR, str(err))
                 raise err
 
+    async def _load_blocks(self, block_ids: list[int]) -> dict[int, model.Block]:
+        return {block.id: block for block in await self.get_blocks_by_ids(block_ids)}
+
     async def get_all_block(self) -> list[model.Block]:
         with self.tracer.start_as_current_span(
                 "TopicRepo.get_all_block",
                 kind=SpanKind.INTERNAL
         ) as span:
             try:
-                rows = await self.db.select(get_all_blocks, {})
+                rows = await self.db.select(get_all_blocks, {}, replica=True)
                 result = model.Block.serialize(rows) if rows else []
 
                 span.set_status(StatusCode.OK)
@@ -91,8 +162,29 @@ class TopicRepo(interface.ITopicRepo):
                 attributes={"chapter_id": chapter_id}
         ) as span:
             try:
-                args = {'chapter_id': chapter_id}
-                rows = await self.db.select(get_chapter_by_id, args)
+                chapter = await self.chapter_loader.load(int(chapter_id))
+                result = [chapter] if chapter else []
+
+                span.set_status(StatusCode.OK)
+                return result
+            except Exception as err:
+                span.record_exception(err)
+                span.set_status(StatusCode.ERROR, str(err))
+                raise err
+
+    async def get_chapters_by_ids(self, chapter_ids: list[int]) -> list[model.Chapter]:
+        with self.tracer.start_as_current_span(
+                "TopicRepo.get_chapters_by_ids",
+                kind=SpanKind.INTERNAL,
+                attributes={"chapter_ids_count": len(chapter_ids)}
+        ) as span:
+            try:
+                if not chapter_ids:
+                    span.set_status(StatusCode.OK)
+                    return []
+
+                args = {'chapter_ids': [int(chapter_id) for chapter_id in chapter_ids]}
+                rows = await self.db.select(get_chapters_by_ids, args, replica=True)
                 result = model.Chapter.serialize(rows) if rows else []
 
                 span.set_status(StatusCode.OK)
@@ -102,13 +194,16 @@ class TopicRepo(interface.ITopicRepo):
                 span.set_status(StatusCode.ERROR, str(err))
                 raise err
 
+    async def _load_chapters(self, chapter_ids: list[int]) -> dict[int, model.Chapter]:
+        return {chapter.id: chapter for chapter in await self.get_chapters_by_ids(chapter_ids)}
+
     async def get_all_chapter(self) -> list[model.Chapter]:
         with self.tracer.start_as_current_span(
                 "TopicRepo.get_all_chapter",
                 kind=SpanKind.INTERNAL
         ) as span:
             try:
-                rows = await self.db.select(get_all_chapters, {})
+                rows = await self.db.select(get_all_chapters, {}, replica=True)
                 result = model.Chapter.serialize(rows) if rows else []
 
                 span.set_status(StatusCode.OK)
@@ -134,7 +229,11 @@ class TopicRepo(interface.ITopicRepo):
                     'topic_id': str(topic_id),
                     'topic_name': topic_name,
                 }
-                await self.db.update(update_current_topic, args)
+                await self.db.update(
+                    update_current_topic,
+                    args,
+                    sticky_key=common.STUDENT_STICKY_KEY.format(student_id)
+                )
                 span.set_status(StatusCode.OK)
             except Exception as err:
                 span.record_exception(err)
@@ -156,7 +255,11 @@ class TopicRepo(interface.ITopicRepo):
                     'block_id': str(block_id),
                     'block_name': block_name,
                 }
-                await self.db.update(update_current_block, args)
+                await self.db.update(
+                    update_current_block,
+                    args,
+                    sticky_key=common.STUDENT_STICKY_KEY.format(student_id)
+                )
                 span.set_status(StatusCode.OK)
             except Exception as err:
                 span.record_exception(err)
@@ -178,7 +281,11 @@ class TopicRepo(interface.ITopicRepo):
                     'chapter_id': str(chapter_id),
                     'chapter_name': chapter_name,
                 }
-                await self.db.update(update_current_chapter, args)
+                await self.db.update(
+                    update_current_chapter,
+                    args,
+                    sticky_key=common.STUDENT_STICKY_KEY.format(student_id)
+                )
                 span.set_status(StatusCode.OK)
             except Exception as err:
                 span.record_exception(err)
@@ -250,8 +357,49 @@ class TopicRepo(interface.ITopicRepo):
                 raise err
 
 
+    async def bulk_upsert_content(
+            self,
+            topics: list[model.TopicContent],
+            blocks: list[model.BlockContent],
+            chapters: list[model.ChapterContent],
+    ) -> None:
+        with self.tracer.start_as_current_span(
+                "TopicRepo.bulk_upsert_content",
+                kind=SpanKind.INTERNAL,
+                attributes={"topics": len(topics), "blocks": len(blocks), "chapters": len(chapters)}
+        ) as span:
+            try:
+                queries = [
+                    (bulk_upsert_topics, {
+                        'names': [topic.name for topic in topics],
+                        'intro_file_ids': [topic.intro_file_id for topic in topics],
+                        'edu_plan_file_ids': [topic.edu_plan_file_id for topic in topics],
+                    }),
+                    (bulk_upsert_blocks, {
+                        'topic_names': [block.topic_name for block in blocks],
+                        'names': [block.name for block in blocks],
+                        'content_file_ids': [block.content_file_id for block in blocks],
+                    }),
+                    (bulk_upsert_chapters, {
+                        'topic_names': [chapter.topic_name for chapter in chapters],
+                        'block_names': [chapter.block_name for chapter in chapters],
+                        'names': [chapter.name for chapter in chapters],
+                        'content_file_ids': [chapter.content_file_id for chapter in chapters],
+                    }),
+                ]
+                await self.db.transaction(queries)
+                span.set_status(StatusCode.OK)
+            except Exception as err:
+                span.record_exception(err)
+                span.set_status(StatusCode.ERROR, str(err))
+                raise err
+
+    async def analyze_content(self) -> None:
+        await self.db.multi_query([analyze_catalog])
+
     async def upload_file(self, file: io.BytesIO, file_name: str) -> str:
-        response = self.storage.upload(file, file_name)
+        # Клиент weed синхронный, уводим HTTP запрос из event loop
+        response = await asyncio.to_thread(self.storage.upload, file, file_name)
         return response.fid
 
     async def download_file(self, file_id: str, file_name: str) -> tuple[io.BytesIO, str]:
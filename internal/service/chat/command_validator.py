@@ -0,0 +1,150 @@
+from internal import common
+from internal import interface
+from internal import model
+
+COMMAND_VALIDATION_METRIC = "chat.command.validation"
+
+# Поля update_student_background со словарями {id: название} и тип сущности их ключей
+_background_catalog_fields = {
+    "recommended_topics": "topic",
+    "recommended_blocks": "block",
+    "approved_topics": "topic",
+    "approved_blocks": "block",
+    "approved_chapters": "chapter",
+}
+
+
+def _to_id(value) -> int | None:
+    if isinstance(value, bool):
+        return None
+    try:
+        return int(value)
+    except (TypeError, ValueError):
+        return None
+
+
+class CommandValidator:
+    """Сверка id из команд LLM с индексом каталога до записи в БД.
+
+    Каждая проверка — поиск в словаре индекса, без запросов. Названия всегда берутся
+    из каталога. Выдуманная глава заменяется первой главой названного блока или темы,
+    если их тоже нет, команда отклоняется и не выполняется.
+    """
+
+    def __init__(self, tel: interface.ITelemetry):
+        self.logger = tel.logger()
+        self.validations = tel.meter().create_counter(
+            name=COMMAND_VALIDATION_METRIC,
+            description="LLM content commands by catalog validation result: valid, corrected, rejected",
+            unit="{command}"
+        )
+
+    def validate(self, index: model.CatalogIndex, commands: list[common.Command]) -> list[common.Command]:
+        """Команды, которые можно выполнять: исправленные вместо исходных, без отклоненных"""
+        validators = {
+            "change_edu_content": self._validate_change_edu_content,
+            "approve_topic": self._validate_approve,
+            "approve_block": self._validate_approve,
+            "approve_chapter": self._validate_approve,
+            "update_student_background": self._validate_background,
+        }
+
+        result_commands = []
+        for command in commands:
+            validate = validators.get(command.name)
+            if validate is None:
+                result_commands.append(command)
+                continue
+
+            params, result, reason = validate(index, command.name, command.params)
+            self.validations.add(1, attributes={"command": command.name, "result": result, "reason": reason})
+            if result == "rejected":
+                self.logger.warning("Команда LLM отклонена: id нет в каталоге", {
+                    "command": command.name,
+                    "reason": reason,
+                    "params": str(command.params),
+                    "catalog_version": index.version,
+                })
+                continue
+            if result == "corrected":
+                self.logger.info("Команда LLM исправлена по каталогу", {
+                    "command": command.name,
+                    "reason": reason,
+                    "params": str(command.params),
+                    "corrected_params": str(params),
+                    "catalog_version": index.version,
+                })
+            result_commands.append(common.Command(description=command.description, name=command.name, params=params))
+
+        return result_commands
+
+    def _validate_change_edu_content(self, index: model.CatalogIndex, name: str, params: dict) -> tuple[dict, str, str]:
+        topic_id = _to_id(params.get("topic_id"))
+        block_id = _to_id(params.get("block_id"))
+        chapter_id = _to_id(params.get("chapter_id"))
+
+        reason = "ok"
+        chapter = index.chapter(chapter_id)
+        if chapter is None:
+            reason = "unknown_chapter"
+            block = index.block(block_id)
+            if block is None:
+                topic_blocks = index.blocks_of(topic_id)
+                block = topic_blocks[0] if topic_blocks else None
+            block_chapters = index.chapters_of_block(block.id) if block is not None else ()
+            if not block_chapters:
+                return params, "rejected", reason
+            chapter = block_chapters[0]
+
+        # Родители всегда берутся от главы, чтобы тема, блок и глава не разошлись
+        block = index.block(chapter.block_id)
+        topic = index.topic(chapter.topic_id)
+        if block is None or topic is None:
+            return params, "rejected", "unknown_parent"
+
+        corrected = {
+            **params,
+            "topic_id": topic.id,
+            "topic_name": topic.name,
+            "block_id": block.id,
+            "block_name": block.name,
+            "chapter_id": chapter.id,
+            "chapter_name": chapter.name,
+        }
+        if reason == "ok" and (topic_id, block_id) != (topic.id, block.id):
+            reason = "parent_mismatch"
+        if reason == "ok" and (
+                params.get("topic_name"), params.get("block_name"), params.get("chapter_name")
+        ) != (topic.name, block.name, chapter.name):
+            reason = "name_mismatch"
+        return corrected, "valid" if reason == "ok" else "corrected", reason
+
+    def _validate_approve(self, index: model.CatalogIndex, name: str, params: dict) -> tuple[dict, str, str]:
+        entity_type = name.removeprefix("approve_")
+        entity = getattr(index, entity_type)(_to_id(params.get(f"{entity_type}_id")))
+        if entity is None:
+            return params, "rejected", f"unknown_{entity_type}"
+
+        corrected = {**params, f"{entity_type}_id": entity.id, f"{entity_type}_name": entity.name}
+        if params.get(f"{entity_type}_name") != entity.name:
+            return corrected, "corrected", "name_mismatch"
+        return corrected, "valid", "ok"
+
+    def _validate_background(self, index: model.CatalogIndex, name: str, params: dict) -> tuple[dict, str, str]:
+        """Ключи словарей прогресса без сущности в каталоге выбрасываются, остальной профиль сохраняется"""
+        corrected = dict(params)
+        reason = "ok"
+        for field, entity_type in _background_catalog_fields.items():
+            values = params.get(field)
+            if not isinstance(values, dict):
+                continue
+
+            lookup = getattr(index, entity_type)
+            entities = [lookup(_to_id(entity_id)) for entity_id in values]
+            corrected[field] = {str(entity.id): entity.name for entity in entities if entity is not None}
+            if len(corrected[field]) < len(values):
+                reason = "unknown_id"
+            elif reason == "ok" and corrected[field] != {str(key): value for key, value in values.items()}:
+                reason = "name_mismatch"
+
+        return corrected, "valid" if reason == "ok" else "corrected", reason
@@ -10,15 +10,22 @@ class PromptGenerator(interface.IPromptGenerator):
             tel: interface.ITelemetry,
             student_repo: interface.IStudentRepo,
             topic_repo: interface.ITopicRepo,
+            catalog_service: interface.ICatalogService,
+            stage_timer: interface.IStageTimer,
     ):
         self.tracer = tel.tracer()
         self.logger = tel.logger()
         self.student_repo = student_repo
         self.topic_repo = topic_repo
+        self.catalog_service = catalog_service
+        self.stage_timer = stage_timer
+        # (версия индекса каталога, отформатированный каталог для промптов)
+        self._content_metadata: tuple[int, str] | None = None
 
 
     async def _format_student_context(self, student_id: int) -> str:
-        students = await self.student_repo.get_by_id(student_id)
+        with self.stage_timer.stage("db"):
+            students = await self.student_repo.get_by_id(student_id)
         student = students[0] if students else None
 
         if not student:
@@ -49,29 +56,36 @@ class PromptGenerator(interface.IPromptGenerator):
 """
 
     async def _format_all_content_metadata(self) -> str:
-        all_topic = await self.topic_repo.get_all_topic()
-        all_block = await self.topic_repo.get_all_block()
-        all_chapter = await self.topic_repo.get_all_chapter()
+        with self.stage_timer.stage("catalog"):
+            index = await self.catalog_service.index()
 
-        formatter = EducationDataFormatter(all_topic, all_block, all_chapter)
+        # Текст каталога пересобирается только с новой версией индекса
+        if self._content_metadata is None or self._content_metadata[0] != index.version:
+            formatter = EducationDataFormatter(index)
 
-        flat_json = formatter.to_flat_json()
-        hierarchical_json = formatter.to_hierarchical_json()
+            flat_json = formatter.to_flat_json()
+            hierarchical_json = formatter.to_hierarchical_json()
 
-        return f"""СОДЕРЖАНИЕ ОБУЧАЮЩЕГО МАТЕРИАЛА{{
+            self._content_metadata = (index.version, f"""СОДЕРЖАНИЕ ОБУЧАЮЩЕГО МАТЕРИАЛА{{
             "flat": {flat_json},
             "hierarchical": {hierarchical_json}
-        }}"""
+        }}""")
+
+        return self._content_metadata[1]
 
     async def _get_current_content_context(self, student_id: int) -> str:
         """Получает контекст текущего изучаемого контента"""
         try:
-            students = await self.student_repo.get_by_id(student_id)
+            with self.stage_timer.stage("db"):
+                students = await self.student_repo.get_progress_by_id(student_id)
             student = students[0] if students else None
 
             if not student:
                 raise ValueError(f"Студент с ID {student_id} не найден")
 
+            with self.stage_timer.stage("catalog"):
+                index = await self.catalog_service.index()
+
             context_parts = ["ТЕКУЩИЙ КОНТЕНТ:"]
 
             # Обработка текущей темы
@@ -87,9 +101,8 @@ class PromptGenerator(interface.IPromptGenerator):
             if student.current_block:
                 block_id = list(student.current_block.keys())[0]  # Используем keys()
                 try:
-                    blocks = await self.topic_repo.get_block_by_id(int(block_id))
-                    if blocks:
-                        block = blocks[0]
+                    block = index.block(int(block_id))
+                    if block:
                         context_parts.append(f"- Блок: {block.name}")
                         context_parts.append(f"- ID Блока: {block.id}")
                 except Exception as e:
@@ -102,19 +115,19 @@ class PromptGenerator(interface.IPromptGenerator):
             if student.current_chapter:
                 chapter_id = list(student.current_chapter.keys())[0]  # Используем keys()
                 try:
-                    chapters = await self.topic_repo.get_chapter_by_id(int(chapter_id))
-                    if chapters:
-                        chapter = chapters[0]
+                    chapter = index.chapter(int(chapter_id))
+                    if chapter:
                         context_parts.append(f"- Глава: {chapter.name}")
                         context_parts.append(f"- ID Главы: {chapter.id}")
 
                         # Безопасная загрузка содержимого главы
                         if chapter.content_file_id:
                             try:
-                                chapter_content, _ = await self.topic_repo.download_file(
-                                    chapter.content_file_id,
-                                    chapter.name,
-                                )
+                                with self.stage_timer.stage("storage"):
+                                    chapter_content, _ = await self.topic_repo.download_file(
+                                        chapter.content_file_id,
+                                        chapter.name,
+                                    )
                                 if chapter_content:
                                     context_parts.append(f"- Содержание главы доступно")
                             except Exception as e:
@@ -1,7 +1,10 @@
-import json
+import asyncio
+from contextlib import AsyncExitStack
 from opentelemetry.trace import StatusCode, SpanKind
 
 from internal import interface, common
+from pkg.serializer import serializer
+from .command_validator import CommandValidator
 
 
 class ChatService(interface.IChatService):
@@ -13,8 +16,12 @@ class ChatService(interface.IChatService):
             prompt_generator: interface.IPromptGenerator,
             student_repo: interface.IStudentRepo,
             topic_repo: interface.ITopicRepo,
+            catalog_service: interface.ICatalogService,
             chat_repo: interface.IChatRepo,
             account_repo: interface.IAccountRepo,
+            student_lock: interface.IKeyedLock,
+            stage_timer: interface.IStageTimer,
+            history_token_budget: int = 0,
     ):
         self.tracer = tel.tracer()
         self.logger = tel.logger()
@@ -22,74 +29,134 @@ class ChatService(interface.IChatService):
         self.prompt_generator = prompt_generator
         self.student_repo = student_repo
         self.topic_repo = topic_repo
+        self.catalog_service = catalog_service
+        self.command_validator = CommandValidator(tel)
         self.chat_repo = chat_repo
         self.account_repo = account_repo
+        self.student_lock = student_lock
+        self.stage_timer = stage_timer
+        # Бюджет токенов истории, 0 - без ограничения
+        self.history_token_budget = history_token_budget
+
+        # Незавершенные ходы по (student_id, text) для склейки повторных отправок
+        self._inflight: dict[tuple[int, str], asyncio.Task] = {}
 
     async def send_message_to_expert(self, student_id: int, text: str) -> tuple[str, list[common.Command]]:
         """Обработка сообщений для эксперта по регистрации"""
         with self.tracer.start_as_current_span(
                 "ChatService.send_message_to_expert",
                 kind=SpanKind.INTERNAL,
-                attributes={"student_id": student_id, "text": text}
+                attributes={"student_id": student_id, "text_length": len(text)}
         ) as span:
             try:
-                student = (await self.student_repo.get_by_id(student_id))[0]
+                key = (student_id, text)
+                turn = self._inflight.get(key)
+                if turn is not None:
+                    # Повторная отправка того же сообщения: ждем результат уже идущего хода
+                    span.set_attribute("coalesced", True)
+                else:
+                    # Ход идет в своей задаче: отмена запроса, который его начал, не отменяет
+                    # ход для дубликатов, а сообщение студента не остается в истории без ответа
+                    turn = asyncio.create_task(self._run_turn(student_id, text))
+                    self._inflight[key] = turn
+                    turn.add_done_callback(lambda task: self._turn_done(key, task))
+
+                user_message, commands = await asyncio.shield(turn)
+                span.set_status(StatusCode.OK)
+                return user_message, commands
 
-                chat = await self.chat_repo.get_chat_by_student_id(student_id)
-                if not chat:
-                    _ = await self.chat_repo.create_chat(student_id)
-                    chat = await self.chat_repo.get_chat_by_student_id(student_id)
+            except Exception as err:
+                span.record_exception(err)
+                span.set_status(StatusCode.ERROR, str(err))
+                raise err
+
+    async def _run_turn(self, student_id: int, text: str) -> tuple[str, list[common.Command]]:
+        async with AsyncExitStack() as stack:
+            with self.stage_timer.stage("lock_wait"):
+                await stack.enter_async_context(self.student_lock.lock(f"student:{student_id}"))
+            return await self._process_message(student_id, text)
+
+    def _turn_done(self, key: tuple[int, str], turn: asyncio.Task):
+        self._inflight.pop(key, None)
+        if not turn.cancelled():
+            # Помечаем исключение полученным, даже если все ожидавшие ход уже отменены
+            turn.exception()
+
+    async def _process_message(self, student_id: int, text: str) -> tuple[str, list[common.Command]]:
+        """Один ход диалога, выполняется под блокировкой студента"""
+        with self.stage_timer.stage("db"):
+            student = (await self.student_repo.get_expert_by_id(student_id))[0]
+
+            chat = await self.chat_repo.get_chat_by_student_id(student_id)
+            if chat:
                 chat_id = chat[0].id
+            else:
+                chat_id = await self.chat_repo.create_chat(student_id)
 
-                _ = await self.chat_repo.create_message(chat_id, common.Roles.user, text)
+            _ = await self.chat_repo.create_message(chat_id, common.Roles.user, text)
 
-                if student.current_expert == common.Experts.registrator:
-                    system_prompt = await self.prompt_generator.get_registrator_prompt()
+        self.stage_timer.set_attribute("expert", student.current_expert)
 
-                if student.current_expert == common.Experts.interview:
-                    system_prompt = await self.prompt_generator.get_interview_expert_prompt(student_id)
+        with self.stage_timer.stage("prompt"):
+            if student.current_expert == common.Experts.registrator:
+                system_prompt = await self.prompt_generator.get_registrator_prompt()
 
-                if student.current_expert == common.Experts.teacher:
-                    system_prompt = await self.prompt_generator.get_teacher_prompt(student_id)
+            if student.current_expert == common.Experts.interview:
+                system_prompt = await self.prompt_generator.get_interview_expert_prompt(student_id)
 
-                if student.current_expert == common.Experts.test:
-                    system_prompt = await self.prompt_generator.get_test_expert_prompt(student_id)
+            if student.current_expert == common.Experts.teacher:
+                system_prompt = await self.prompt_generator.get_teacher_prompt(student_id)
 
-                chat_history = await self.chat_repo.get_messages(chat_id)
+            if student.current_expert == common.Experts.test:
+                system_prompt = await self.prompt_generator.get_test_expert_prompt(student_id)
 
-                # Получаем ответ от LLM
-                llm_response = await self.llm_client.generate(
-                    history=chat_history,
-                    system_prompt=system_prompt,
-                    temperature=0.3
+        with self.stage_timer.stage("db"):
+            if self.history_token_budget:
+                # Окно по бюджету считает БД по сохраненным token_count, лишние сообщения не читаются
+                chat_history = await self.chat_repo.get_messages_within_token_budget(
+                    chat_id,
+                    self.history_token_budget
                 )
-                response_data = await self._parse_llm_response(llm_response)
+            else:
+                chat_history = await self.chat_repo.get_messages(chat_id)
 
-                user_message = response_data["user_message"]
-                commands = [common.Command(**command) for command in
-                            response_data.get("metadata", {}).get("commands", [])]
+        # Получаем ответ от LLM
+        with self.stage_timer.stage("llm"):
+            llm_response = await self.llm_client.generate(
+                history=chat_history,
+                system_prompt=system_prompt,
+                temperature=0.3
+            )
 
-                _ = await self.chat_repo.create_message(chat_id, common.Roles.assistant, user_message)
+        with self.stage_timer.stage("parse"):
+            response_data = await self._parse_llm_response(llm_response)
 
-                if student.current_expert == common.Experts.registrator:
-                    await self._execute_registrator_commands(student_id, commands)
+            user_message = response_data["user_message"]
+            commands = [common.Command(**command) for command in
+                        response_data.get("metadata", {}).get("commands", [])]
 
-                if student.current_expert == common.Experts.interview:
-                    await self._execute_interview_commands(student_id, commands)
+        with self.stage_timer.stage("db"):
+            _ = await self.chat_repo.create_message(chat_id, common.Roles.assistant, user_message)
 
-                if student.current_expert == common.Experts.teacher:
-                    await self._execute_teacher_commands(student_id, commands)
+        with self.stage_timer.stage("commands"):
+            if student.current_expert in (common.Experts.interview, common.Experts.teacher, common.Experts.test):
+                # id из ответа LLM сверяются с каталогом в памяти, выдуманные не доходят до БД
+                index = await self.catalog_service.index()
+                commands = self.command_validator.validate(index, commands)
 
-                if student.current_expert == common.Experts.test:
-                    await self._execute_test_commands(student_id, commands)
+            if student.current_expert == common.Experts.registrator:
+                await self._execute_registrator_commands(student_id, commands)
 
-                span.set_status(StatusCode.OK)
-                return user_message, commands
+            if student.current_expert == common.Experts.interview:
+                await self._execute_interview_commands(student_id, commands)
 
-            except Exception as err:
-                span.record_exception(err)
-                span.set_status(StatusCode.ERROR, str(err))
-                raise err
+            if student.current_expert == common.Experts.teacher:
+                await self._execute_teacher_commands(student_id, commands)
+
+            if student.current_expert == common.Experts.test:
+                await self._execute_test_commands(student_id, commands)
+
+        return user_message, commands
 
     async def _parse_llm_response(self, response: str) -> dict:
         try:
@@ -108,7 +175,7 @@ class ChatService(interface.IChatService):
             response = response.strip()
 
             # Парсим JSON
-            parsed = json.loads(response)
+            parsed = serializer.loads(response)
 
             # Проверяем обязательные поля
             if "user_message" not in parsed:
@@ -126,7 +193,7 @@ class ChatService(interface.IChatService):
 
             return parsed
 
-        except json.JSONDecodeError as e:
+        except serializer.JSONDecodeError as e:
             self.logger.error(f"Ошибка парсинга JSON от LLM: {e}, response: {response}")
             return {
                 "user_message": "Извините, произошла ошибка обработки ответа. Попробуйте переформулировать вопрос.",
@@ -0,0 +1,116 @@
+import asyncio
+import time
+
+from opentelemetry.trace import StatusCode, SpanKind
+
+from internal import interface
+from internal import model
+
+
+class CatalogService(interface.ICatalogService):
+    """Общий на процесс индекс каталога для промптов, проверки команд и навигации.
+
+    Индекс собирается один раз из TopicRepo.get_all_*. Курс загружается отдельной командой
+    parse_edu_content в другом процессе, поэтому раз в refresh_interval индекс сверяет
+    отпечаток таблиц каталога одним легким запросом и пересобирается, только если он изменился.
+    """
+
+    def __init__(
+            self,
+            tel: interface.ITelemetry,
+            topic_repo: interface.ITopicRepo,
+            refresh_interval: float = 60.0,
+    ):
+        self.tracer = tel.tracer()
+        self.logger = tel.logger()
+        self.topic_repo = topic_repo
+        # 0 выключает сверку, индекс обновляется только через refresh
+        self.refresh_interval = refresh_interval
+
+        self._index: model.CatalogIndex | None = None
+        self._checked_at = 0.0
+        self._lock = asyncio.Lock()
+
+    async def index(self) -> model.CatalogIndex:
+        if self._index is None:
+            async with self._lock:
+                if self._index is None:
+                    await self._build()
+            return self._index
+
+        # Сверку делает один запрос, остальные в это время читают текущий снимок
+        if self._is_check_due() and not self._lock.locked():
+            async with self._lock:
+                if self._is_check_due():
+                    await self._refresh_if_changed()
+        return self._index
+
+    async def refresh(self) -> model.CatalogIndex:
+        async with self._lock:
+            await self._build()
+        return self._index
+
+    def _is_check_due(self) -> bool:
+        return self.refresh_interval > 0 and time.monotonic() >= self._checked_at + self.refresh_interval
+
+    async def _refresh_if_changed(self):
+        try:
+            stamp = await self.topic_repo.get_catalog_stamp()
+        except Exception as err:
+            # Недоступная БД не мешает отдавать последний собранный каталог
+            self._checked_at = time.monotonic()
+            self.logger.warning("Не удалось сверить каталог, используется текущий индекс", {
+                "catalog_version": self._index.version,
+                "error": str(err),
+            })
+            return
+
+        if stamp == self._index.stamp:
+            self._checked_at = time.monotonic()
+            return
+
+        try:
+            await self._build()
+        except Exception as err:
+            # Следующая попытка через refresh_interval, до нее отдается прежний индекс
+            self._checked_at = time.monotonic()
+            self.logger.warning("Не удалось пересобрать каталог, используется текущий индекс", {
+                "catalog_version": self._index.version,
+                "error": str(err),
+            })
+
+    async def _build(self):
+        with self.tracer.start_as_current_span(
+                "CatalogService.build",
+                kind=SpanKind.INTERNAL
+        ) as span:
+            try:
+                # Отпечаток читается до строк: изменение между запросами поймает следующая сверка
+                stamp = await self.topic_repo.get_catalog_stamp()
+                topics, blocks, chapters = await asyncio.gather(
+                    self.topic_repo.get_all_topic(),
+                    self.topic_repo.get_all_block(),
+                    self.topic_repo.get_all_chapter(),
+                )
+
+                version = self._index.version + 1 if self._index is not None else 1
+                self._index = model.CatalogIndex.build(version, stamp, topics, blocks, chapters)
+                self._checked_at = time.monotonic()
+
+                span.set_attributes({
+                    "catalog_version": version,
+                    "topics": len(topics),
+                    "blocks": len(blocks),
+                    "chapters": len(chapters),
+                })
+                self.logger.info("Индекс каталога собран", {
+                    "catalog_version": version,
+                    "topics": len(topics),
+                    "blocks": len(blocks),
+                    "chapters": len(chapters),
+                })
+                span.set_status(StatusCode.OK)
+            except Exception as err:
+                span.record_exception(err)
+                span.set_status(StatusCode.ERROR, str(err))
+                raise err
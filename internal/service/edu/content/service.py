@@ -0,0 +1,282 @@
+import io
+import os
+import re
+import asyncio
+import hashlib
+from dataclasses import dataclass
+
+from opentelemetry.trace import StatusCode, SpanKind
+
+from internal import interface, model
+from pkg.serializer import serializer
+
+BLOCK_FILE_RE = re.compile(r"^block-(\d+)\.md$")
+# "Глава 1.2: ...", "ГЛАВА 1.2: ...", "Chapter 5.1: ..." или просто "2.1 ..." после эмодзи и markdown выделения
+CHAPTER_TITLE_RE = re.compile(r"^(глава\b|chapter\b|\d+\.\d+\b)", re.IGNORECASE)
+# Блоки без явных глав нумеруют разделы: "## 1. Dependency Injection"
+NUMBERED_TITLE_RE = re.compile(r"^\d+\.\s")
+HEADING_RE = re.compile(r"^(#{1,6})\s+(.*)$")
+HEADING_NOISE_RE = re.compile(r"^[\W_]+|[\s*_#]+$")
+
+INTRO_FILE = "intro.md"
+EDU_PLAN_FILE = "edu-plan.md"
+MANIFEST_FILE = ".ingest-manifest.jsonl"
+
+
+@dataclass
+class _Upload:
+    key: str
+    file_name: str
+    data: bytes
+    sha256: str
+
+
+class EduContentService(interface.IEduContentService):
+    """Массовая загрузка курса из локальной директории.
+
+    Структура: <course>/<topic>/{intro.md, edu-plan.md, block-N.md},
+    главы выделяются из блока по заголовкам "Глава" любого уровня.
+    """
+
+    def __init__(
+            self,
+            tel: interface.ITelemetry,
+            topic_repo: interface.ITopicRepo,
+            upload_concurrency: int = 16,
+    ):
+        self.tracer = tel.tracer()
+        self.logger = tel.logger()
+        self.topic_repo = topic_repo
+        self.upload_concurrency = upload_concurrency
+
+    async def ingest_course(self, course_dir: str, manifest_path: str = None) -> None:
+        with self.tracer.start_as_current_span(
+                "EduContentService.ingest_course",
+                kind=SpanKind.INTERNAL,
+                attributes={"course_dir": course_dir}
+        ) as span:
+            try:
+                manifest_path = manifest_path or os.path.join(course_dir, MANIFEST_FILE)
+
+                topics, blocks, chapters, uploads = self._scan_course(course_dir)
+                file_ids = await self._upload_all(uploads, manifest_path)
+
+                # До загрузки в content_file_id лежит ключ файла, подменяем его на fid
+                for topic in topics:
+                    topic.intro_file_id = file_ids.get(topic.intro_file_id)
+                    topic.edu_plan_file_id = file_ids.get(topic.edu_plan_file_id)
+                for entity in (*blocks, *chapters):
+                    entity.content_file_id = file_ids.get(entity.content_file_id)
+
+                await self.topic_repo.bulk_upsert_content(topics, blocks, chapters)
+                await self.topic_repo.analyze_content()
+
+                self.logger.info("Курс загружен", {
+                    "topics": len(topics),
+                    "blocks": len(blocks),
+                    "chapters": len(chapters),
+                    "files": len(uploads),
+                })
+                span.set_status(StatusCode.OK)
+            except Exception as err:
+                span.record_exception(err)
+                span.set_status(StatusCode.ERROR, str(err))
+                raise err
+
+    def _scan_course(self, course_dir: str) -> tuple[
+        list[model.TopicContent],
+        list[model.BlockContent],
+        list[model.ChapterContent],
+        list[_Upload],
+    ]:
+        topics, blocks, chapters, uploads = [], [], [], []
+        missing_chapters = []
+
+        for topic_name in sorted(os.listdir(course_dir)):
+            topic_dir = os.path.join(course_dir, topic_name)
+            if not os.path.isdir(topic_dir) or topic_name.startswith("."):
+                continue
+
+            topic = model.TopicContent(name=topic_name)
+            for file_name, attr in ((INTRO_FILE, "intro_file_id"), (EDU_PLAN_FILE, "edu_plan_file_id")):
+                path = os.path.join(topic_dir, file_name)
+                if os.path.isfile(path):
+                    key = f"{topic_name}/{file_name}"
+                    uploads.append(self._new_upload(key, topic_name, self._read(path)))
+                    setattr(topic, attr, key)
+            topics.append(topic)
+            block_names = set()
+
+            block_files = [
+                (int(match.group(1)), file_name)
+                for file_name in os.listdir(topic_dir)
+                if (match := BLOCK_FILE_RE.match(file_name))
+            ]
+            for _, file_name in sorted(block_files):
+                key = f"{topic_name}/{file_name}"
+                data = self._read(os.path.join(topic_dir, file_name))
+                text = data.decode("utf-8")
+                if not text.strip() or not self._headings(text):
+                    # Блок еще не написан: пустой файл или заготовка без заголовков
+                    if text.strip():
+                        self.logger.warning("Блок без заголовков пропущен", {"file": key})
+                    continue
+
+                block_name = self._unique_name(self._heading(text) or file_name, block_names)
+                uploads.append(self._new_upload(key, block_name, data))
+                blocks.append(model.BlockContent(topic_name=topic_name, name=block_name, content_file_id=key))
+
+                block_chapters = self._split_chapters(text)
+                if not block_chapters:
+                    missing_chapters.append(key)
+                    continue
+
+                chapter_names = set()
+                for number, (chapter_name, chapter_text) in enumerate(block_chapters, start=1):
+                    chapter_name = self._unique_name(chapter_name, chapter_names)
+                    chapter_key = f"{key}#chapter-{number}"
+                    uploads.append(self._new_upload(chapter_key, chapter_name, chapter_text.encode("utf-8")))
+                    chapters.append(model.ChapterContent(
+                        topic_name=topic_name,
+                        block_name=block_name,
+                        name=chapter_name,
+                        content_file_id=chapter_key,
+                    ))
+
+        if missing_chapters:
+            # Блок без глав студенту не выдать, такой курс не загружаем и перечисляем все проблемные файлы
+            raise ValueError(f"Не найдены главы в блоках: {', '.join(missing_chapters)}")
+        return topics, blocks, chapters, uploads
+
+    async def _upload_all(self, uploads: list[_Upload], manifest_path: str) -> dict[str, str]:
+        """Загружает файлы с ограниченным параллелизмом, уже загруженные берет из манифеста"""
+        manifest = self._load_manifest(manifest_path)
+        file_ids: dict[str, str] = {}
+        pending = []
+        for upload in uploads:
+            entry = manifest.get(upload.key)
+            if entry and entry["sha256"] == upload.sha256:
+                file_ids[upload.key] = entry["fid"]
+            else:
+                pending.append(upload)
+
+        self.logger.info("Загрузка файлов курса", {"cached": len(file_ids), "pending": len(pending)})
+        if not pending:
+            return file_ids
+
+        semaphore = asyncio.Semaphore(self.upload_concurrency)
+        # Манифест пишется построчно сразу после каждой загрузки, поэтому прерванный запуск продолжится с места
+        with open(manifest_path, "a", encoding="utf-8") as manifest_file:
+            async def upload_one(upload: _Upload):
+                async with semaphore:
+                    fid = await self.topic_repo.upload_file(io.BytesIO(upload.data), upload.file_name)
+                file_ids[upload.key] = fid
+                manifest_file.write(serializer.dumps_str(
+                    {"key": upload.key, "sha256": upload.sha256, "fid": fid}
+                ) + "\n")
+                manifest_file.flush()
+
+            # TaskGroup при первой ошибке отменяет и дожидается остальных загрузок,
+            # поэтому после закрытия манифеста в него никто не пишет
+            try:
+                async with asyncio.TaskGroup() as task_group:
+                    for upload in pending:
+                        task_group.create_task(upload_one(upload))
+            except ExceptionGroup as err:
+                raise err.exceptions[0] from err
+
+        return file_ids
+
+    @staticmethod
+    def _load_manifest(manifest_path: str) -> dict[str, dict]:
+        manifest = {}
+        if not os.path.isfile(manifest_path):
+            return manifest
+        with open(manifest_path, encoding="utf-8") as manifest_file:
+            for line in manifest_file:
+                line = line.strip()
+                if not line:
+                    continue
+                try:
+                    entry = serializer.loads(line)
+                except serializer.JSONDecodeError:
+                    # Последняя строка могла оборваться при падении процесса
+                    continue
+                manifest[entry["key"]] = entry
+        return manifest
+
+    @classmethod
+    def _split_chapters(cls, text: str) -> list[tuple[str, str]]:
+        """Разбивает блок на главы: секция от заголовка главы до следующего заголовка того же уровня.
+
+        Уровень глав — самый высокий уровень, на котором встречается заголовок главы: в одних файлах
+        главы "# Глава", в других "## Глава" или "### Chapter". Если явных глав нет, главами считаются
+        нумерованные разделы "1. ...".
+        """
+        headings = cls._headings(text)
+        chapter_re = CHAPTER_TITLE_RE
+        if not any(chapter_re.match(title) for _, _, title in headings):
+            chapter_re = NUMBERED_TITLE_RE
+        levels = [level for _, level, title in headings if chapter_re.match(title)]
+        if not levels:
+            return []
+        chapter_level = min(levels)
+
+        lines = text.splitlines()
+        chapters = []
+        current_name, start = None, 0
+        for index, level, title in headings:
+            if level != chapter_level:
+                continue
+            if current_name is not None:
+                chapters.append((current_name, "\n".join(lines[start:index]).strip()))
+            current_name = title if level == chapter_level and chapter_re.match(title) else None
+            start = index
+
+        if current_name is not None:
+            chapters.append((current_name, "\n".join(lines[start:]).strip()))
+        return chapters
+
+    @classmethod
+    def _headings(cls, text: str) -> list[tuple[int, int, str]]:
+        """Заголовки вне блоков кода: номер строки, уровень и очищенный текст"""
+        headings = []
+        in_code = False
+        for index, line in enumerate(text.splitlines()):
+            if line.startswith("```"):
+                in_code = not in_code
+                continue
+            match = None if in_code else HEADING_RE.match(line)
+            if match:
+                headings.append((index, len(match.group(1)), cls._clean_heading(match.group(2))))
+        return headings
+
+    @classmethod
+    def _heading(cls, text: str) -> str | None:
+        for line in text.splitlines():
+            if line.startswith("# "):
+                return cls._clean_heading(line[2:])
+        return None
+
+    @staticmethod
+    def _unique_name(name: str, seen: set[str]) -> str:
+        """Имена уникальны в пределах родителя, иначе upsert по естественному ключу склеит сущности"""
+        unique_name, suffix = name, 2
+        while unique_name in seen:
+            unique_name = f"{name} ({suffix})"
+            suffix += 1
+        seen.add(unique_name)
+        return unique_name
+
+    @staticmethod
+    def _clean_heading(heading: str) -> str:
+        return HEADING_NOISE_RE.sub("", heading.strip())
+
+    @staticmethod
+    def _read(path: str) -> bytes:
+        with open(path, "rb") as file:
+            return file.read()
+
+    @staticmethod
+    def _new_upload(key: str, file_name: str, data: bytes) -> _Upload:
+        return _Upload(key=key, file_name=file_name, data=data, sha256=hashlib.sha256(data).hexdigest())
@@ -1,127 +1,351 @@
-import uvicorn
-
-# External dependencies
-from infrastructure.pg.pg import PG
-from infrastructure.weedfs.weedfs import Weed
-from pkg.client.external.openai.client import GPTClient
-from infrastructure.telemetry.telemetry import Telemetry, AlertManager
-
-# Repositories
-from internal.repo.account.repo import AccountRepo
-from internal.repo.edu.student.repo import StudentRepo
-from internal.repo.chat.repo import ChatRepo
-from internal.repo.edu.topic.repo import TopicRepo
-
-# Services
-from internal.service.edu.student.service import EduStudentService
-from internal.service.edu.topic.service import EduTopicService
-from internal.service.chat.service import ChatService
-from internal.service.chat.prompt import PromptGenerator
-
-# Controllers
-from internal.controller.http.handler.chat.handler import ChatController
-from internal.controller.http.handler.edu.topic.handler import EduTopicController
-from internal.controller.http.handler.edu.student.handler import EduStudentController
-from internal.controller.http.middlerware.middleware import HttpMiddleware
-
-# App
-from internal.app.http.app import NewHTTP
-
-# Config
+# Тяжелые зависимости (openai, aiogram, OTel gRPC, SQLAlchemy, weed) импортируются
+# внутри сборщиков приложений, чтобы команда тянула только то, что ей нужно
 from internal.config.config import Config
 
 # Инициализация конфигурации
 cfg = Config()
 
-alert_manager = AlertManager(
-    cfg.alert_tg_bot_token,
-    cfg.service_name,
-    cfg.alert_tg_chat_id,
-    cfg.alert_tg_chat_thread_id,
-    cfg.grafana_url,
-    cfg.monitoring_redis_host,
-    cfg.monitoring_redis_port,
-    cfg.monitoring_redis_db,
-    cfg.monitoring_redis_password
-)
-
-# Инициализация телеметрии
-tel = Telemetry(
-    cfg.log_level,
-    cfg.root_path,
-    cfg.environment,
-    cfg.service_name,
-    cfg.service_version,
-    cfg.otlp_host,
-    cfg.otlp_port,
-    alert_manager
-)
-
-# Инициализация базы данных
-db = PG(
-    tel,
-    cfg.db_user,
-    cfg.db_pass,
-    cfg.db_host,
-    cfg.db_port,
-    cfg.db_name
-)
-
-storage = Weed(cfg.weed_master_host, cfg.weed_master_port)
-
-# Инициализация LLM клиента
-llm_client = GPTClient(
-    tel,
-    cfg.openai_api_key
-)
-
-# Инициализация репозиториев
-account_repo = AccountRepo(tel, db)
-student_repo = StudentRepo(tel, db)
-chat_repo = ChatRepo(tel, db)
-edu_topic_repo = TopicRepo(tel, db, storage)
-
-# Инициализация сервисов
-prompt_generator = PromptGenerator(
-    tel,
-    student_repo,
-    edu_topic_repo
-)
-
-chat_service = ChatService(
-    tel,
-    llm_client,
-    prompt_generator,
-    student_repo,
-    edu_topic_repo,
-    chat_repo,
-    account_repo
-)
-
-edu_topic_service = EduTopicService(tel, edu_topic_repo)
-edu_student_service = EduStudentService(tel, student_repo)
-
-# Инициализация middleware
-http_middleware = HttpMiddleware(
-    tel,
-    cfg.prefix
-)
-
-# Инициализация контроллеров
-chat_controller = ChatController(
-    tel,
-    chat_service
-)
-
-edu_topic_controller = EduTopicController(
-    tel,
-    edu_topic_service
-)
-
-edu_student_controller = EduStudentController(
-    tel,
-    edu_student_service
-)
+
+def new_telemetry(cfg: Config, alert_manager=None):
+    """Телеметрия с общими для всех команд настройками трейсов, сэмплирования и логов"""
+    from infrastructure.telemetry.telemetry import Telemetry
+
+    return Telemetry(
+        cfg.log_level,
+        cfg.root_path,
+        cfg.environment,
+        cfg.service_name,
+        cfg.service_version,
+        cfg.otlp_host,
+        cfg.otlp_port,
+        alert_manager,
+        trace_sample_ratio=cfg.trace_sample_ratio,
+        trace_tail_sampling=cfg.trace_tail_sampling,
+        trace_slow_threshold=cfg.trace_slow_threshold,
+        trace_tail_max_traces=cfg.trace_tail_max_traces,
+        trace_tail_max_spans_per_trace=cfg.trace_tail_max_spans_per_trace,
+        trace_max_attribute_length=cfg.trace_max_attribute_length
+    )
+
+
+def create_http_app():
+    """Фабрика HTTP приложения.
+
+    Вызывается uvicorn в каждом воркере, поэтому пулы, экспортеры и клиенты
+    создаются уже внутри процесса воркера и ничего не делят с мастером.
+    """
+    # External dependencies
+    from infrastructure.pg.pg import PG
+    from infrastructure.pg.query_stats import QueryStats
+    from infrastructure.weedfs.weedfs import Weed
+    from infrastructure.redis_client.redis_client import RedisClient
+    from infrastructure.keyed_lock.keyed_lock import KeyedLock
+    from pkg.client.external.openai.client import GPTClient
+    from infrastructure.telemetry.alertmanger import AlertManager
+    from infrastructure.telemetry.stage_timer import StageTimer
+
+    # Repositories
+    from internal.repo.account.repo import AccountRepo
+    from internal.repo.edu.student.repo import StudentRepo
+    from internal.repo.chat.repo import ChatRepo
+    from internal.repo.edu.topic.repo import TopicRepo
+
+    # Services
+    from internal.service.edu.student.service import EduStudentService
+    from internal.service.edu.topic.service import EduTopicService
+    from internal.service.edu.catalog.service import CatalogService
+    from internal.service.chat.service import ChatService
+    from internal.service.chat.prompt import PromptGenerator
+
+    # Controllers
+    from internal.controller.http.handler.chat.handler import ChatController
+    from internal.controller.http.handler.edu.topic.handler import EduTopicController
+    from internal.controller.http.handler.edu.student.handler import EduStudentController
+    from internal.controller.http.middlerware.middleware import HttpMiddleware
+
+    # App
+    from internal.app.http.app import NewHTTP
+
+    alert_manager = AlertManager(
+        cfg.alert_tg_bot_token,
+        cfg.service_name,
+        cfg.alert_tg_chat_id,
+        cfg.alert_tg_chat_thread_id,
+        cfg.grafana_url,
+        cfg.monitoring_redis_host,
+        cfg.monitoring_redis_port,
+        cfg.monitoring_redis_db,
+        cfg.monitoring_redis_password
+    )
+
+    # Инициализация телеметрии
+    tel = new_telemetry(cfg, alert_manager)
+
+    from pkg.serializer import serializer
+    if serializer.BACKEND != "orjson":
+        # Ответы, промпты и Redis работают и на stdlib json, но заметно медленнее
+        tel.logger().warning("orjson не установлен, JSON сериализация идет через stdlib json", {
+            "serializer_backend": serializer.BACKEND,
+        })
+
+    # Redis общий для воркеров: блокировка ходов студента и метки записи для чтения с реплик.
+    # Нужен только при нескольких воркерах
+    student_lock_redis = None
+    if cfg.student_lock_redis_host:
+        student_lock_redis = RedisClient(
+            cfg.student_lock_redis_host,
+            cfg.student_lock_redis_port,
+            cfg.student_lock_redis_db,
+            cfg.student_lock_redis_password
+        )
+
+    # Инициализация базы данных
+    query_stats = QueryStats(
+        tel,
+        cfg.db_slow_query_threshold,
+        cfg.db_slow_queries_size,
+        cfg.db_explain_interval
+    )
+    db = PG(
+        tel,
+        cfg.db_user,
+        cfg.db_pass,
+        cfg.db_host,
+        cfg.db_port,
+        cfg.db_name,
+        cfg.db_replica_hosts,
+        cfg.db_sticky_window,
+        cfg.db_replica_retry_interval,
+        pool_size=cfg.db_pool_size,
+        max_overflow=cfg.db_max_overflow,
+        pool_recycle=cfg.db_pool_recycle,
+        pool_timeout=cfg.db_pool_timeout,
+        slow_checkout_threshold=cfg.db_slow_checkout_threshold,
+        pgbouncer=cfg.db_pgbouncer,
+        query_stats=query_stats,
+        explain_timeout=cfg.db_explain_timeout,
+        sticky_store=student_lock_redis
+    )
+
+    storage = Weed(cfg.weed_master_host, cfg.weed_master_port)
+
+    student_lock = KeyedLock(
+        student_lock_redis,
+        namespace=cfg.service_name + ":student_lock",
+        ttl=cfg.student_lock_ttl,
+        blocking_timeout=cfg.student_lock_blocking_timeout
+    )
+
+    stage_timer = StageTimer(
+        tel,
+        cfg.chat_slow_turn_threshold,
+        cfg.chat_slow_turns_size
+    )
+
+    # Инициализация LLM клиента
+    llm_client = GPTClient(
+        tel,
+        cfg.openai_api_key
+    )
+
+    # Инициализация репозиториев
+    account_repo = AccountRepo(tel, db)
+    student_repo = StudentRepo(tel, db)
+    chat_repo = ChatRepo(tel, db)
+    edu_topic_repo = TopicRepo(tel, db, storage)
+
+    # Инициализация сервисов
+    catalog_service = CatalogService(
+        tel,
+        edu_topic_repo,
+        cfg.catalog_refresh_interval
+    )
+
+    prompt_generator = PromptGenerator(
+        tel,
+        student_repo,
+        edu_topic_repo,
+        catalog_service,
+        stage_timer
+    )
+
+    chat_service = ChatService(
+        tel,
+        llm_client,
+        prompt_generator,
+        student_repo,
+        edu_topic_repo,
+        catalog_service,
+        chat_repo,
+        account_repo,
+        student_lock,
+        stage_timer,
+        cfg.chat_history_token_budget
+    )
+
+    edu_topic_service = EduTopicService(tel, edu_topic_repo)
+    edu_student_service = EduStudentService(tel, student_repo)
+
+    # Инициализация middleware
+    http_middleware = HttpMiddleware(
+        tel,
+        cfg.prefix,
+        cfg.http_metrics_max_label_sets,
+        cfg.http_access_log_sample_ratio
+    )
+
+    # Инициализация контроллеров
+    chat_controller = ChatController(
+        tel,
+        chat_service,
+        stage_timer,
+        cfg.chat_server_timing_enabled
+    )
+
+    edu_topic_controller = EduTopicController(
+        tel,
+        edu_topic_service
+    )
+
+    edu_student_controller = EduStudentController(
+        tel,
+        edu_student_service
+    )
+
+    async def on_shutdown():
+        # Сначала закрываем соединения, затем сбрасываем телеметрию, чтобы не потерять их спаны
+        await db.close()
+        if student_lock_redis is not None:
+            await student_lock_redis.aclose()
+        await alert_manager.close()
+        tel.shutdown()
+
+    # Создание HTTP приложения
+    return NewHTTP(
+        db,
+        chat_controller,
+        edu_student_controller,
+        edu_topic_controller,
+        http_middleware,
+        stage_timer,
+        query_stats,
+        cfg.prefix,
+        cfg.environment,
+        cfg.debug_token,
+        on_shutdown
+    )
+
+
+async def run_parse_edu_content(course_dir: str, manifest_path: str = None):
+    """Массовая загрузка курса: HTTP стек, LLM клиент и алерты в Telegram не нужны"""
+    from infrastructure.pg.pg import PG
+    from infrastructure.weedfs.weedfs import Weed
+    from internal.repo.edu.topic.repo import TopicRepo
+    from internal.service.edu.content.service import EduContentService
+
+    tel = new_telemetry(cfg)
+    db = PG(
+        tel,
+        cfg.db_user,
+        cfg.db_pass,
+        cfg.db_host,
+        cfg.db_port,
+        cfg.db_name
+    )
+    storage = Weed(cfg.weed_master_host, cfg.weed_master_port)
+
+    edu_topic_repo = TopicRepo(tel, db, storage)
+    edu_content_service = EduContentService(tel, edu_topic_repo, cfg.edu_content_upload_concurrency)
+
+    try:
+        await edu_content_service.ingest_course(course_dir, manifest_path)
+    finally:
+        await db.close()
+        tel.shutdown()
+
+
+async def run_migrate():
+    """Версионированные миграции схемы, безопасно запускать из нескольких воркеров сразу"""
+    from infrastructure.pg.pg import PG
+    from infrastructure.pg.migrator import Migrator
+    from internal import model
+
+    tel = new_telemetry(cfg)
+    db = PG(
+        tel,
+        cfg.db_user,
+        cfg.db_pass,
+        cfg.db_host,
+        cfg.db_port,
+        cfg.db_name
+    )
+    migrations = list(model.migrations)
+    partition_migration = model.messages_partition_migration(
+        cfg.messages_partitioning,
+        cfg.messages_hash_partitions,
+        cfg.messages_partition_premake_months
+    )
+    if partition_migration is not None:
+        migrations.append(partition_migration)
+
+    migrator = Migrator(tel, db, migrations, cfg.service_name + ":schema_migrations")
+
+    try:
+        versions = await migrator.migrate()
+        for migration in await migrator.applied():
+            mark = "*" if migration.version in versions else " "
+            print(f"{mark} {migration.version:>4} {migration.name:<40} {migration.duration_ms:>10.1f} ms")
+    finally:
+        await db.close()
+        tel.shutdown()
+
+
+async def run_maintain_messages():
+    """Секции messages на будущие месяцы и срок хранения, запускается по расписанию"""
+    from infrastructure.pg.pg import PG
+    from infrastructure.pg.partition import MessagesMaintenance
+
+    tel = new_telemetry(cfg)
+    db = PG(
+        tel,
+        cfg.db_user,
+        cfg.db_pass,
+        cfg.db_host,
+        cfg.db_port,
+        cfg.db_name
+    )
+    messages_maintenance = MessagesMaintenance(
+        tel,
+        db,
+        cfg.messages_partitioning,
+        cfg.messages_partition_premake_months,
+        cfg.messages_retention_months,
+        cfg.messages_retention_archive,
+        lock_name=cfg.service_name + ":messages_maintenance"
+    )
+
+    try:
+        print(await messages_maintenance.maintain())
+    finally:
+        await db.close()
+        tel.shutdown()
+
+
+def run_http():
+    import uvicorn
+
+    # Запуск сервера, каждый воркер сам вызывает create_http_app
+    uvicorn.run(
+        "main:create_http_app",
+        factory=True,
+        host='0.0.0.0',
+        port=cfg.http_port,
+        workers=cfg.http_workers,
+        loop='asyncio',
+        access_log=False,
+        timeout_graceful_shutdown=cfg.http_graceful_shutdown_timeout
+    )
+
 
 if __name__ == '__main__':
     import argparse
@@ -130,26 +354,36 @@ if __name__ == '__main__':
     parser.add_argument(
         'app',
         type=str,
-        help='Option: "http, parse_edu_content"'
+        help='Option: "http, parse_edu_content, migrate, maintain_messages"'
+    )
+    parser.add_argument(
+        '--course-dir',
+        type=str,
+        default='pkg/backend_knowledge',
+        help='parse_edu_content: директория курса'
+    )
+    parser.add_argument(
+        '--manifest',
+        type=str,
+        default=None,
+        help='parse_edu_content: манифест загруженных файлов, по умолчанию внутри директории курса'
     )
     args = parser.parse_args()
 
     if args.app == "http":
-        # Создание HTTP приложения
-        http_app = NewHTTP(
-            db,
-            chat_controller,
-            edu_student_controller,
-            edu_topic_controller,
-            http_middleware,
-            cfg.prefix
-        )
+        run_http()
 
-        # Запуск сервера
-        uvicorn.run(
-            http_app,
-            host='0.0.0.0',
-            port=cfg.http_port,
-            loop='asyncio',
-            access_log=False
-        )
+    if args.app == "parse_edu_content":
+        import asyncio
+
+        asyncio.run(run_parse_edu_content(args.course_dir, args.manifest))
+
+    if args.app == "migrate":
+        import asyncio
+
+        asyncio.run(run_migrate())
+
+    if args.app == "maintain_messages":
+        import asyncio
+
+        asyncio.run(run_maintain_messages())
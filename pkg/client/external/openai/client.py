@@ -21,7 +21,7 @@ class GPTClient(interface.ILLMClient):
 
     async def generate(
             self,
-            history: list[model.Message],
+            history: list[model.Message] | model.MessageHistory,
             system_prompt: str = "",
             temperature: float = 0.5,
             llm_model: str = "gpt-4o-mini",
@@ -35,13 +35,15 @@ class GPTClient(interface.ILLMClient):
                 if system_prompt != "":
                     system_prompt = [{"role": "system", "content": system_prompt}]
 
-                history = [
-                    *system_prompt,
-                    *[
+                if isinstance(history, model.MessageHistory):
+                    messages = history.to_llm_messages()
+                else:
+                    messages = [
                         {"role": message.role, "content": message.text}
                         for message in history
                     ]
-                ]
+
+                history = [*system_prompt, *messages]
 
                 if base64img is not None:
                     history[-1]["content"] = [
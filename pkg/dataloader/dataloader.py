@@ -0,0 +1,62 @@
+"""Склейка одиночных загрузок по ключу в пакетные запросы в стиле DataLoader.
+
+Все load, вызванные конкурентно до следующего шага цикла событий, уходят одним
+вызовом batch_load. Одинаковые ключи в одном пакете загружаются один раз.
+Между пакетами ничего не кэшируется, поэтому загрузчик безопасно держать
+общим на весь процесс: устаревших значений он не отдает.
+"""
+import asyncio
+from typing import Awaitable, Callable, Generic, Hashable, Iterable, TypeVar
+
+K = TypeVar("K", bound=Hashable)
+V = TypeVar("V")
+
+
+class DataLoader(Generic[K, V]):
+    def __init__(
+            self,
+            batch_load: Callable[[list[K]], Awaitable[dict[K, V]]],
+            max_batch_size: int = 500,
+    ):
+        # batch_load возвращает найденные значения по ключу, отсутствующие ключи получают None
+        self.batch_load = batch_load
+        self.max_batch_size = max_batch_size
+        self._pending: dict[K, asyncio.Future] = {}
+        # Цикл событий держит на задачи только слабые ссылки, без них пакет может собрать GC
+        self._tasks: set[asyncio.Task] = set()
+
+    async def load(self, key: K) -> V | None:
+        future = self._pending.get(key)
+        if future is None:
+            loop = asyncio.get_running_loop()
+            if not self._pending:
+                # call_soon встает в очередь после уже готовых корутин текущего шага
+                loop.call_soon(self._dispatch)
+            future = self._pending[key] = loop.create_future()
+        # shield: отмена одного ожидающего не отменяет загрузку для остальных
+        return await asyncio.shield(future)
+
+    async def load_many(self, keys: Iterable[K]) -> list[V | None]:
+        return list(await asyncio.gather(*(self.load(key) for key in keys)))
+
+    def _dispatch(self) -> None:
+        pending, self._pending = self._pending, {}
+        keys = list(pending)
+        for start in range(0, len(keys), self.max_batch_size):
+            batch = {key: pending[key] for key in keys[start:start + self.max_batch_size]}
+            task = asyncio.create_task(self._load_batch(batch))
+            self._tasks.add(task)
+            task.add_done_callback(self._tasks.discard)
+
+    async def _load_batch(self, batch: dict[K, asyncio.Future]) -> None:
+        try:
+            values = await self.batch_load(list(batch))
+        except Exception as err:
+            for future in batch.values():
+                if not future.done():
+                    future.set_exception(err)
+            return
+
+        for key, future in batch.items():
+            if not future.done():
+                future.set_result(values.get(key))
@@ -0,0 +1,61 @@
+"""Быстрая JSON сериализация: orjson, если установлен, иначе stdlib json.
+
+datetime, date, UUID, dataclass и pydantic модели сериализуются без ручного
+isoformat в to_dict. Ключи словарей могут быть не строками (Dict[int, str] в ответах).
+"""
+import dataclasses
+import json
+from datetime import date, datetime, time
+from typing import Any
+from uuid import UUID
+
+try:
+    import orjson
+except ImportError:  # pragma: no cover - зависит от окружения
+    orjson = None
+
+BACKEND = "orjson" if orjson is not None else "json"
+
+
+def _default(value: Any) -> Any:
+    if hasattr(value, "model_dump"):
+        return value.model_dump()
+    if isinstance(value, (datetime, date, time)):
+        return value.isoformat()
+    if dataclasses.is_dataclass(value) and not isinstance(value, type):
+        return dataclasses.asdict(value)
+    if isinstance(value, (set, frozenset)):
+        return list(value)
+    if isinstance(value, UUID):
+        return str(value)
+    return str(value)
+
+
+if orjson is not None:
+    _OPTIONS = orjson.OPT_NON_STR_KEYS
+    _INDENT_OPTIONS = _OPTIONS | orjson.OPT_INDENT_2
+
+    def dumps(value: Any, indent: bool = False) -> bytes:
+        return orjson.dumps(value, default=_default, option=_INDENT_OPTIONS if indent else _OPTIONS)
+
+    def dumps_str(value: Any, indent: bool = False) -> str:
+        return dumps(value, indent).decode("utf-8")
+
+    def loads(data: bytes | str) -> Any:
+        return orjson.loads(data)
+
+else:
+    def dumps_str(value: Any, indent: bool = False) -> str:
+        if indent:
+            return json.dumps(value, default=_default, ensure_ascii=False, indent=2)
+        return json.dumps(value, default=_default, ensure_ascii=False, separators=(",", ":"))
+
+    def dumps(value: Any, indent: bool = False) -> bytes:
+        return dumps_str(value, indent).encode("utf-8")
+
+    def loads(data: bytes | str) -> Any:
+        return json.loads(data)
+
+
+# orjson.JSONDecodeError наследует json.JSONDecodeError, ловить можно одно исключение
+JSONDecodeError = json.JSONDecodeError
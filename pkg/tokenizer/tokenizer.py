@@ -0,0 +1,45 @@
+"""Подсчет токенов для бюджетирования истории.
+
+С установленным tiktoken считается точно кодировкой модели, без него оценка
+по длине текста: для смеси русского текста и кода это около 3 символов на токен,
+оценка намеренно завышена, чтобы бюджет не переполнялся.
+"""
+from functools import lru_cache
+
+try:
+    import tiktoken
+except ImportError:  # pragma: no cover - зависит от окружения
+    tiktoken = None
+
+DEFAULT_MODEL = "gpt-4o-mini"
+FALLBACK_ENCODING = "o200k_base"
+
+# Служебные токены формата chat completions на каждое сообщение (роль и разделители)
+MESSAGE_OVERHEAD = 4
+
+_CHARS_PER_TOKEN = 3
+
+BACKEND = "tiktoken" if tiktoken is not None else "estimate"
+
+
+@lru_cache(maxsize=8)
+def _encoding(llm_model: str):
+    try:
+        return tiktoken.encoding_for_model(llm_model)
+    except KeyError:
+        return tiktoken.get_encoding(FALLBACK_ENCODING)
+
+
+def count_tokens(text: str, llm_model: str = DEFAULT_MODEL) -> int:
+    if not text:
+        return 0
+    if tiktoken is None:
+        return -(-len(text) // _CHARS_PER_TOKEN)
+    return len(_encoding(llm_model).encode_ordinary(text))
+
+
+def count_tokens_batch(texts: list[str], llm_model: str = DEFAULT_MODEL) -> list[int]:
+    if tiktoken is None:
+        return [-(-len(text) // _CHARS_PER_TOKEN) for text in texts]
+    # encode_ordinary_batch кодирует в пуле потоков, GIL отпускается внутри tiktoken
+    return [len(tokens) for tokens in _encoding(llm_model).encode_ordinary_batch(texts)]